@@ -2,12 +2,18 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 sw=4 et sts=4 ai:
 
+import datetime
 import inspect
 
 from django.db import models as django_models
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, ALL_VAR, ORDER_VAR, SEARCH_VAR
 
+from finance import listing
 from finance import models as finance_models
+from finance import search
+from finance import summary
 from finance.utils import dollar_display
 from finance.models import (RegexForField, Currency, Category, Site, Account, Imported, Fee,
                      RelatedTransaction, Transaction, Reconciliation, Categorizer)
@@ -57,6 +63,81 @@ class RelatedTransactionAdmin(admin.ModelAdmin):
     list_filter = ('type', 'relationship',)
 
 
+# Query parameter for the keyset cursor.
+CURSOR_VAR = 'after'
+
+
+class MonthListFilter(admin.SimpleListFilter):
+    """Filter transactions by month, the months come from the summary."""
+    title = 'month'
+    parameter_name = 'month'
+
+    def lookups(self, request, model_admin):
+        months = finance_models.MonthlySummary.objects.order_by('-month'
+            ).values_list('month', flat=True).distinct()
+        return [(month.strftime('%Y-%m'), month.strftime('%Y-%m'))
+                for month in months]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            start = datetime.datetime.strptime(self.value(), '%Y-%m')
+        except ValueError:
+            raise IncorrectLookupParameters
+        return queryset.filter(
+            imported_entered_date__gte=start,
+            imported_entered_date__lt=summary.next_month(start))
+
+
+class TransactionChangeList(ChangeList):
+    """Pages through transactions by keyset rather than page number.
+
+    Only used with the default (newest first) ordering, sorting by a column
+    falls back to normal pages with an estimated count.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super(TransactionChangeList, self).get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        self.keyset = ORDER_VAR not in self.params and ALL_VAR not in self.params
+        if not self.keyset:
+            return super(TransactionChangeList, self).get_results(request)
+
+        try:
+            position = None
+            if self.params.get(CURSOR_VAR):
+                position = listing.parse_cursor(self.params[CURSOR_VAR])
+        except ValueError:
+            raise IncorrectLookupParameters
+
+        self.result_list, self.next_cursor = listing.page(
+            self.queryset, position, self.list_per_page)
+        self.paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.estimated = self.result_count > listing.COUNT_LIMIT
+        # Filtered lists aren't estimated, they have "more than" the limit.
+        self.more_than = self.estimated and listing.filtered(self.queryset)
+        self.count_limit = listing.COUNT_LIMIT
+        if self.get_filters_params() or self.params.get(SEARCH_VAR):
+            self.full_result_count = listing.estimated_count(self.root_queryset)
+        else:
+            self.full_result_count = self.result_count
+        self.can_show_all = False
+        self.multi_page = position is not None or self.next_cursor is not None
+
+        self.first_url = None
+        if position is not None:
+            self.first_url = self.get_query_string(remove=[CURSOR_VAR])
+        self.next_url = None
+        if self.next_cursor is not None:
+            self.next_url = self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+
 class TransactionAdmin(admin.ModelAdmin):
     list_display = (
         'account',
@@ -68,10 +149,32 @@ class TransactionAdmin(admin.ModelAdmin):
         'primary_category',
         'categories',
         )
-    list_filter = ('account','primary_category')
+    list_filter = ('account', 'primary_category', MonthListFilter)
+    list_select_related = ('account__currency', 'primary_category', 'imported_original_currency')
     search_fields = ('imported_description', 'override_description', 'imported_location', 'override_location')
     list_editable = ('primary_category',)
-    date_hierarchy = 'imported_entered_date'
+    ordering = listing.ORDERING
+    paginator = listing.EstimatedCountPaginator
+
+    def get_changelist(self, request, **kwargs):
+        return TransactionChangeList
+
+    def get_queryset(self, request):
+        qs = super(TransactionAdmin, self).get_queryset(request)
+        return qs.prefetch_related('suggested_categories')
+
+    def formfield_for_foreignkey(self, db_field, request=None, **kwargs):
+        field = super(TransactionAdmin, self).formfield_for_foreignkey(
+            db_field, request, **kwargs)
+        if db_field.name == 'primary_category':
+            # Every row of the changelist gets a copy of this field, so fetch
+            # the categories once rather than once per row.
+            field.choices = list(field.choices)
+        return field
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index rather than LIKE over every row.
+        return search.matching(queryset, search_term), False
 
 
 class CategorizerAdmin(admin.ModelAdmin):
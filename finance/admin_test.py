@@ -0,0 +1,41 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from finance import models
+from finance import testing
+
+
+class TransactionAdminTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        self.category = models.Category.objects.create(
+            category_id="food", description="Food")
+
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+
+    def add(self, count):
+        for i in range(count):
+            trans = self.create_transaction(
+                "%s.%s" % (count, i), datetime.datetime(2012, 1, 1+i), 100,
+                primary_category=self.category)
+            trans.suggested_categories.add(self.category)
+
+    def queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/finance/transaction/")
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries(self):
+        self.add(2)
+        few = self.queries()
+        self.add(10)
+        self.assertEqual(self.queries(), few)
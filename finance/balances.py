@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Maintains the models.DailyBalance table and answers balance queries from it.
+
+The balance of an account at any moment is the amount of the latest
+reconciliation plus any floating transactions (ones without a reconciliation)
+which came after it. Working that out means walking the reconciliations and
+summing transactions, so instead it is done once when transactions are
+imported and the result for each day the balance changed is stored.
+"""
+
+import datetime
+
+from django.db.models import Sum
+
+from finance import models
+
+
+def as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def floating(account):
+    """Transactions in an account which aren't covered by a reconciliation."""
+    return account.transaction_set.filter(
+        removed_by=None, parent_id=None, reconciliation=None)
+
+
+def reconciliations(account):
+    """The (time, amount) of the reconciliations of an account, in order.
+
+    A reconciliation can't apply after the ones which follow it, so its time
+    is pulled back to that of its successor when needed (IE for rollback
+    reconciliations which are stamped with the time of the import).
+    """
+    rows = list(models.Reconciliation.objects.filter(account=account
+        ).order_by('_order'
+        ).values_list('at', 'amount'))
+
+    effective = []
+    limit = None
+    for at, amount in reversed(rows):
+        if limit is not None and at > limit:
+            at = limit
+        limit = at
+        effective.append((at, amount))
+    effective.reverse()
+    return effective
+
+
+def refresh(account, start=None):
+    """Recompute the daily balances of an account.
+
+    Args:
+        account: models.Account to recompute.
+        start: Only recompute from this date onwards, defaults to everything.
+    """
+    recs = reconciliations(account)
+
+    q = models.DailyBalance.objects.filter(account=account)
+    if start is not None and not q.filter(date__lt=as_date(start)).exists():
+        # Nothing earlier to build on.
+        start = None
+    transactions = floating(account)
+
+    # Work out the balance just before we start.
+    balance = 0
+    since = None
+    if start is not None:
+        start = datetime.datetime.combine(as_date(start), datetime.time())
+
+        q = q.filter(date__gte=start.date())
+        transactions = transactions.filter(imported_entered_date__gte=start)
+
+        earlier = [r for r in recs if r[0] < start]
+        if earlier:
+            since, balance = earlier[-1]
+        recs = recs[len(earlier):]
+
+        prior = floating(account).filter(imported_entered_date__lt=start)
+        if since is not None:
+            prior = prior.filter(imported_entered_date__gt=since)
+        balance += prior.aggregate(amount=Sum('imported_amount'))['amount'] or 0
+
+    q.delete()
+
+    # Walk forward through the transactions and reconciliations. At the same
+    # time a reconciliation already includes the transaction.
+    events = [(at, 1, amount) for at, amount in recs]
+    events.extend((at, 0, amount) for at, amount in transactions.values_list(
+        'imported_entered_date', 'imported_amount').order_by().iterator())
+    events.sort()
+
+    daily = {}
+    for at, is_reconciliation, amount in events:
+        if is_reconciliation:
+            balance = amount
+        else:
+            balance += amount
+        daily[at.date()] = balance
+
+    models.DailyBalance.objects.bulk_create([
+        models.DailyBalance(account=account, date=date, balance=balance)
+        for date, balance in daily.items()], batch_size=500)
+    return len(daily)
+
+
+def rebuild():
+    """Recompute the daily balances of every account."""
+    total = 0
+    for account in models.Account.objects.all():
+        total += refresh(account)
+    return total
+
+
+def balance_at(account, date):
+    """The balance of an account at the end of a given day."""
+    q = models.DailyBalance.objects.filter(
+        account=account, date__lte=as_date(date)).order_by('-date')[:1]
+    for row in q:
+        return row.balance
+    return 0
+
+
+def balance_range(account, start, end):
+    """The balance of an account at the end of each day in a range.
+
+    Yields:
+        (date, balance) for every day from start to end inclusive.
+    """
+    start = as_date(start)
+    end = as_date(end)
+
+    balance = balance_at(account, start - datetime.timedelta(days=1))
+    changes = dict(models.DailyBalance.objects.filter(
+        account=account, date__gte=start, date__lte=end
+        ).values_list('date', 'balance'))
+
+    day = start
+    while day <= end:
+        balance = changes.get(day, balance)
+        yield day, balance
+        day += datetime.timedelta(days=1)
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+import cStringIO as SIO
+
+from finance import balances
+from finance import management
+from finance import models
+from finance import testing
+from finance.importers import csv_importer
+
+
+class DailyBalanceTest(testing.AccountTestCase):
+    class SimpleImporter(csv_importer.CSVImporter):
+        FIELDS = [
+            csv_importer.FieldList.DATE,
+            csv_importer.FieldList.AMOUNT,
+            csv_importer.FieldList.DESCRIPTION,
+            ]
+        DATEFMT = "%d/%m/%Y"
+        ORDER = reversed
+
+    class RunningImporter(csv_importer.CSVImporter):
+        FIELDS = [
+            csv_importer.FieldList.EFFECTIVE_DATE,
+            csv_importer.FieldList.ENTERED_DATE,
+            csv_importer.FieldList.DESCRIPTION,
+            csv_importer.FieldList.AMOUNT,
+            csv_importer.FieldList.RUNNING_TOTAL_INC,
+            ]
+        DATEFMT = "%d/%m/%Y"
+        ORDER = reversed
+
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        self.reconcile = models.Reconciliation.objects.create(
+            account=self.account, previous_id=None,
+            at=datetime.datetime.fromtimestamp(0), amount=1000)
+
+    def assertBalances(self, start, end, expected):
+        self.assertListEqual(
+            [balance for date, balance in balances.balance_range(
+                self.account, start, end)],
+            expected)
+
+        # The incrementally maintained balances should match a rebuild.
+        before = list(models.DailyBalance.objects.values_list('date', 'balance'))
+        balances.rebuild()
+        self.assertListEqual(
+            list(models.DailyBalance.objects.values_list('date', 'balance')),
+            before)
+
+    def test_floating(self):
+        importer = self.SimpleImporter()
+        importer.parse_file(self.account, SIO.StringIO("""\
+12/01/2012,"-3.00","C"
+10/01/2012,"5.00","B"
+10/01/2012,"-1.00","A"
+"""))
+        self.assertEqual(
+            balances.balance_at(self.account, datetime.date(2012, 1, 9)), 1000)
+        self.assertEqual(
+            balances.balance_at(self.account, datetime.date(2012, 1, 10)), 1400)
+        self.assertBalances(
+            datetime.date(2012, 1, 9), datetime.date(2012, 1, 13),
+            [1000, 1400, 1400, 1100, 1100])
+
+        # Import some more, only the later days change.
+        importer.parse_file(self.account, SIO.StringIO("""\
+13/01/2012,"-2.00","D"
+12/01/2012,"-3.00","C"
+10/01/2012,"5.00","B"
+10/01/2012,"-1.00","A"
+"""))
+        self.assertBalances(
+            datetime.date(2012, 1, 9), datetime.date(2012, 1, 13),
+            [1000, 1400, 1400, 1100, 900])
+
+    def test_running_total(self):
+        self.reconcile.amount = 2267198
+        self.reconcile.save()
+
+        importer = self.RunningImporter()
+        importer.parse_file(self.account, SIO.StringIO("""\
+,01/02/2012,REWARD BENEFIT VISA (OS),0.10,22671.88
+,01/02/2012,REWARD BENEFIT BPAY,0.30,22671.78
+,31/01/2012,NON REDIATM WITHDRAWAL FEE,-0.50,22671.48
+"""))
+        self.assertBalances(
+            datetime.date(2012, 1, 30), datetime.date(2012, 2, 2),
+            [2267198, 2267148, 2267188, 2267188])
+
+    def test_syncdb(self):
+        self.create_transaction("1", datetime.datetime(2012, 1, 10), -100)
+
+        # IE the table syncdb made on a database which already had
+        # transactions.
+        models.DailyBalance.objects.all().delete()
+        management._fill_balances(models, created_models=[models.DailyBalance])
+        self.assertBalances(
+            datetime.date(2012, 1, 9), datetime.date(2012, 1, 10), [1000, 900])
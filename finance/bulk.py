@@ -0,0 +1,158 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Writes large numbers of new rows without an INSERT per row.
+
+Objects are given their ids as they are added (so other new objects can refer
+to them) and are written together when the writer is flushed. On PostgreSQL
+the rows are streamed with COPY into a staging table and merged from there,
+other databases use batched INSERTs.
+
+No signals are sent for the objects, callers need to do anything the signal
+handlers would (IE tell the summary about new transactions).
+"""
+
+import cStringIO as SIO
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import Max
+
+
+# Number of rows in each INSERT.
+BATCH_SIZE = 500
+
+
+def copy_value(value):
+    r"""Format a value for PostgreSQL's COPY text format.
+
+    >>> copy_value(None)
+    '\\N'
+    >>> copy_value(True)
+    't'
+    >>> copy_value(u'a\tb\\c\n')
+    'a\\tb\\\\c\\n'
+    >>> copy_value(12)
+    '12'
+    """
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    else:
+        value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
+class BulkWriter(object):
+    """Collects new model objects and inserts them with batched INSERTs."""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.connection = connections[using]
+        # Models in the order they were first added, so rows referred to are
+        # written first.
+        self.models = []
+        self.objects = {}
+        self.next_id = {}
+
+    def allocate_ids(self, model, count):
+        """Reserve ids for new rows of a model.
+
+        The writer should be used inside a transaction which has already
+        written to the database, so no one else can insert in the meantime.
+        """
+        if model not in self.next_id:
+            self.next_id[model] = (model.objects.using(self.using).aggregate(
+                m=Max(model._meta.pk.attname))['m'] or 0) + 1
+
+        start = self.next_id[model]
+        self.next_id[model] += count
+        return range(start, start+count)
+
+    def add(self, obj):
+        """Queue an object to be inserted, giving it an id if needed."""
+        model = type(obj)
+        if model not in self.objects:
+            self.models.append(model)
+            self.objects[model] = []
+
+        if obj.pk is None and model._meta.has_auto_field:
+            obj.pk = self.allocate_ids(model, 1)[0]
+        self.objects[model].append(obj)
+        return obj
+
+    def flush(self):
+        """Write all the queued objects."""
+        for model in self.models:
+            objs = self.objects[model]
+            if objs:
+                self.write(model, objs)
+        self.models = []
+        self.objects = {}
+
+    def write(self, model, objs):
+        model.objects.using(self.using).bulk_create(objs, batch_size=BATCH_SIZE)
+
+
+class CopyWriter(BulkWriter):
+    """Streams new objects into PostgreSQL with COPY."""
+
+    # Ids are taken from the sequence this many at a time.
+    ID_BLOCK = 100
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        BulkWriter.__init__(self, using)
+        self.free_ids = {}
+
+    def allocate_ids(self, model, count):
+        free = self.free_ids.setdefault(model, [])
+        if len(free) < count:
+            qn = self.connection.ops.quote_name
+            cursor = self.connection.cursor()
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%%s, %%s))"
+                " FROM generate_series(1, %i)" % max(count, self.ID_BLOCK),
+                [qn(model._meta.db_table), model._meta.pk.column])
+            free.extend(row[0] for row in cursor.fetchall())
+
+        ids = free[:count]
+        del free[:count]
+        return ids
+
+    def write(self, model, objs):
+        qn = self.connection.ops.quote_name
+        table = model._meta.db_table
+        stage = "stage_" + table
+        fields = model._meta.local_concrete_fields
+        columns = ", ".join(qn(f.column) for f in fields)
+
+        data = SIO.StringIO()
+        for obj in objs:
+            data.write("\t".join(
+                copy_value(f.get_db_prep_save(f.pre_save(obj, True), self.connection))
+                for f in fields))
+            data.write("\n")
+        data.seek(0)
+
+        # The staging table lasts as long as the connection.
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS %s (LIKE %s)" % (
+                qn(stage), qn(table)))
+        cursor.copy_expert("COPY %s (%s) FROM STDIN" % (qn(stage), columns), data)
+        cursor.execute("INSERT INTO %s (%s) SELECT %s FROM %s" % (
+            qn(table), columns, columns, qn(stage)))
+        cursor.execute("TRUNCATE %s" % qn(stage))
+
+
+def writer(using=DEFAULT_DB_ALIAS):
+    """The best BulkWriter for a database."""
+    if connections[using].vendor == 'postgresql':
+        return CopyWriter(using)
+    return BulkWriter(using)
@@ -0,0 +1,43 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+import unittest
+
+from django.db import connection
+
+from finance import bulk
+from finance import models
+from finance import testing
+
+
+class BulkWriterTest(testing.AccountTestCase):
+    def write(self, writer):
+        imported = writer.add(models.Imported(account=self.account, content=""))
+        for i in range(3):
+            trans = writer.add(models.Transaction(
+                account=self.account, trans_id=str(i),
+                imported_first_by=imported,
+                imported_entered_date=datetime.datetime(2012, 1, i+1),
+                imported_description="Tab\there", imported_location="",
+                imported_amount=i))
+            writer.add(models.Transaction.imported_also_by.through(
+                transaction_id=trans.id, imported_id=imported.id))
+        self.assertEqual(models.Transaction.objects.count(), 0)
+        writer.flush()
+
+        self.assertListEqual(list(models.Transaction.objects.order_by('id'
+            ).values_list('trans_id', 'imported_description', 'imported_first_by')),
+            [(u"0", u"Tab\there", imported.id),
+             (u"1", u"Tab\there", imported.id),
+             (u"2", u"Tab\there", imported.id)])
+        self.assertEqual(imported.common_transactions.count(), 3)
+        self.assertIsNotNone(models.Imported.objects.get(id=imported.id).at)
+
+    def test_batched(self):
+        self.write(bulk.BulkWriter())
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL')
+    def test_copy(self):
+        self.write(bulk.CopyWriter())
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Maintains the models.CategoryClosure table for the Category tree.
+
+The tree is small and changes rarely, so the whole closure is recomputed
+whenever a category is saved or deleted. Categories loaded from fixtures
+(IE initial_data, which syncdb loads after creating the tables) don't do
+that, so the closure is also rebuilt when it is missing a category.
+"""
+
+from django.db import transaction
+
+from finance import models
+
+
+def closure(parents):
+    """Find every (ancestor, descendant, depth) in a tree.
+
+    Args:
+        parents: Dictionary of category id to parent category id (or None).
+
+    >>> sorted(closure({'a': None, 'a/b': 'a', 'a/b/c': 'a/b'}))
+    [('a', 'a', 0), ('a', 'a/b', 1), ('a', 'a/b/c', 2), ('a/b', 'a/b', 0), ('a/b', 'a/b/c', 1), ('a/b/c', 'a/b/c', 0)]
+    """
+    for descendant in parents:
+        ancestor = descendant
+        depth = 0
+        seen = set()
+        while ancestor in parents and ancestor not in seen:
+            seen.add(ancestor)
+            yield (ancestor, descendant, depth)
+            ancestor = parents[ancestor]
+            depth += 1
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute the closure table from the Category parents."""
+    parents = dict(models.Category.objects.values_list('category_id', 'parent'))
+
+    models.CategoryClosure.objects.all().delete()
+    rows = [models.CategoryClosure(
+                ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+            for ancestor, descendant, depth in closure(parents)]
+    models.CategoryClosure.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def ensure():
+    """Rebuild the closure if any category isn't in it."""
+    if (models.CategoryClosure.objects.filter(depth=0).count() !=
+            models.Category.objects.count()):
+        rebuild()
+
+
+def ancestors():
+    """Dictionary of category id to the ids of it and all its ancestors."""
+    ensure()
+    result = {}
+    for descendant, ancestor in models.CategoryClosure.objects.values_list(
+            'descendant', 'ancestor'):
+        result.setdefault(descendant, []).append(ancestor)
+    return result
+
+
+def under(q, category, field='primary_category'):
+    """Filter a query to things in a category or any of its subcategories.
+
+    Args:
+        q: QuerySet to filter, IE of models.Transaction.
+        category: models.Category or category id.
+        field: The category field on the model being queried.
+    """
+    ensure()
+    return q.filter(**{field + '__ancestor_links__ancestor': category})
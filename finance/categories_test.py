@@ -0,0 +1,92 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+
+from finance import categories
+from finance import models
+from finance import reports
+from finance import testing
+
+
+class CategoryClosureTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        self.health = models.Category.objects.create(
+            category_id="health", description="Health")
+        self.doctor = models.Category.objects.create(
+            category_id="health/doctor", description="Doctor",
+            parent=self.health)
+        self.dentist = models.Category.objects.create(
+            category_id="health/doctor/dentist", description="Dentist",
+            parent=self.doctor)
+        self.food = models.Category.objects.create(
+            category_id="groceries", description="Groceries")
+
+    def assertClosure(self, expected):
+        # Ignore the categories from the initial data.
+        q = models.CategoryClosure.objects.filter(
+            descendant__in=(self.health, self.doctor, self.dentist, self.food))
+        self.assertListEqual(sorted(q.values_list(
+            'ancestor', 'descendant', 'depth')), sorted(expected))
+
+    def test_closure(self):
+        self.assertClosure([
+            (u"groceries", u"groceries", 0),
+            (u"health", u"health", 0),
+            (u"health", u"health/doctor", 1),
+            (u"health", u"health/doctor/dentist", 2),
+            (u"health/doctor", u"health/doctor", 0),
+            (u"health/doctor", u"health/doctor/dentist", 1),
+            (u"health/doctor/dentist", u"health/doctor/dentist", 0),
+            ])
+
+        # Moving a category moves everything under it.
+        self.doctor.parent = self.food
+        self.doctor.save()
+        self.assertEqual(
+            sorted(categories.ancestors()[u"health/doctor/dentist"]),
+            [u"groceries", u"health/doctor", u"health/doctor/dentist"])
+
+        self.dentist.delete()
+        self.assertFalse(models.CategoryClosure.objects.filter(
+            descendant=u"health/doctor/dentist").exists())
+
+    def test_under(self):
+        for i, category in enumerate((self.health, self.dentist, self.food)):
+            self.create_transaction(
+                str(i), datetime.datetime(2012, 1, 5), -100*(i+1),
+                primary_category=category)
+
+        self.assertEqual(categories.under(
+            models.Transaction.objects.all(), self.doctor).count(), 1)
+        self.assertEqual(categories.under(
+            models.Transaction.objects.all(), self.health).count(), 2)
+
+        self.assertDictEqual(reports.rollup(reports.category_totals()), {
+            u"health": -300,
+            u"health/doctor": -200,
+            u"health/doctor/dentist": -200,
+            u"groceries": -300,
+            })
+
+    def test_raw(self):
+        # Loading a fixture doesn't rebuild the closure after every row...
+        models.Category(
+            category_id="health/nurse", description="Nurse", parent=self.health
+            ).save_base(raw=True)
+        self.assertFalse(models.CategoryClosure.objects.filter(
+            descendant="health/nurse").exists())
+
+        # ...it is rebuilt when the closure is next used.
+        self.assertItemsEqual(
+            categories.ancestors()[u"health/nurse"], [u"health/nurse", u"health"])
+
+    def test_empty(self):
+        # IE the table syncdb made on a database which already had categories.
+        models.CategoryClosure.objects.all().delete()
+        self.assertDictEqual(
+            reports.rollup({u"health/doctor/dentist": -100, u"unknown": -5}), {
+                u"health": -100, u"health/doctor": -100,
+                u"health/doctor/dentist": -100, u"unknown": -5})
@@ -0,0 +1,278 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Exports the transactions as a directory of columns for analysis.
+
+Each column is a NumPy .npy file which can be memory mapped with
+numpy.load(filename, mmap_mode='r'). Text columns (descriptions, categories
+and accounts) are dictionary encoded, the .npy file holds an index into a
+JSON list of the values.
+
+The .npy files are written directly so NumPy isn't needed to do the export.
+The header is padded to a fixed size so rows can be appended and the shape
+updated in place.
+
+Rows which were already exported are never rewritten. Instead meta.json
+records when the export ran, and if any exported transaction has been
+modified (IE removed, recategorized or redescribed) or deleted since then
+everything is exported again.
+"""
+
+import calendar
+import datetime
+import json
+import logging
+import os
+import struct
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from finance import models
+from finance import summary
+
+
+# The .npy format version 1.0 header, padded so the data is aligned.
+MAGIC = '\x93NUMPY\x01\x00'
+HEADER_SIZE = 128
+
+META = 'meta.json'
+
+# (column name, numpy dtype, struct format)
+COLUMNS = [
+    ('id', '<i8', 'q'),
+    ('account', '<i4', 'i'),
+    ('entered_date', '<M8[s]', 'q'),
+    ('amount', '<i8', 'q'),
+    ('description', '<i4', 'i'),
+    ('category', '<i4', 'i'),
+    ]
+
+# Columns which are dictionary encoded.
+DICTIONARIES = ['account', 'description', 'category']
+
+CHUNK_SIZE = 5000
+
+# How the time of the export is stored in meta.json.
+EXPORTED_AT_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def npy_header(dtype, rows):
+    """The header of a one dimensional .npy file.
+
+    >>> h = npy_header('<i8', 3)
+    >>> len(h)
+    128
+    >>> h[10:].strip()
+    "{'descr': '<i8', 'fortran_order': False, 'shape': (3,), }"
+    """
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%i,), }" % (
+        dtype, rows)
+    header = header.ljust(HEADER_SIZE - len(MAGIC) - 2 - 1) + '\n'
+    return MAGIC + struct.pack('<H', len(header)) + header
+
+
+def timestamp(value):
+    """Seconds since the epoch for a datetime.
+
+    Naive datetimes are in settings.TIME_ZONE, like everywhere else.
+    """
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.get_default_timezone())
+    return calendar.timegm(value.utctimetuple())
+
+
+class Dictionary(object):
+    """Maps values to their index in a list stored as JSON."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.values = []
+        if os.path.exists(filename):
+            self.values = json.load(open(filename))
+        self.codes = dict((v, i) for i, v in enumerate(self.values))
+
+    def encode(self, value):
+        try:
+            return self.codes[value]
+        except KeyError:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            return code
+
+    def save(self):
+        tmp = self.filename + '.tmp'
+        json.dump(self.values, open(tmp, 'w'))
+        os.rename(tmp, self.filename)
+
+
+class Column(object):
+    """A .npy file which rows are appended to."""
+
+    def __init__(self, filename, dtype, fmt, rows):
+        self.filename = filename
+        self.dtype = dtype
+        self.fmt = fmt
+        self.rows = rows
+
+        if not os.path.exists(filename):
+            open(filename, 'wb').write(npy_header(dtype, 0))
+        self.f = open(filename, 'r+b')
+
+        # Drop anything written after the last complete export.
+        self.f.truncate(HEADER_SIZE + rows * struct.calcsize('<' + fmt))
+        self.f.seek(0, os.SEEK_END)
+
+    def append(self, values):
+        self.f.write(struct.pack('<%i%s' % (len(values), self.fmt), *values))
+        self.rows += len(values)
+
+    def close(self):
+        self.f.seek(0)
+        self.f.write(npy_header(self.dtype, self.rows))
+        self.f.close()
+
+
+class Exporter(object):
+    """Writes transactions to a directory of columns.
+
+    Only transactions added since the last export are written, unless some
+    already exported have changed, then everything is written again.
+    """
+
+    def __init__(self, directory, full=False):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        if full:
+            self.remove()
+
+        self.meta = {'last_id': 0, 'rows': 0}
+        if os.path.exists(self.path(META)):
+            self.meta = json.load(open(self.path(META)))
+
+        # Set by export() when it had to start again.
+        self.restarted = False
+
+    def remove(self):
+        """Remove a previous export."""
+        names = [META]
+        names.extend(name + '.npy' for name, dtype, fmt in COLUMNS)
+        names.extend(name + '.json' for name in DICTIONARIES)
+        for name in names:
+            if os.path.exists(self.path(name)):
+                os.unlink(self.path(name))
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def transactions(self):
+        """The transactions which haven't been exported yet, in id order."""
+        q = models.Transaction.objects.filter(
+            removed_by=None, id__gt=self.meta['last_id'])
+        q = q.extra(select={'category': summary.category_sql()})
+        return q.order_by('id').values_list(
+            'id', 'account__account_id', 'imported_entered_date',
+            'imported_amount', 'imported_description', 'override_description',
+            'category')
+
+    def stale(self):
+        """Have any of the rows already exported changed?
+
+        Transactions which are changed have their modified time set, so only
+        the ones changed since the export need to be looked at. Deleted
+        transactions are noticed by the summary counting fewer transactions
+        than were exported.
+        """
+        if not self.meta['rows']:
+            return False
+        if 'exported_at' not in self.meta:
+            # Exported by an older version.
+            return True
+
+        exported_at = datetime.datetime.strptime(
+            self.meta['exported_at'], EXPORTED_AT_FORMAT)
+        if models.Transaction.objects.filter(
+                modified__gte=exported_at,
+                id__lte=self.meta['last_id']).exists():
+            return True
+
+        # The summary counts every transaction which hasn't been removed.
+        total = models.MonthlySummary.objects.aggregate(
+            count=Sum('count'))['count'] or 0
+        new = models.Transaction.objects.filter(
+            removed_by=None, id__gt=self.meta['last_id']).count()
+        return total - new != self.meta['rows']
+
+    def export(self):
+        """Append the new transactions to the columns.
+
+        Returns:
+            The number of rows written.
+        """
+        # Anything which changes after this is noticed by the next export.
+        exported_at = datetime.datetime.now()
+        if self.stale():
+            logging.warning(
+                "Transactions already exported have changed, exporting "
+                "everything again.")
+            self.remove()
+            self.meta = {'last_id': 0, 'rows': 0}
+            self.restarted = True
+
+        dictionaries = dict(
+            (name, Dictionary(self.path(name + '.json'))) for name in DICTIONARIES)
+        columns = [
+            Column(self.path(name + '.npy'), dtype, fmt, self.meta['rows'])
+            for name, dtype, fmt in COLUMNS]
+
+        last_id = self.meta['last_id']
+        rows = 0
+        chunk = []
+        for row in self.transactions().iterator():
+            chunk.append(row)
+            if len(chunk) >= CHUNK_SIZE:
+                self.write(columns, dictionaries, chunk)
+                rows += len(chunk)
+                last_id = chunk[-1][0]
+                chunk = []
+        if chunk:
+            self.write(columns, dictionaries, chunk)
+            rows += len(chunk)
+            last_id = chunk[-1][0]
+
+        for column in columns:
+            column.close()
+        for dictionary in dictionaries.values():
+            dictionary.save()
+
+        # Only once everything else is on disk are the new rows counted.
+        self.meta['last_id'] = last_id
+        self.meta['rows'] += rows
+        self.meta['exported_at'] = exported_at.strftime(EXPORTED_AT_FORMAT)
+        self.meta['columns'] = [name for name, dtype, fmt in COLUMNS]
+        tmp = self.path(META + '.tmp')
+        json.dump(self.meta, open(tmp, 'w'), indent=2)
+        os.rename(tmp, self.path(META))
+        return rows
+
+    def write(self, columns, dictionaries, chunk):
+        accounts = dictionaries['account']
+        descriptions = dictionaries['description']
+        categories = dictionaries['category']
+
+        values = ([], [], [], [], [], [])
+        for (trans_id, account, entered_date, amount, description,
+                override_description, category) in chunk:
+            values[0].append(trans_id)
+            values[1].append(accounts.encode(account))
+            values[2].append(timestamp(entered_date))
+            values[3].append(amount)
+            values[4].append(descriptions.encode(
+                override_description or description))
+            values[5].append(categories.encode(category or 'unknown'))
+
+        for column, column_values in zip(columns, values):
+            column.append(column_values)
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+from django.utils.timezone import utc
+
+from finance import columnar
+from finance import models
+from finance import testing
+
+
+class ExporterTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create(self, trans_id, date, amount, description):
+        return self.create_transaction(
+            trans_id, date, amount, imported_description=description)
+
+    def load(self, name):
+        """Read a column back without needing NumPy."""
+        data = open(os.path.join(self.directory, name + '.npy'), 'rb').read()
+        self.assertEqual(data[:len(columnar.MAGIC)], columnar.MAGIC)
+        header = data[:columnar.HEADER_SIZE]
+
+        fmt = dict((n, f) for n, d, f in columnar.COLUMNS)[name]
+        rows = (len(data) - columnar.HEADER_SIZE) / struct.calcsize(fmt)
+        self.assertIn("'shape': (%i,)" % rows, header)
+        return list(struct.unpack(
+            '<%i%s' % (rows, fmt), data[columnar.HEADER_SIZE:]))
+
+    def test_append(self):
+        self.create("1", datetime.datetime(2012, 1, 5), 100, "A")
+        self.create("2", datetime.datetime(2012, 1, 6), -50, "B")
+        self.assertEqual(columnar.Exporter(self.directory).export(), 2)
+        self.assertEqual(columnar.Exporter(self.directory).export(), 0)
+
+        self.create("3", datetime.datetime(2012, 1, 7), -20, "A")
+        self.assertEqual(columnar.Exporter(self.directory).export(), 1)
+
+        self.assertListEqual(self.load('amount'), [100, -50, -20])
+        self.assertListEqual(self.load('description'), [0, 1, 0])
+        # Midnight in Sydney (settings.TIME_ZONE) is 1pm UTC the day before.
+        self.assertListEqual(self.load('entered_date'), [
+            1325682000, 1325768400, 1325854800])
+        self.assertListEqual(json.load(open(os.path.join(
+            self.directory, 'description.json'))), ["A", "B"])
+
+        # Starting again gives the same result.
+        self.assertEqual(
+            columnar.Exporter(self.directory, full=True).export(), 3)
+        self.assertListEqual(self.load('amount'), [100, -50, -20])
+
+    def test_changed(self):
+        a = self.create("1", datetime.datetime(2012, 1, 5), 100, "A")
+        b = self.create("2", datetime.datetime(2012, 1, 6), -50, "B")
+        self.create("3", datetime.datetime(2012, 1, 7), -20, "C")
+        self.assertEqual(columnar.Exporter(self.directory).export(), 3)
+
+        # Changing a row which was already exported means starting again.
+        a.override_description = "D"
+        a.save()
+        b.removed_by = self.imported()
+        b.save()
+        exporter = columnar.Exporter(self.directory)
+        self.assertEqual(exporter.export(), 2)
+        self.assertTrue(exporter.restarted)
+        self.assertListEqual(self.load('amount'), [100, -20])
+        self.assertListEqual(json.load(open(os.path.join(
+            self.directory, 'description.json'))), ["D", "C"])
+
+        # Only adding rows doesn't.
+        self.create("4", datetime.datetime(2012, 1, 8), -30, "A")
+        exporter = columnar.Exporter(self.directory)
+        self.assertEqual(exporter.export(), 1)
+        self.assertFalse(exporter.restarted)
+        self.assertListEqual(self.load('amount'), [100, -20, -30])
+
+    def test_deleted(self):
+        self.create("1", datetime.datetime(2012, 1, 5), 100, "A")
+        b = self.create("2", datetime.datetime(2012, 1, 6), -50, "B")
+        self.assertEqual(columnar.Exporter(self.directory).export(), 2)
+
+        b.delete()
+        exporter = columnar.Exporter(self.directory)
+        self.assertEqual(exporter.export(), 1)
+        self.assertTrue(exporter.restarted)
+        self.assertListEqual(self.load('amount'), [100])
+
+    def test_new_rows_changed(self):
+        self.create("1", datetime.datetime(2012, 1, 5), 100, "A")
+        self.assertEqual(columnar.Exporter(self.directory).export(), 1)
+
+        # Changing rows which haven't been exported yet (IE by the helpers
+        # after an import) doesn't mean starting again, and doesn't look at
+        # every exported row to find out.
+        new = self.create("2", datetime.datetime(2012, 1, 6), -50, "B")
+        new.override_description = "C"
+        new.save()
+        exporter = columnar.Exporter(self.directory)
+        with self.assertNumQueries(3):
+            self.assertFalse(exporter.stale())
+        self.assertEqual(exporter.export(), 1)
+        self.assertFalse(exporter.restarted)
+        self.assertListEqual(json.load(open(os.path.join(
+            self.directory, 'description.json'))), ["A", "C"])
+
+    def test_timestamp(self):
+        self.assertEqual(columnar.timestamp(
+            datetime.datetime(2012, 7, 1)), 1341064800)
+        self.assertEqual(columnar.timestamp(
+            datetime.datetime(2012, 7, 1, tzinfo=utc)), 1341100800)
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Database connection tuning.
+
+SQLite connections are switched to write-ahead logging, so the admin and
+reports can keep reading while an import is writing, and given a bigger page
+cache and memory mapped I/O.
+
+Imports and rebuilds can wrap themselves in bulk_load() to relax durability
+while they run. If the program crashes during a bulk load, write-ahead logging
+keeps the database intact. If the operating system crashes or the power is
+lost, the most recent transactions can be lost and the database can be
+corrupted, as synchronous is off.
+"""
+
+import contextlib
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+# Set on every new SQLite connection.
+PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    # Safe with WAL, only the last transactions can be lost on power failure.
+    ('synchronous', 'NORMAL'),
+    # Negative sizes are in KiB, so 64MiB.
+    ('cache_size', '-65536'),
+    ('mmap_size', str(256 * 1024 * 1024)),
+    ]
+
+# Set for the length of a bulk_load().
+BULK_PRAGMAS = [
+    ('synchronous', 'OFF'),
+    ('cache_size', '-262144'),
+    ('temp_store', 'MEMORY'),
+    ]
+
+
+def configure(connection):
+    """Apply the PRAGMAS to a new connection."""
+    if connection.vendor != 'sqlite':
+        return
+
+    cursor = connection.cursor()
+    for name, value in PRAGMAS:
+        cursor.execute('PRAGMA %s = %s' % (name, value))
+
+
+def pragmas(cursor, names):
+    """The current value of some pragmas."""
+    values = []
+    for name in names:
+        cursor.execute('PRAGMA %s' % name)
+        values.append((name, cursor.fetchone()[0]))
+    return values
+
+
+@contextlib.contextmanager
+def bulk_load(using=DEFAULT_DB_ALIAS):
+    """Relax durability while loading a lot of data.
+
+    Only use this for data which can be loaded again, a power loss during the
+    load can lose or corrupt the most recent transactions. The previous settings are restored afterwards. Does nothing for databases
+    other than SQLite, or when already inside a transaction (SQLite doesn't
+    allow the settings to change then).
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+
+    cursor = connection.cursor()
+    previous = pragmas(cursor, [name for name, value in BULK_PRAGMAS])
+    for name, value in BULK_PRAGMAS:
+        cursor.execute('PRAGMA %s = %s' % (name, value))
+    try:
+        yield
+    finally:
+        cursor = connection.cursor()
+        for name, value in previous:
+            cursor.execute('PRAGMA %s = %s' % (name, value))
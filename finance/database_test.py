@@ -0,0 +1,23 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import unittest
+
+from django import test as djangotest
+from django.db import connection
+
+from finance import database
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite only')
+class BulkLoadTest(djangotest.TransactionTestCase):
+    def test_restored(self):
+        names = [name for name, value in database.BULK_PRAGMAS]
+        before = database.pragmas(connection.cursor(), names)
+
+        with database.bulk_load():
+            self.assertEqual(
+                dict(database.pragmas(connection.cursor(), names))['synchronous'], 0)
+
+        self.assertListEqual(database.pragmas(connection.cursor(), names), before)
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Streams transactions out as CSV or JSON lines.
+
+Transactions are fetched in fixed size chunks ordered by id (rather than with
+one big cursor, which some database drivers read completely into memory) so
+memory use stays flat no matter how many rows are exported.
+"""
+
+import csv
+import json
+
+from finance import models
+from finance import reports
+from finance import summary
+from finance.utils import dollar_fmt
+
+
+CHUNK_SIZE = 2000
+
+FIELDS = [
+    'id', 'account', 'entered_date', 'effective_date', 'description',
+    'location', 'amount', 'amount_display', 'currency', 'category',
+    ]
+
+
+def transactions(accounts=None, start_date=None, end_date=None, category=None):
+    """The transactions to export.
+
+    Args:
+        accounts: List of account ids or short ids to include, defaults to all.
+        start_date: Only include transactions entered on or after this date.
+        end_date: Only include transactions entered on or before this date.
+        category: Only include transactions in this category (or under it).
+    """
+    q = reports.transactions(start_date, end_date)
+    if accounts:
+        # excluded_accounts just looks up the ids of the accounts.
+        q = q.filter(account__in=reports.excluded_accounts(accounts))
+
+    category_sql = summary.category_sql()
+    q = q.extra(select={'category': category_sql})
+    if category is not None:
+        q = q.extra(
+            where=["%s IN (SELECT descendant_id FROM %s WHERE ancestor_id = %%s)" % (
+                category_sql, models.CategoryClosure._meta.db_table)],
+            params=[category])
+    return q
+
+
+def rows(q, chunk_size=CHUNK_SIZE):
+    """Turn a transaction query into dictionaries, a chunk at a time."""
+    q = q.values_list(
+        'id', 'account__account_id', 'imported_entered_date',
+        'imported_effective_date', 'imported_description',
+        'override_description', 'imported_location', 'override_location',
+        'imported_amount', 'account__currency__currency_id',
+        'account__currency__symbol', 'category').order_by('id')
+
+    last_id = 0
+    while True:
+        chunk = list(q.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+
+        for (trans_id, account, entered_date, effective_date, description,
+                override_description, location, override_location, amount,
+                currency, symbol, category) in chunk:
+            yield {
+                'id': trans_id,
+                'account': account,
+                'entered_date': entered_date.isoformat(),
+                'effective_date': effective_date and effective_date.isoformat(),
+                'description': override_description or description,
+                'location': override_location or location,
+                'amount': amount,
+                'amount_display': dollar_fmt(amount, symbol),
+                'currency': currency,
+                'category': category or 'unknown',
+                }
+
+
+def write_csv(output, rows):
+    writer = csv.DictWriter(output, FIELDS)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(dict(
+            (k, v.encode('utf-8') if isinstance(v, unicode) else v)
+            for k, v in row.items()))
+        count += 1
+    return count
+
+
+def write_jsonl(output, rows):
+    count = 0
+    for row in rows:
+        output.write(json.dumps(row, sort_keys=True))
+        output.write('\n')
+        count += 1
+    return count
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    }
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import cStringIO as SIO
+import datetime
+import json
+import os.path
+import shutil
+import sys
+import tempfile
+
+from django.core.management import call_command
+
+from finance import export
+from finance import models
+from finance import testing
+
+
+class ExportTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        health = models.Category.objects.create(
+            category_id="health", description="Health")
+        dentist = models.Category.objects.create(
+            category_id="health/dentist", description="Dentist", parent=health)
+
+        for i, category in enumerate((health, dentist, None, dentist)):
+            self.create_transaction(
+                str(i), datetime.datetime(2012, 1, i+1), -12345*(i+1),
+                imported_description="Trans %i" % i, primary_category=category)
+
+    def export(self, chunk_size=2, **kw):
+        output = SIO.StringIO()
+        count = export.write_jsonl(
+            output, export.rows(export.transactions(**kw), chunk_size))
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(count, len(rows))
+        return rows
+
+    def test_jsonl(self):
+        rows = self.export()
+        self.assertListEqual(
+            [row['description'] for row in rows],
+            ["Trans 0", "Trans 1", "Trans 2", "Trans 3"])
+        self.assertEqual(rows[1]['amount'], -24690)
+        self.assertEqual(rows[1]['amount_display'], "$-246.90")
+        self.assertEqual(rows[2]['category'], "unknown")
+
+    def test_filters(self):
+        self.assertListEqual(
+            [row['description'] for row in self.export(category="health")],
+            ["Trans 0", "Trans 1", "Trans 3"])
+        self.assertListEqual(
+            [row['description'] for row in self.export(
+                category="health/dentist",
+                start_date=datetime.datetime(2012, 1, 3))],
+            ["Trans 3"])
+        self.assertListEqual(self.export(accounts=["other"]), [])
+
+    def test_csv(self):
+        output = SIO.StringIO()
+        export.write_csv(output, export.rows(export.transactions()))
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], ",".join(export.FIELDS))
+        self.assertEqual(len(lines), 5)
+
+    def test_command_only_accounts(self):
+        other = self.create_account("account_2", "acc2")
+        self.create_transaction(
+            "other", datetime.datetime(2012, 1, 1), 100, account=other,
+            imported_description="Other")
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "export.jsonl")
+
+        stdout = sys.stdout
+        sys.stdout = SIO.StringIO()
+        try:
+            call_command(
+                'export', path, format='jsonl', only_accounts=["acc2"])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(output, "Exported 1 transactions.\n")
+        with open(path) as f:
+            self.assertListEqual(
+                [json.loads(line)['description'] for line in f], ["Other"])
@@ -4,5 +4,6 @@
 
 import categorizer
 import fees
+import pipeline
 import reworker
 import transfers
@@ -2,7 +2,190 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 sw=4 et sts=4 ai:
 
+import datetime
+import hashlib
+import logging
+
+from django.db import connection, transaction
+from django.db import models as django_models
+
 from finance import models
+from finance import search
+from finance import summary
+from finance import versions
+
+
+# Transactions in each UPDATE. Each one takes three query parameters, so this
+# stays under SQLite's limit of 999.
+UPDATE_SIZE = 300
+
+
+def update(name, values, modified):
+    """Set a field of some transactions, each to its own value.
+
+    Args:
+        name: Name of the models.Transaction field.
+        values: Dictionary of transaction id to the new value.
+        modified: Time to set the modified field to.
+    """
+    if len(set(values.values())) == 1:
+        value = values.values()[0]
+        trans_ids = list(values)
+        for i in range(0, len(trans_ids), 500):
+            models.Transaction.objects.filter(id__in=trans_ids[i:i+500]).update(
+                **{name: value, 'modified': modified})
+        return
+
+    opts = models.Transaction._meta
+    field = opts.get_field(name)
+    qn = connection.ops.quote_name
+
+    items = sorted(values.items())
+    for i in range(0, len(items), UPDATE_SIZE):
+        chunk = items[i:i+UPDATE_SIZE]
+
+        case = "CASE %s %s END" % (
+            qn(opts.pk.column), " ".join(["WHEN %s THEN %s"] * len(chunk)))
+        if connection.vendor == 'postgresql':
+            # The values have no type of their own, so would be taken as text.
+            case = "CAST(%s AS %s)" % (case, field.db_type(connection))
+
+        params = []
+        for trans_id, value in chunk:
+            if isinstance(value, django_models.Model):
+                value = value.pk
+            params.extend([trans_id, field.get_db_prep_save(value, connection)])
+        params.append(opts.get_field('modified').get_db_prep_save(
+            modified, connection))
+        params.extend(trans_id for trans_id, value in chunk)
+
+        connection.cursor().execute(
+            "UPDATE %s SET %s = %s, %s = %%s WHERE %s IN (%s)" % (
+                qn(opts.db_table), qn(field.column), case, qn('modified'),
+                qn(opts.pk.column), ", ".join(["%s"] * len(chunk))),
+            params)
+
+
+class UnitOfWork(object):
+    """Collects the changes helpers make to a batch of transactions.
+
+    Rather than every helper saving a transaction after it changes it, the
+    changes are recorded here and written with a handful of bulk queries when
+    flush() is called at the end of the pipeline.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        """Forget all the recorded changes, IE once they are written."""
+        # Name of the helper currently making changes.
+        self.helper = None
+        # Fields changed by each helper.
+        self.changed = {}
+
+        # Transaction id -> {field: value} which need to be written.
+        self.dirty = {}
+        # (Transaction, Category) suggestions which need to be written.
+        self.categories = []
+        # RelatedTransaction objects which need to be written.
+        self.related = []
+
+    def set(self, trans, field, value):
+        """Set a field on a transaction, recording it if it changed."""
+        if getattr(trans, field) == value:
+            return False
+
+        setattr(trans, field, value)
+        self.dirty.setdefault(trans.id, {})[field] = value
+        self.changed.setdefault(self.helper, set()).add(field)
+        return True
+
+    def suggested_categories(self, trans):
+        """The suggested categories for a transaction, including unsaved ones."""
+        categories = list(trans.suggested_categories.all())
+        categories.extend(c for t, c in self.categories if t.id == trans.id)
+        return categories
+
+    def suggest_category(self, trans, category):
+        if category in self.suggested_categories(trans):
+            return False
+
+        self.categories.append((trans, category))
+        self.changed.setdefault(self.helper, set()).add('suggested_categories')
+        return True
+
+    def related_transactions(self, trans, type=None, relationship=None, fee=None):
+        """Like models.Transaction.related_transactions, including unsaved ones."""
+        related = list(trans.related_transactions(
+            type=type, relationship=relationship, fee=fee))
+
+        for r in self.related:
+            if trans.id not in (r.trans_from_id, r.trans_to_id):
+                continue
+            if type is not None and r.type != type:
+                continue
+            if relationship is not None and r.relationship != relationship:
+                continue
+            if fee is not None and r.fee_id != fee.id:
+                continue
+            related.append(r)
+        return related
+
+    def associate(self, related):
+        self.related.append(related)
+        self.changed.setdefault(self.helper, set()).add('reference')
+
+    @transaction.atomic
+    def flush(self):
+        """Write all the recorded changes to the database."""
+        for helper, fields in sorted(self.changed.items()):
+            logging.info("%s changed %s", helper, ", ".join(sorted(fields)))
+
+        # Each changed field is written with a single UPDATE, whether the
+        # transactions were given the same value or not.
+        values = {}
+        for trans_id, fields in self.dirty.items():
+            for name, value in fields.items():
+                values.setdefault(name, {})[trans_id] = value
+
+        # Bulk updates don't set the modified time, see finance.columnar.
+        now = datetime.datetime.now()
+        for name, field_values in sorted(values.items()):
+            update(name, field_values, now)
+
+        if self.categories:
+            through = models.Transaction.suggested_categories.through
+            through.objects.bulk_create([
+                through(transaction_id=trans.id, category_id=category.pk)
+                for trans, category in self.categories])
+            trans_ids = list(set(trans.id for trans, category in self.categories))
+            for i in range(0, len(trans_ids), 500):
+                models.Transaction.objects.filter(
+                    id__in=trans_ids[i:i+500]).update(modified=now)
+
+        if self.related:
+            models.RelatedTransaction.objects.bulk_create(self.related)
+
+        # The bulk writes above don't send signals, so tell the summary about
+        # any transactions which were recategorized or linked as transfers.
+        summary.changed_transactions(set(
+            [trans_id for trans_id, fields in self.dirty.items()
+             if 'primary_category' in fields] +
+            [trans.id for trans, category in self.categories] +
+            [trans_id for related in self.related
+             if related.relationship == "TRANSFER"
+             for trans_id in (related.trans_from_id, related.trans_to_id)]))
+        search.changed_transactions(
+            trans_id for trans_id, fields in self.dirty.items()
+            if set(fields) & set(search.FIELDS))
+        changed = set(self.dirty)
+        changed.update(trans.id for trans, category in self.categories)
+        for related in self.related:
+            changed.update([related.trans_from_id, related.trans_to_id])
+        versions.changed_transactions(changed)
+
+        self._reset()
 
 
 class Helper(object):
@@ -15,8 +198,67 @@ class Helper(object):
      * etc
     """
 
+    # Bump this when the helper's code changes in a way which means old
+    # transactions should be looked at again.
+    VERSION = 1
+
+    # Set when the helper looks at transactions in other accounts, such
+    # helpers can't be run in parallel with other accounts.
+    CROSS_ACCOUNT = False
+
+    # Set (to a datetime.timedelta) when the helper links a transaction to
+    # ones entered up to this long after it. Transactions entered this long
+    # before the ones the helper hasn't seen are given to it again, as what
+    # they link to may have only just been imported.
+    LOOK_BACK = None
+
+    @property
+    def name(self):
+        return "%s.%s" % (self.__class__.__module__, self.__class__.__name__)
+
+    def rules(self, account):
+        """Return the rows which control what this helper does to an account.
+
+        When any of these change, every transaction in the account is
+        processed again.
+        """
+        return []
+
+    def rules_version(self, account):
+        rules = repr((self.VERSION, list(self.rules(account))))
+        return hashlib.sha1(rules).hexdigest()
+
+    def progress(self, account, full=False):
+        """Get the models.HelperProgress for this helper on an account.
+
+        Args:
+            account: models.Account the helper will be run over.
+            full: Process every transaction again, even if the rules have not
+                  changed.
+        """
+        progress, _ = models.HelperProgress.objects.get_or_create(
+            helper=self.name, account=account)
+
+        rules_version = self.rules_version(account)
+        if full or progress.rules_version != rules_version:
+            progress.last_transaction = 0
+            progress.rules_version = rules_version
+        return progress
+
     def associate(self, a, b, relationship, **kw):
         return models.RelatedTransaction(trans_from=a, trans_to=b, type="A", relationship=relationship, **kw)
 
-    def handle(self, account, transaction):
+    def handle_batch(self, account, transactions, work):
+        """Process a batch of transactions from an account.
+
+        Args:
+            account: models.Account the transactions are from.
+            transactions: List of models.Transaction.
+            work: UnitOfWork which changes should be recorded in.
+        """
+        work.helper = self.name
+        for trans in transactions:
+            self.handle(account, trans, work)
+
+    def handle(self, account, trans, work):
         return
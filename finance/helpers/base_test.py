@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from finance import models
+from finance import search
+from finance import summary
+from finance import testing
+from finance.helpers import base
+
+
+class RulesHelper(base.Helper):
+    RULES = ["a"]
+
+    def rules(self, account):
+        return self.RULES
+
+
+class HelperProgressTest(testing.AccountTestCase):
+    def test_progress_kept(self):
+        helper = RulesHelper()
+        progress = helper.progress(self.account)
+        self.assertEqual(progress.last_transaction, 0)
+        progress.last_transaction = 10
+        progress.save()
+
+        progress = helper.progress(self.account)
+        self.assertEqual(progress.last_transaction, 10)
+        self.assertEqual(progress.helper, "%s.RulesHelper" % __name__)
+
+    def test_progress_full(self):
+        helper = RulesHelper()
+        progress = helper.progress(self.account)
+        progress.last_transaction = 10
+        progress.save()
+
+        self.assertEqual(helper.progress(self.account, full=True).last_transaction, 0)
+
+    def test_progress_rules_changed(self):
+        helper = RulesHelper()
+        progress = helper.progress(self.account)
+        progress.last_transaction = 10
+        progress.save()
+
+        helper.RULES = ["b"]
+        self.assertEqual(helper.progress(self.account).last_transaction, 0)
+
+
+class UnitOfWorkTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        self.category = models.Category.objects.create(
+            category_id="food", description="Food")
+
+        self.trans = []
+        for i in range(3):
+            self.trans.append(self.create_transaction(
+                str(i), datetime.datetime(2012, 1, 1), 100,
+                imported_description="desc %i" % i))
+
+    def test_set(self):
+        work = base.UnitOfWork()
+        self.assertTrue(work.set(self.trans[0], "override_description", "a"))
+        self.assertFalse(work.set(self.trans[0], "override_description", "a"))
+        self.assertTrue(work.set(self.trans[1], "override_description", "a"))
+        self.assertTrue(work.set(self.trans[2], "primary_category", self.category))
+
+        self.assertEqual(
+            models.Transaction.objects.filter(override_description="a").count(), 0)
+        # A savepoint, two updates, finding which summary months to refresh,
+        # updating the search index for the changed descriptions, finding and
+        # bumping the version of the account, then releasing the savepoint.
+        with summary.deferred():
+            with self.assertNumQueries(7 + (2 if search.installed() else 0)):
+                work.flush()
+        self.assertEqual(
+            models.Transaction.objects.filter(override_description="a").count(), 2)
+        self.assertEqual(
+            models.Transaction.objects.get(id=self.trans[2].id).primary_category,
+            self.category)
+
+    def test_set_each(self):
+        work = base.UnitOfWork()
+        for i, trans in enumerate(self.trans):
+            work.set(trans, "override_location", "place %i" % i)
+        work.set(self.trans[0], "primary_category", self.category)
+
+        # The different locations are written with one UPDATE.
+        table = models.Transaction._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            work.flush()
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if 'UPDATE "%s"' % table in query['sql']]), 2)
+
+        self.assertListEqual(
+            list(models.Transaction.objects.order_by('id').values_list(
+                'override_location', 'primary_category')),
+            [(u"place 0", u"food"), (u"place 1", None), (u"place 2", None)])
+
+    def test_suggest_category(self):
+        work = base.UnitOfWork()
+        self.assertTrue(work.suggest_category(self.trans[0], self.category))
+        self.assertFalse(work.suggest_category(self.trans[0], self.category))
+        work.flush()
+
+        self.assertEqual(
+            list(self.trans[0].suggested_categories.all()), [self.category])
+        self.assertFalse(work.suggest_category(self.trans[0], self.category))
+
+    def test_related_transactions(self):
+        work = base.UnitOfWork()
+        work.associate(base.Helper().associate(
+            self.trans[0], self.trans[1], "TRANSFER"))
+
+        self.assertEqual(
+            len(work.related_transactions(self.trans[1], relationship="TRANSFER")), 1)
+        self.assertEqual(
+            len(work.related_transactions(self.trans[1], relationship="FEE")), 0)
+        work.flush()
+
+        self.assertEqual(
+            len(self.trans[0].related_transactions(relationship="TRANSFER")), 1)
@@ -21,9 +21,18 @@ class Categorizer(base.Helper):
     def __init__(self, *args, **kw):
         base.Helper.__init__(self, *args, **kw)
 
-        self.categorizers = models.Categorizer.objects.all()
-
-    def handle(self, account, trans):
+        self.categorizers = list(models.Categorizer.objects.all(
+            ).select_related('category'
+            ).prefetch_related('accounts', 'regex'))
+
+    def rules(self, account):
+        return models.Categorizer.objects.all().values_list(
+            'id', 'accounts', 'amount_minimum', 'amount_maximum', 'personal',
+            'category', 'regex__field', 'regex__regex', 'regex__regex_type',
+            'regex__regex_flags',
+            ).order_by('id', 'accounts', 'regex')
+
+    def handle(self, account, trans, work):
         for categorizer in self.categorizers:
             if len(categorizer.accounts_set) > 0:
                 if account not in categorizer.accounts_set:
@@ -43,7 +52,5 @@ class Categorizer(base.Helper):
             else:
                 continue
 
-            if categorizer.category not in trans.suggested_categories.all():
+            if work.suggest_category(trans, categorizer.category):
                 logging.info("Adding category %s", categorizer.category)
-                trans.suggested_categories.add(categorizer.category)
-                trans.save()
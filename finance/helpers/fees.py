@@ -17,14 +17,33 @@ from finance.helpers import base
 class Fees(base.Helper):
     """Finds fees associated with transactions."""
 
+    # Fees are charged up to this long after the transaction.
+    LOOK_BACK = datetime.timedelta(days=2)
+
     def __init__(self, *args, **kw):
         base.Helper.__init__(self, *args, **kw)
 
+        # Account id -> list of models.Fee for that account.
+        self.fees = {}
+
+    def rules(self, account):
+        return account.fee_set.all().values_list(
+            'id', 'amount', 'type', 'model', 'regex__field', 'regex__regex',
+            'regex__regex_type', 'regex__regex_flags',
+            ).order_by('id', 'regex')
+
     def associate(self, fee, a, b):
         return base.Helper.associate(self, a, b, relationship="FEE", fee=fee)
 
-    def handle(self, account, trans):
-        for fee in account.fee_set.all():
+    def handle_batch(self, account, transactions, work):
+        if account.pk not in self.fees:
+            self.fees[account.pk] = list(account.fee_set.all().prefetch_related('regex'))
+
+        if self.fees[account.pk]:
+            base.Helper.handle_batch(self, account, transactions, work)
+
+    def handle(self, account, trans, work):
+        for fee in self.fees[account.pk]:
 
             # Check the regex patterns match
             for regex in fee.regex.all():
@@ -34,7 +53,7 @@ class Fees(base.Helper):
                 continue
 
             # Check this association hasn't already been created
-            fee_already = trans.related_transactions(relationship="FEE", fee=fee)
+            fee_already = work.related_transactions(trans, relationship="FEE", fee=fee)
             if len(fee_already) > 0:
                 print "Fee already associated for %60s ---> %s" % (trans, fee_already[0])
                 continue
@@ -43,7 +62,7 @@ class Fees(base.Helper):
             q = models.Transaction.objects.all(
                 ).filter(account__exact=account
                 ).filter(imported_entered_date__gte=trans.imported_entered_date
-                ).filter(imported_entered_date__lt=trans.imported_entered_date+datetime.timedelta(days=2)
+                ).filter(imported_entered_date__lt=trans.imported_entered_date+self.LOOK_BACK
                 ).order_by("imported_entered_date"
                 ).exclude(trans_id__exact=trans.trans_id
                 )
@@ -64,12 +83,12 @@ class Fees(base.Helper):
                 raise TypeError("Unknown fee type %s (%s)." % (regex.type, regex))
 
             for fee_trans in q:
-                fee_related = fee_trans.related_transactions(relationship="FEE", fee=fee)
+                fee_related = work.related_transactions(fee_trans, relationship="FEE", fee=fee)
                 if len(fee_related) == 0:
                     print "Associating %-30s (%10i) with %s (%8i)" % (
                         trans.imported_description, trans.imported_amount,
                         fee_trans.imported_description, fee_trans.imported_amount)
-                    self.associate(fee, trans, fee_trans).save()
+                    work.associate(self.associate(fee, trans, fee_trans))
                     return
                 else:
                     print "Fee associated with other transaction", fee_related
@@ -0,0 +1,246 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+The pipeline runs the helpers over the transactions in each account.
+
+Most helpers only look at a single account, so on PostgreSQL accounts can be
+processed in parallel by a pool of worker processes. Helpers which look across
+accounts (such as transfer matching) are run afterwards in a final merge phase.
+"""
+
+import itertools
+import logging
+import multiprocessing
+
+from django.db import connection
+from django.db.models import Max, Min
+from django.db.models.query import prefetch_related_objects
+
+from finance import database
+from finance import models
+from finance.helpers import base
+from finance.helpers import categorizer
+from finance.helpers import fees
+from finance.helpers import reworker
+from finance.helpers import transfers
+
+
+# Number of transactions given to each helper at once.
+BATCH_SIZE = 500
+
+
+def active_helpers():
+    """Create the helpers, in the order they should be run."""
+    return [
+        categorizer.Categorizer(),
+        fees.Fees(),
+        reworker.LocationFixer(),
+        transfers.Transfers(),
+        ]
+
+
+def batches(iterable, size):
+    """Split an iterable into lists of at most size items."""
+    iterable = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterable, size))
+        if not batch:
+            return
+        yield batch
+
+
+def look_back(helper, seen, earliest, latest):
+    """Transactions a helper has seen which it should be given again.
+
+    Args:
+        helper: base.Helper being run, with LOOK_BACK set.
+        seen: QuerySet of the transactions the helper has already seen.
+        earliest, latest: Entered dates of the first and last transactions
+                          the helper hasn't seen.
+    """
+    return seen.filter(
+        imported_entered_date__gte=earliest - helper.LOOK_BACK,
+        imported_entered_date__lte=latest).order_by('id')
+
+
+def run_look_back(account, helper, transactions, work, skip=(),
+                  batch_size=BATCH_SIZE):
+    """Run a helper over transactions from look_back() again.
+
+    Args:
+        account: models.Account the transactions are in.
+        helper: base.Helper to run.
+        transactions: QuerySet from look_back().
+        work: UnitOfWork to record the changes in.
+        skip: Ids of transactions to leave out, IE the ones just processed.
+        batch_size: Number of transactions to process before writing the
+                    changes to the database.
+    """
+    transactions = (trans for trans in transactions.iterator()
+                    if trans.id not in skip)
+    for batch in batches(transactions, batch_size):
+        prefetch_related_objects(batch, ['suggested_categories'])
+        logging.info("%s (look back)", helper.name)
+        helper.handle_batch(account, batch, work)
+        work.flush()
+
+
+def run_account(account, helpers, full=False, batch_size=BATCH_SIZE):
+    """Run helpers over the transactions in an account they haven't seen.
+
+    Args:
+        account: models.Account to process.
+        helpers: List of base.Helper objects to run.
+        full: Process every transaction, not just new ones.
+        batch_size: Number of transactions to process before writing the
+                    changes to the database.
+    """
+    logging.info("%s", account)
+
+    # Only look at transactions which some helper hasn't seen yet.
+    progress = {}
+    for helper in helpers:
+        progress[helper] = helper.progress(account, full=full)
+    start = min(p.last_transaction for p in progress.values())
+    last_seen = dict((h, p.last_transaction) for h, p in progress.items())
+
+    transactions = account.transaction_set.filter(id__gt=start).order_by('id')
+
+    work = base.UnitOfWork()
+    for batch in batches(transactions.iterator(), batch_size):
+        prefetch_related_objects(batch, ['suggested_categories'])
+
+        for helper in helpers:
+            logging.info("%s", helper.name)
+            helper.handle_batch(account, [
+                trans for trans in batch
+                if trans.id > progress[helper].last_transaction], work)
+        work.flush()
+
+        for p in progress.values():
+            p.last_transaction = max(p.last_transaction, batch[-1].id)
+            p.save()
+
+    # Transactions the helpers had already seen, which the new ones might
+    # need linking to.
+    for helper in helpers:
+        if helper.LOOK_BACK is None or not last_seen[helper]:
+            continue
+        dates = account.transaction_set.filter(id__gt=last_seen[helper]
+            ).aggregate(earliest=Min('imported_entered_date'),
+                        latest=Max('imported_entered_date'))
+        if dates['earliest'] is None:
+            continue
+        run_look_back(account, helper, look_back(
+            helper, account.transaction_set.filter(id__lte=last_seen[helper]),
+            dates['earliest'], dates['latest']), work, batch_size=batch_size)
+
+
+def run_transactions(account, transaction_ids, helpers=None, batch_size=BATCH_SIZE):
+    """Run helpers over just the given transactions, IE ones just imported.
+
+    Args:
+        account: models.Account the transactions are in.
+        transaction_ids: Ids of the models.Transaction to process.
+        helpers: List of base.Helper objects to run, defaults to all of them.
+        batch_size: Number of transactions to process before writing the
+                    changes to the database.
+    """
+    if not transaction_ids:
+        return
+
+    if helpers is None:
+        helpers = active_helpers()
+
+    transaction_ids = sorted(transaction_ids)
+
+    work = base.UnitOfWork()
+    dates = []
+    for ids in batches(transaction_ids, batch_size):
+        batch = list(account.transaction_set.filter(id__in=ids
+            ).order_by('id'
+            ).prefetch_related('suggested_categories'))
+
+        for helper in helpers:
+            logging.info("%s", helper.name)
+            helper.handle_batch(account, batch, work)
+        work.flush()
+
+        dates.extend(trans.imported_entered_date for trans in batch)
+
+    # Transactions which weren't just imported, but which the new ones might
+    # need linking to.
+    for helper in helpers:
+        if helper.LOOK_BACK is None or not dates:
+            continue
+        run_look_back(account, helper, look_back(
+            helper, account.transaction_set.all(), min(dates), max(dates)),
+            work, skip=set(transaction_ids), batch_size=batch_size)
+
+    # If these were the only transactions the helper hadn't seen, it is now up
+    # to date.
+    for helper in helpers:
+        progress = helper.progress(account)
+        processed = [i for i in transaction_ids if i > progress.last_transaction]
+        unseen = account.transaction_set.filter(id__gt=progress.last_transaction)
+        if unseen.count() == len(processed):
+            progress.last_transaction = max(
+                progress.last_transaction, transaction_ids[-1])
+            progress.save()
+
+
+def _worker_init():
+    # Each worker needs its own database connection.
+    connection.close()
+
+
+def _worker_run_account(args):
+    account_id, full = args
+
+    helpers = [h for h in active_helpers() if not h.CROSS_ACCOUNT]
+    with database.bulk_load():
+        run_account(models.Account.objects.get(pk=account_id), helpers, full=full)
+    return account_id
+
+
+def run(accounts, full=False, jobs=1):
+    """Run the helpers over a list of accounts.
+
+    Args:
+        accounts: List of models.Account to process.
+        full: Process every transaction, not just new ones.
+        jobs: Number of worker processes to spread the accounts over, more
+              than one needs PostgreSQL.
+
+    Raises:
+        ValueError if jobs is more than one on another database.
+    """
+    if jobs > 1 and connection.vendor != 'postgresql':
+        # SQLite only lets one process write at a time, so the workers would
+        # fail with "database is locked".
+        raise ValueError("Running the helpers in parallel needs PostgreSQL.")
+
+    if jobs <= 1:
+        helpers = active_helpers()
+        with database.bulk_load():
+            for account in accounts:
+                run_account(account, helpers, full=full)
+        return
+
+    # Don't let the workers inherit our database connection.
+    connection.close()
+
+    pool = multiprocessing.Pool(jobs, initializer=_worker_init)
+    try:
+        for account_id in pool.imap_unordered(
+                _worker_run_account, [(account.pk, full) for account in accounts]):
+            logging.info("Finished account %s", account_id)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Merge phase, helpers which look at other accounts.
+    helpers = [h for h in active_helpers() if h.CROSS_ACCOUNT]
+    for account in accounts:
+        run_account(account, helpers, full=full)
@@ -0,0 +1,217 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+import unittest
+
+from django import test as djangotest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+
+from finance import database
+from finance import models
+from finance import testing
+from finance.helpers import base
+from finance.helpers import fees
+from finance.helpers import pipeline
+
+
+class FeesTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        regex = models.RegexForField.objects.create(
+            regex="OVERSEAS", regex_type="S", description="Overseas")
+        self.fee = models.Fee.objects.create(
+            account=self.account, description="Overseas fee", amount="200",
+            type="F", model="E")
+        self.fee.regex.add(regex)
+
+    def fees(self):
+        return list(models.RelatedTransaction.objects.filter(
+            relationship="FEE").values_list('trans_from', 'trans_to'))
+
+    def test_fee_in_later_import(self):
+        purchase = self.create_transaction(
+            "1", datetime.datetime(2012, 1, 5), -10000,
+            imported_description="OVERSEAS PURCHASE")
+        pipeline.run_account(self.account, [fees.Fees()])
+        self.assertListEqual(self.fees(), [])
+
+        charge = self.create_transaction(
+            "2", datetime.datetime(2012, 1, 6), -200,
+            imported_description="FEE")
+        pipeline.run_account(self.account, [fees.Fees()])
+        self.assertListEqual(self.fees(), [(purchase.id, charge.id)])
+
+        # Looking back again doesn't link it twice.
+        self.create_transaction("3", datetime.datetime(2012, 1, 6), -50)
+        pipeline.run_account(self.account, [fees.Fees()])
+        self.assertListEqual(self.fees(), [(purchase.id, charge.id)])
+
+    def test_fee_just_imported(self):
+        purchase = self.create_transaction(
+            "1", datetime.datetime(2012, 1, 5), -10000,
+            imported_description="OVERSEAS PURCHASE")
+        pipeline.run_transactions(self.account, [purchase.id], [fees.Fees()])
+
+        charge = self.create_transaction(
+            "2", datetime.datetime(2012, 1, 6), -200,
+            imported_description="FEE")
+        pipeline.run_transactions(self.account, [charge.id], [fees.Fees()])
+        self.assertListEqual(self.fees(), [(purchase.id, charge.id)])
+
+
+class PipelineTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        # Needed by the Transfers helper.
+        models.Category.objects.create(
+            category_id="transfer", description="Transfer")
+        self.food = models.Category.objects.create(
+            category_id="food", description="Food")
+        self.categorize("WOOLWORTHS", self.food)
+
+    def categorize(self, regex, category):
+        categorizer = models.Categorizer.objects.create(
+            category=category, personal=False)
+        categorizer.regex.add(models.RegexForField.objects.create(
+            regex=regex, regex_type="S", description=regex))
+
+    def categories(self, trans):
+        return [c.category_id for c in models.Transaction.objects.get(
+            id=trans.id).suggested_categories.all()]
+
+    def watermarks(self):
+        return set(models.HelperProgress.objects.filter(
+            account=self.account).values_list('last_transaction', flat=True))
+
+    def test_seen_skipped(self):
+        trans = self.create_transaction(
+            "1", datetime.datetime(2012, 1, 5), -100,
+            imported_description="WOOLWORTHS")
+        pipeline.run([self.account])
+        self.assertListEqual(self.categories(trans), [u"food"])
+        self.assertEqual(self.watermarks(), set([trans.id]))
+
+        # The rules are the same, so the transaction isn't looked at again.
+        trans.suggested_categories.clear()
+        pipeline.run([self.account])
+        self.assertListEqual(self.categories(trans), [])
+
+        # Until asked to.
+        pipeline.run([self.account], full=True)
+        self.assertListEqual(self.categories(trans), [u"food"])
+
+    def test_rules_changed(self):
+        trans = self.create_transaction(
+            "1", datetime.datetime(2012, 1, 5), -100,
+            imported_description="WOOLWORTHS")
+        pipeline.run([self.account])
+        trans.suggested_categories.clear()
+
+        groceries = models.Category.objects.create(
+            category_id="groceries", description="Groceries")
+        self.categorize("WOOL", groceries)
+        pipeline.run([self.account])
+        self.assertItemsEqual(self.categories(trans), [u"food", u"groceries"])
+
+    def test_run_transactions(self):
+        old = self.create_transaction(
+            "1", datetime.datetime(2012, 1, 5), -100,
+            imported_description="WOOLWORTHS")
+        new = self.create_transaction(
+            "2", datetime.datetime(2012, 1, 6), -100,
+            imported_description="WOOLWORTHS")
+
+        # The old transaction hasn't been processed, so the watermark can't
+        # move past it.
+        pipeline.run_transactions(self.account, [new.id])
+        self.assertListEqual(self.categories(new), [u"food"])
+        self.assertListEqual(self.categories(old), [])
+        self.assertEqual(self.watermarks(), set([0]))
+
+        pipeline.run([self.account])
+        self.assertListEqual(self.categories(old), [u"food"])
+        self.assertEqual(self.watermarks(), set([new.id]))
+
+        # Once the helpers are up to date, processing what was just imported
+        # keeps them up to date.
+        newest = self.create_transaction(
+            "3", datetime.datetime(2012, 1, 7), -100,
+            imported_description="WOOLWORTHS")
+        pipeline.run_transactions(self.account, [newest.id])
+        self.assertListEqual(self.categories(newest), [u"food"])
+        self.assertEqual(self.watermarks(), set([newest.id]))
+
+
+class JobsMixin(testing.AccountFixture):
+    """Running over several accounts, then matching transfers between them."""
+
+    def setUp(self):
+        testing.AccountFixture.setUp(self)
+        models.Category.objects.create(
+            category_id="transfer", description="Transfer")
+        self.other = self.create_account("account_2", "acc2")
+
+    JOBS = 2
+
+    def test_jobs(self):
+        out = self.create_transaction(
+            "1", datetime.datetime(2012, 1, 5), -500,
+            imported_description="TRANSFER TO ACC2")
+        into = self.create_transaction(
+            "1", datetime.datetime(2012, 1, 6), 500, account=self.other,
+            imported_description="TRANSFER FROM ACC1")
+
+        pipeline.run([self.account, self.other], jobs=self.JOBS)
+
+        self.assertListEqual(list(models.RelatedTransaction.objects.values_list(
+            'trans_from', 'trans_to', 'relationship')),
+            [(out.id, into.id, u"TRANSFER")])
+        self.assertListEqual(
+            [t.primary_category_id for t in models.Transaction.objects.order_by('id')],
+            [u"transfer", u"transfer"])
+        self.assertListEqual(sorted(models.HelperProgress.objects.values_list(
+            'account', 'last_transaction').distinct()),
+            [(self.account.id, out.id), (self.other.id, into.id)])
+
+
+class JobsTest(JobsMixin, djangotest.TestCase):
+    """Running the accounts one at a time, then the merge phase."""
+
+    JOBS = 1
+
+    @unittest.skipIf(connection.vendor == 'postgresql', 'Not PostgreSQL')
+    def test_jobs_rejected(self):
+        self.assertRaises(
+            ValueError, pipeline.run, [self.account, self.other], jobs=2)
+        self.assertRaises(
+            CommandError, call_command, 'helpers', jobs=2)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL')
+class ParallelJobsTest(JobsMixin, djangotest.TransactionTestCase):
+    """The workers use their own connections, so need committed data."""
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite only')
+class BulkLoadTest(testing.AccountFixture, djangotest.TransactionTestCase):
+    """bulk_load() does nothing inside a transaction, so needs commits."""
+
+    class SynchronousHelper(base.Helper):
+        """Records the synchronous pragma while it runs."""
+
+        def handle_batch(self, account, transactions, work):
+            self.synchronous = dict(database.pragmas(
+                connection.cursor(), ['synchronous']))['synchronous']
+
+    def test_run(self):
+        self.create_transaction("1", datetime.datetime(2012, 1, 5), -100)
+        helper = self.SynchronousHelper()
+        self.addCleanup(setattr, pipeline, 'active_helpers', pipeline.active_helpers)
+        pipeline.active_helpers = lambda: [helper]
+
+        pipeline.run([self.account])
+        self.assertEqual(helper.synchronous, 0)
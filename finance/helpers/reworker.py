@@ -11,7 +11,9 @@ Some examples of things that it looks for are:
   * Extra spaces, commas and such
 """
 
+import collections
 import csv
+import logging
 import math
 import re
 import datetime
@@ -34,58 +36,100 @@ CURRENCY_TO_COUNTRY = {
     "SGP": "Singapore",
     }
 
+# Look for things that look like US phone numbers
+# 0415-291-0224
+# 08775239849
+# 8775239849
+# 877-5239849
+# 877-5239-849
+PHONE_RE = re.compile(
+    "[01]?([0-9][0-9][0-9])-?([0-9][0-9][0-9])-?([0-9][0-9][0-9][0-9])([^0-9])")
+
+# One regex per country matching any of its state abbreviations at the end of
+# the value. Longest abbreviations go first so they win over their prefixes.
+STATE_RE = {}
+for country, abbrs in STATE_ABBR.items():
+    STATE_RE[country] = re.compile(' (%s) ?$' % "|".join(
+        re.escape(abbr) for abbr in sorted(abbrs, key=len, reverse=True)))
+
+# Number of reworked values LocationFixer remembers.
+CACHE_SIZE = 10000
+
+SPACES_RE = re.compile(" {2,}")
+COMMAS_RE = re.compile(" +,")
+
+
+def rework(value, country=None):
+    """Rewrite a location or description so it looks better.
+
+    Args:
+        value: The string to rework.
+        country: Country used to expand state abbreviations, can be None.
+
+    >>> rework("AMAZON  8775239849 WA", "USA")
+    'AMAZON ph:+1-877-523-9849, Washington State, USA '
+    >>> rework("SHOP , ,  SYDNEY NSW", "Australia")
+    'SHOP,, SYDNEY, New South Wales, Australia '
+    """
+    value = PHONE_RE.sub(r"ph:+1-\1-\2-\3 \4", value)
+
+    if country in STATE_RE:
+        fullnames = STATE_ABBR[country]
+        value = STATE_RE[country].sub(
+            lambda m: ', %s, %s ' % (fullnames[m.group(1)], country), value)
+
+    # Multiple space fixer
+    value = SPACES_RE.sub(" ", value)
+
+    # Clean up any extra commas
+    value = COMMAS_RE.sub(",", value)
+
+    value = re.sub(',, $', '', value)
+    value = re.sub(', $', '', value)
+    value = re.sub('^ *,', '', value)
+    return value
+
 
 class LocationFixer(base.Helper):
     """Finds common problems with location information and corrects it."""
 
-    def handle(self, account, trans):
+    def __init__(self, *args, **kw):
+        base.Helper.__init__(self, *args, **kw)
+
+        # Descriptions and locations repeat heavily, so remember the result
+        # for the most recently seen (value, currency) pairs.
+        self.cache = collections.OrderedDict()
+
+    def rules(self, account):
+        return [sorted((country, sorted(abbrs.items()))
+                       for country, abbrs in STATE_ABBR.items()),
+                sorted(CURRENCY_TO_COUNTRY.items())]
+
+    def rework(self, value, currency_id):
+        key = (value, currency_id)
+        if key in self.cache:
+            # Move it to the end, so it is the last to be dropped.
+            result = self.cache.pop(key)
+        else:
+            result = rework(value, CURRENCY_TO_COUNTRY.get(currency_id))
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.popitem(last=False)
+        self.cache[key] = result
+        return result
+
+    def handle(self, account, trans, work):
+        # Look for things that look like state codes - check the currency
+        currency_id = trans.imported_original_currency_id
+        if currency_id is None:
+            currency_id = account.currency_id
+
         for possible in "imported_location", "imported_description":
             override = possible.replace("imported", "override")
 
             orig_value = getattr(trans, possible)
-            value = orig_value
-
-            # Look for things that look like US phone numbers and rewrite them
-            # 0415-291-0224
-            # 08775239849
-            # 8775239849
-            # 877-5239849
-            # 877-5239-849
-            value = re.sub(
-                "[01]?([0-9][0-9][0-9])-?([0-9][0-9][0-9])-?([0-9][0-9][0-9][0-9])([^0-9])",
-                r"ph:+1-\1-\2-\3 \4",
-                value)
-
-            # Look for things that look like state codes - check the currency
-            currency = trans.imported_original_currency
-            if currency is None:
-                currency = trans.account.currency
-
-            if currency.currency_id in CURRENCY_TO_COUNTRY:
-                country = CURRENCY_TO_COUNTRY[currency.currency_id]
-                if country in STATE_ABBR:
-                    abbr = STATE_ABBR[country]
-                    for abbr, fullname in abbr.items():
-                            value = re.sub(' (%s) ?$' % abbr, ', %s, %s ' % (fullname, country), value)
-
-            # Multiple space fixer
-            while value != re.sub("  ", " ", value):
-                value = re.sub("  ", " ", value)
-
-            # Clean up any extra commas
-            while value != re.sub(' ,', ',', value):
-                value = re.sub(' ,', ',', value)
-
-            value = re.sub(',, $', '', value)
-            value = re.sub(', $', '', value)
-            value = re.sub('^ *,', '', value)
+            value = self.rework(orig_value, currency_id)
 
             if orig_value != value and getattr(trans, override) == None:
-                print account, "%40s" % trans
-                print repr(orig_value)
-                print repr(value)
-                print repr(getattr(trans, override))
-                print
-                setattr(trans,override, value)
-
-        trans.save()
+                logging.debug("%s %40s: %r -> %r", account, trans,
+                              orig_value, value)
+                work.set(trans, override, value)
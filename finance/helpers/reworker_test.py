@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+from django.utils import unittest
+
+from finance.helpers import reworker
+
+
+class ReworkTest(unittest.TestCase):
+
+    def test_phone_number(self):
+        self.assertEqual(
+            reworker.rework("AMAZON 877-5239849 X"),
+            "AMAZON ph:+1-877-523-9849 X")
+
+    def test_state_abbreviation(self):
+        self.assertEqual(
+            reworker.rework("SYDNEY NSW", "Australia"),
+            "SYDNEY, New South Wales, Australia ")
+        self.assertEqual(
+            reworker.rework("SYDNEY NSW", "USA"),
+            "SYDNEY NSW")
+
+    def test_spaces_and_commas(self):
+        self.assertEqual(
+            reworker.rework(" , SHOP    ,   , PLACE"),
+            " SHOP,, PLACE")
+
+    def test_cached(self):
+        fixer = reworker.LocationFixer()
+        self.assertEqual(
+            fixer.rework("PERTH WA", "AUD"),
+            "PERTH, Western Australia, Australia ")
+        self.assertEqual(
+            fixer.cache[("PERTH WA", "AUD")],
+            "PERTH, Western Australia, Australia ")
+
+    def test_cache_bounded(self):
+        fixer = reworker.LocationFixer()
+        size = reworker.CACHE_SIZE
+        try:
+            reworker.CACHE_SIZE = 2
+            fixer.rework("PERTH WA", "AUD")
+            fixer.rework("SYDNEY NSW", "AUD")
+            # Using PERTH again keeps it over SYDNEY.
+            fixer.rework("PERTH WA", "AUD")
+            fixer.rework("HOBART TAS", "AUD")
+        finally:
+            reworker.CACHE_SIZE = size
+        self.assertEqual(
+            list(fixer.cache),
+            [("PERTH WA", "AUD"), ("HOBART TAS", "AUD")])
@@ -19,15 +19,20 @@ class Transfers(base.Helper):
     # Anything with "TRANSFER" in it
     TRANSFERS = ("PAYMENT", "PMNT", "TRANSFER", "Direct Debit")
 
+    CROSS_ACCOUNT = True
+
     def __init__(self, *args, **kw):
         base.Helper.__init__(self, *args, **kw)
 
         self.category = models.Category.objects.get(category_id='transfer')
 
+    def rules(self, account):
+        return [self.TRANSFERS, self.category.pk]
+
     def associate(self, a, b):
         return base.Helper.associate(self, a, b, relationship="TRANSFER")
 
-    def handle(self, account, trans):
+    def handle(self, account, trans, work):
         for desc_match in self.TRANSFERS:
             if desc_match in trans.imported_description.upper():
                 break
@@ -38,7 +43,7 @@ class Transfers(base.Helper):
         print trans
 
         # If this already had reference set, then done
-        related = trans.related_transactions(relationship="TRANSFER")
+        related = work.related_transactions(trans, relationship="TRANSFER")
         if len(related) > 0:
             print "    ", related
             return
@@ -51,15 +56,13 @@ class Transfers(base.Helper):
             )
 
         if len(q) == 1:
-            r = self.associate(trans, q[0])
+            other = q[0]
+            r = self.associate(trans, other)
             print "    Exact: ", r
-            r.save()
-
-            trans.primary_category = self.category
-            trans.save()
+            work.associate(r)
 
-            q[0].primary_category = self.category
-            q[0].save()
+            work.set(trans, 'primary_category', self.category)
+            work.set(other, 'primary_category', self.category)
         else:
             print "    Exact: ", q
 
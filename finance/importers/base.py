@@ -4,57 +4,124 @@
 
 """
 Importers download account and transaction data from banks.
+
+The browser is only started the first time an importer needs it, so an
+importer can be created just to parse files which were downloaded earlier.
+Downloaded statements are kept for a while in a statements.StatementCache.
 """
 
+import cStringIO as StringIO
 import os
 import time
 import shutil
+import tempfile
 
 from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.firefox.firefox_profile import FirefoxProfile
 from selenium.webdriver.firefox.firefox_binary import FirefoxBinary
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.webdriver.support.ui import WebDriverWait
 
+from finance.importers import downloads
+from finance.importers import statements
 
-class Importer(object):
 
-    def __init__(self):
-        self.download_dir = "/tmp/%s-downloads-%i" % (self.__class__.__name__, os.getpid())
-        os.mkdir(self.download_dir)
+# Seconds to wait for a page to get into the state we need.
+WAIT_TIMEOUT = 10
+
+
+class AccountNotFound(Exception):
+    """The site doesn't list the account being imported."""
+
 
+class Importer(object):
+
+    def __init__(self, headless=False):
+        """
+        Args:
+            headless: Run the browser without a display.
+        """
+        self.headless = headless
+        self._download_dir = None
+        self._driver = None
+        self._statements = None
+        # (step, seconds) spent waiting on the browser.
+        self.timings = []
+
+    @property
+    def download_dir(self):
+        """Directory the browser saves files to, created on first use."""
+        if self._download_dir is None:
+            self._download_dir = tempfile.mkdtemp(
+                prefix="%s-downloads-%i-" % (self.__class__.__name__, os.getpid()))
+        return self._download_dir
+
+    @property
+    def statements(self):
+        """The statements.StatementCache downloads are kept in."""
+        if self._statements is None:
+            self._statements = statements.StatementCache()
+        return self._statements
+
+    @property
+    def driver(self):
+        """The WebDriver, Firefox is started the first time it is used."""
+        if self._driver is None:
+            self._driver = self.start_driver()
+        return self._driver
+
+    def start_driver(self):
         profile = FirefoxProfile()
         profile.set_preference('browser.download.dir', self.download_dir)
         profile.set_preference('browser.download.folderList', 2)
         profile.set_preference('browser.helperApps.neverAsk.saveToDisk', "text/csv,text/comma-separated-values,application/octet-stream,application/csv")
 
-        self.driver = None
         firefox_bin = os.path.join(os.path.dirname(__file__), 'firefox', 'firefox')
         assert os.path.exists(firefox_bin), firefox_bin
 
-        self.driver = webdriver.Firefox(firefox_profile=profile, firefox_binary=FirefoxBinary(firefox_bin))
+        return webdriver.Firefox(firefox_profile=profile, firefox_binary=FirefoxBinary(firefox_bin),
+                                 options=self.firefox_options())
+
+    def firefox_options(self):
+        options = FirefoxOptions()
+        options.headless = self.headless
+        return options
+
+    def close(self):
+        """Quit the browser, if it was started."""
+        if getattr(self, '_driver', None) is not None:
+            self._driver.quit()
+            self._driver = None
 
     def __del__(self, rmtree=shutil.rmtree):
         #rmtree(self.download_dir)
-        if self.driver is not None:
-            self.driver.quit()
+        self.close()
 
-    def _get_files(self, timeout=30):
-        starttime = time.time()
+    def wait(self, step, condition, timeout=WAIT_TIMEOUT):
+        """Wait for a condition on the page, recording how long it took.
 
-        time.sleep(5)
+        Args:
+            step: Name of the step in the timings.
+            condition: Called with the driver until it returns something true.
+            timeout: Seconds to wait before raising TimeoutException.
 
-        # Wait until some files exist and all .part files are gone.
-        while True:
-            if (time.time() - starttime) > timeout:
-                raise TimeoutException('File download')
+        Returns:
+            Whatever condition returned.
+        """
+        starttime = time.time()
+        try:
+            return WebDriverWait(self.driver, timeout).until(condition)
+        finally:
+            self.timings.append((step, time.time() - starttime))
 
-            files = os.listdir(self.download_dir)
-            if len([f for f in files if f.endswith('.part')]) > 0:
-                continue
-            if len(files) > 0:
-                break
+    def _get_files(self, timeout=30):
+        starttime = time.time()
+        try:
+            filenames = downloads.wait(self.download_dir, timeout)
+        finally:
+            self.timings.append(('download', time.time() - starttime))
 
-        for filename in os.listdir(self.download_dir):
+        for filename in filenames:
             fullpath = os.path.join(self.download_dir, filename)
             print fullpath
             f = file(fullpath, "r")
@@ -72,11 +139,57 @@ class Importer(object):
         """Return the accounts that exist."""
         pass
 
+    def cache_id(self, account, start_date, end_date):
+        """Key of the statement for an account and date range in the cache."""
+        return "%s-%s-%s-%s" % (
+            account.site_id, account.account_id,
+            start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+
+    def cached_statement(self, account, start_date, end_date):
+        """The statement from the cache, or None if it isn't there."""
+        return self.statements.get(self.cache_id(account, start_date, end_date))
+
     def cache_transactions(self, account, start_date, end_date):
-        cache_id = "%s-%s-%s-%s" % (account.site.site_id, account.account_id, start_date, end_date)
-        print cache_id
-        return []
+        """Transactions from the cached statement, or None if it isn't there."""
+        statement = self.cached_statement(account, start_date, end_date)
+        if statement is None:
+            return None
+        return self.parse(account, statement)
+
+    def fetch(self, account, start_date, end_date, refresh=False):
+        """Get a statement from the cache, or download and cache it.
+
+        Args:
+            refresh: Always download, replacing any cached statement.
+        """
+        statement = None
+        if not refresh:
+            statement = self.cached_statement(account, start_date, end_date)
+        if statement is None:
+            statement = self.download(account, start_date, end_date)
+            self.statements.put(
+                self.cache_id(account, start_date, end_date), statement)
+        return statement
+
+    def download(self, account, start_date, end_date):
+        """Download a statement for a given account.
+
+        Only talks to the bank, so can be run away from the database.
+
+        Importers which only parse files downloaded by hand don't have this.
+
+        Returns:
+            (contents of the downloaded file,
+             dictionary of extra arguments for parse_file)
+        """
+        raise NotImplementedError(
+            "%s can only parse downloaded files" % type(self).__name__)
+
+    def parse(self, account, statement):
+        """Turn a statement from download() into transactions."""
+        content, kw = statement
+        return self.parse_file(account, StringIO.StringIO(content), **kw)
 
     def transactions(self, account, start_date, end_date):
         """Download the transaction details for a given account."""
-        pass
+        return self.parse(account, self.fetch(account, start_date, end_date))
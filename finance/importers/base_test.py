@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import os
+import shutil
+
+from django.utils import unittest
+from selenium.common.exceptions import TimeoutException
+
+from finance.importers import base
+
+
+class Browser(object):
+    quit_count = 0
+
+    def quit(self):
+        self.quit_count += 1
+
+
+class LazyImporter(base.Importer):
+    started = 0
+
+    def start_driver(self):
+        self.started += 1
+        return Browser()
+
+
+class ImporterTest(unittest.TestCase):
+    def test_nothing_started(self):
+        importer = LazyImporter()
+        self.assertEqual(importer.started, 0)
+        self.assertEqual(importer._download_dir, None)
+        importer.close()
+
+    def test_download_dir(self):
+        importer = LazyImporter()
+        other = LazyImporter()
+        try:
+            self.assertTrue(os.path.isdir(importer.download_dir))
+            self.assertEqual(importer.download_dir, importer.download_dir)
+            self.assertNotEqual(other.download_dir, importer.download_dir)
+        finally:
+            shutil.rmtree(importer.download_dir)
+            shutil.rmtree(other.download_dir)
+
+    def test_driver(self):
+        importer = LazyImporter()
+        driver = importer.driver
+        self.assertTrue(importer.driver is driver)
+        self.assertEqual(importer.started, 1)
+
+        importer.close()
+        self.assertEqual(driver.quit_count, 1)
+        importer.close()
+        self.assertEqual(driver.quit_count, 1)
+
+    def test_wait(self):
+        importer = LazyImporter()
+        self.assertEqual(importer.wait('ready', lambda driver: driver), importer.driver)
+        self.assertRaises(
+            TimeoutException, importer.wait, 'never', lambda driver: False, 0.1)
+        self.assertEqual([step for step, seconds in importer.timings],
+                         ['ready', 'never'])
+        self.assertTrue(importer.timings[1][1] >= 0.1)
+
+    def test_headless(self):
+        self.assertTrue(LazyImporter(headless=True).firefox_options().headless)
+        self.assertFalse(LazyImporter().firefox_options().headless)
@@ -14,9 +14,10 @@ import datetime
 import re
 
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, NoSuchFrameException, ElementNotVisibleException
-from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
 
-from finance.importers.base import Importer
+from finance.importers.base import AccountNotFound, Importer
 from finance import models
 
 CURRENCY_MAP = {
@@ -28,11 +29,19 @@ CURRENCY_MAP = {
     }
 
 
+def visible(element_id):
+    return expected_conditions.visibility_of_element_located((By.ID, element_id))
+
+
+def clickable(element_id):
+    return expected_conditions.element_to_be_clickable((By.ID, element_id))
+
+
 class CommBankNetBank(Importer):
 
     def login(self, username, password):
         self.driver.get("https://www.my.commbank.com.au/netbank/Logon/Logon.aspx")
-        WebDriverWait(self.driver, 10).until(lambda driver : driver.title.lower().startswith("netbank - logon"))
+        self.wait('logon page', lambda driver: driver.title.lower().startswith("netbank - logon"))
 
         usernamebox = self.driver.find_element_by_id("txtMyClientNumber_field")
         usernamebox.send_keys(username)
@@ -43,7 +52,7 @@ class CommBankNetBank(Importer):
         form = self.driver.find_element_by_id("btnLogon_field")
         form.click()
 
-        WebDriverWait(self.driver, 10).until(lambda driver: driver.title.lower().startswith("netbank - home"))
+        self.wait('logon', lambda driver: driver.title.lower().startswith("netbank - home"))
         return True
 
     @classmethod
@@ -63,10 +72,16 @@ class CommBankNetBank(Importer):
         account_table = cls._get_account_table(driver)
         return account_table.find_elements_by_xpath('tbody/tr')[:-3]
 
+    @classmethod
+    def _account_rows_found(cls, driver):
+        try:
+            return len(cls._account_table_rows(driver)) > 0
+        except (NoSuchElementException, NoSuchFrameException), e:
+            return False
+
     def home(self):
         [x for x in self.driver.find_elements_by_tag_name('a') if x.get_attribute('href') and "Home.aspx" in x.get_attribute('href')][0].click()
-        WebDriverWait(self.driver, 10).until(self._account_table_found)
-        time.sleep(5)
+        self.wait('home', self._account_rows_found)
 
     def accounts(self, site, dummy=[]):
         if dummy:
@@ -106,7 +121,7 @@ class CommBankNetBank(Importer):
         except (NoSuchElementException, NoSuchFrameException, ElementNotVisibleException), e:
             return False
 
-    def transactions(self, account, start_date, end_date):
+    def download(self, account, start_date, end_date):
         # As commbank doesn't have a running total in their CSV output, we have
         # to use the account balance displayed. This means that we must always
         # import from the latest transaction backwards.
@@ -119,15 +134,14 @@ class CommBankNetBank(Importer):
                     if account_name == account.account_id:
                         break
                 else:
-                    raise AccountNotFound('Could not find account of id %s' % account_id)
+                    raise AccountNotFound('Could not find account of id %s' % account.account_id)
 
                 account_row.find_element_by_tag_name('a').click()
 
-                WebDriverWait(self.driver, 10).until(lambda driver: driver.title.lower().startswith("netbank - trans"))
-                time.sleep(5)
+                self.wait('account page', lambda driver: driver.title.lower().startswith("netbank - trans"))
 
                 # Pull out the current account balance
-                balance = self.driver.find_element_by_id('ctl00_BodyPlaceHolder_gridViewAccount_r00_labelAccountBalance_field').text.strip()
+                balance = self.wait('balance', visible('ctl00_BodyPlaceHolder_gridViewAccount_r00_labelAccountBalance_field')).text.strip()
                 if balance.endswith('DR'):
                     balance = "-" + balance
                 elif balance.endswith('CR'):
@@ -138,28 +152,23 @@ class CommBankNetBank(Importer):
                 starting_balance = int(re.sub('[^\-+0-9]', '', balance))
                 print "starting_balance:", starting_balance
 
-                show_form = self.driver.find_element_by_id('lnkShowHideSearch')
+                show_form = self.wait('search link', clickable('lnkShowHideSearch'))
                 show_form.click()
-                time.sleep(5)
 
-                date_range = self.driver.find_element_by_id('ctl00_BodyPlaceHolder_blockDates_rbtnChooseDates_field')
+                date_range = self.wait('search form', clickable('ctl00_BodyPlaceHolder_blockDates_rbtnChooseDates_field'))
                 date_range.click()
-                time.sleep(5)
 
-                from_date = self.driver.find_element_by_id('ctl00_BodyPlaceHolder_blockDates_caltbFrom_field')
+                from_date = self.wait('date fields', clickable('ctl00_BodyPlaceHolder_blockDates_caltbFrom_field'))
                 for key in start_date.strftime('%d/%m/%Y'):
                     from_date.send_keys(key)
-                time.sleep(5)
                 to_date = self.driver.find_element_by_id('ctl00_BodyPlaceHolder_blockDates_caltbTo_field')
                 for key in end_date.strftime('%d/%m/%Y'):
                     to_date.send_keys(key)
-                time.sleep(5)
 
                 submit_button = self.driver.find_element_by_xpath('//input[@value="SEARCH"]')
                 submit_button.click()
 
-                WebDriverWait(self.driver, 10).until(self._export_select_found)
-                time.sleep(5)
+                self.wait('search results', self._export_select_found)
 
                 export_select = self._get_export_select(self.driver)
                 export_csv = export_select.find_element_by_xpath('option[@value="CSV"]')
@@ -168,10 +177,8 @@ class CommBankNetBank(Importer):
                 export_button = self.driver.find_element_by_xpath('//input[@value="EXPORT TRANSACTIONS"]')
                 export_button.click()
 
-                time.sleep(5)
-
                 for handle in self._get_files():
-                    return self.parse_file(account, handle, starting_balance=starting_balance)
+                    return handle.read(), {'starting_balance': starting_balance}
 
             except TimeoutException:
                 self.home()
@@ -55,7 +55,11 @@ import re
 import django.core.exceptions
 from django.db import transaction
 
+from finance import balances
+from finance import bulk
 from finance import models
+from finance import search
+from finance import summary
 from finance.utils import dollar_fmt
 
 
@@ -420,6 +424,7 @@ ORDER = reversed     -> Order is newest first.
     ###########################################################################
 
     @transaction.commit_on_success
+    @summary.deferred()
     def parse_file(self, account, handle):
         """Parse a CSV file into the database.
 
@@ -483,6 +488,7 @@ ORDER = reversed     -> Order is newest first.
         # import. We walk backwards rolling back the newest first.
         amount = 0
         rolledback_trans = []
+        changed_dates = []  # Dates the account balance might have changed.
         for i, field_list in annotate(reversed(delete_lines)):
 
             # Find the transaction to rollback
@@ -508,6 +514,7 @@ ORDER = reversed     -> Order is newest first.
             trans.save()
 
             rolledback_trans.append(trans.id)
+            changed_dates.append(trans.imported_entered_date)
 
         # If we rolled back some transactions and we have a running total, we
         # need to insert an "rollback" reconciliation.
@@ -527,6 +534,8 @@ ORDER = reversed     -> Order is newest first.
                     rolledback_trans)
                 reconcile.save()
 
+        writer = bulk.writer()
+
         # Mark these as also imported by this
         # Again we walk backwards as there might be many transactions for a
         # day, but only a given number ended up being common between imports.
@@ -547,16 +556,24 @@ ORDER = reversed     -> Order is newest first.
                 "(in db) %s != %s (imported)" % (
                     trans.imported_fields, repr(field_list.fields_raw)))
 
-            trans.imported_also_by.add(imported)
-            trans.save()
+            writer.add(models.Transaction.imported_also_by.through(
+                transaction_id=trans.id, imported_id=imported.id))
 
-        # Create any new transactions which have appeared
+        # Create any new transactions which have appeared. They are written
+        # together at the end, so the number of transactions on each day and
+        # the latest reconciliation are tracked here.
         inserted_trans = []
+        date_counts = {}
+        previous_reconcile = None
+        reconcile_order = None
         for fields in csv.reader(insert_lines):
             field_list = FieldList(self.FIELDS, fields, self.DATEFMT)
+            changed_dates.append(field_list.imported_entered_date)
 
-            date_count = self.date_count_query(
-                account, field_list.imported_entered_date)
+            if field_list.imported_entered_date not in date_counts:
+                date_counts[field_list.imported_entered_date] = self.date_count_query(
+                    account, field_list.imported_entered_date)
+            date_count = date_counts[field_list.imported_entered_date]
 
             trans = models.Transaction()
             # Unique key
@@ -580,9 +597,11 @@ ORDER = reversed     -> Order is newest first.
                 reconcile.account = account
                 reconcile.imported_by = imported
 
-                previous_reconcile_id = account.get_reconciliation_order()[-1]
-                previous_reconcile = models.Reconciliation.objects.get(
-                    id=previous_reconcile_id)
+                if previous_reconcile is None:
+                    reconcile_order = account.get_reconciliation_order()
+                    previous_reconcile = models.Reconciliation.objects.get(
+                        id=reconcile_order[-1])
+                    reconcile_order = len(reconcile_order)
 
                 assert previous_reconcile.amount + trans.imported_amount == reconcile.amount, \
                     "%s + %s != %s\nShould be: %s difference: %s" % (
@@ -592,8 +611,11 @@ ORDER = reversed     -> Order is newest first.
                         )
 
                 reconcile.previous = previous_reconcile
+                reconcile._order = reconcile_order
+                reconcile_order += 1
 
-                reconcile.save()
+                writer.add(reconcile)
+                previous_reconcile = reconcile
                 trans.reconciliation = reconcile
 
             # Run any module specific transforms.
@@ -601,9 +623,18 @@ ORDER = reversed     -> Order is newest first.
                 # Mark the transaction as active
                 trans.state = "Active"
                 # Save the transaction
-                trans.save()
+                writer.add(trans)
+                date_counts[field_list.imported_entered_date] += 1
+
+                inserted_trans.append(trans)
+
+        writer.flush()
+        summary.changed(summary.key(trans) for trans in inserted_trans)
+        search.changed_transactions(trans.id for trans in inserted_trans)
+        inserted_trans = [trans.id for trans in inserted_trans]
 
-                inserted_trans.append(trans.id)
+        # Recompute the daily balances from the oldest change onwards.
+        balances.refresh(account, min(changed_dates))
 
         return inserted_trans
 
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Waiting for the browser to finish downloading files.
+
+Firefox writes a download to "<name>.part" and renames it once it is
+complete, but the renamed file can still be empty or growing for a moment.
+A download is only taken as finished once its files are not empty and their
+sizes are the same on two checks in a row. When pyinotify is installed the wait sleeps until the kernel says
+the download directory changed, otherwise the directory is polled.
+"""
+
+import os
+import time
+
+from selenium.common.exceptions import TimeoutException
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+
+# Seconds between looking at the directory when polling.
+POLL_INTERVAL = 0.25
+
+
+def sizes(directory):
+    """Size of each downloaded file, or {} while any are still downloading."""
+    files = {}
+    for name in os.listdir(directory):
+        if name.endswith('.part'):
+            return {}
+        try:
+            files[name] = os.path.getsize(os.path.join(directory, name))
+        except OSError:
+            # Renamed or removed since the listing.
+            return {}
+        if not files[name]:
+            return {}
+    return files
+
+
+def finished(directory):
+    """Names of the downloaded files, or [] while any are still downloading."""
+    return sorted(sizes(directory))
+
+
+def wait(directory, timeout=30, poll=None):
+    """Block until a download into a directory has finished.
+
+    Args:
+        directory: Directory the browser is downloading into.
+        timeout: Seconds to wait before giving up.
+        poll: Poll the directory even if pyinotify is installed.
+
+    Returns:
+        The names of the downloaded files.
+
+    Raises:
+        TimeoutException if nothing finished downloading in time.
+    """
+    deadline = time.time() + timeout
+    if pyinotify is None or poll:
+        return _wait_polling(directory, deadline)
+    return _wait_inotify(directory, deadline)
+
+
+def _wait_polling(directory, deadline):
+    last = {}
+    while True:
+        files = sizes(directory)
+        if files and files == last:
+            return sorted(files)
+        last = files
+        if time.time() > deadline:
+            raise TimeoutException('File download')
+        time.sleep(POLL_INTERVAL)
+
+
+def _wait_inotify(directory, deadline):
+    manager = pyinotify.WatchManager()
+    manager.add_watch(directory, pyinotify.IN_CREATE | pyinotify.IN_MOVED_TO |
+                      pyinotify.IN_DELETE | pyinotify.IN_CLOSE_WRITE)
+    notifier = pyinotify.Notifier(manager, default_proc_fun=lambda event: None)
+    last = {}
+    try:
+        while True:
+            # Only looked at once the watch exists, so no change is missed.
+            files = sizes(directory)
+            if files and files == last:
+                return sorted(files)
+            last = files
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutException('File download')
+            if files:
+                # A finished download causes no more events, so look again
+                # soon to see the size hasn't changed.
+                remaining = min(remaining, POLL_INTERVAL)
+            if notifier.check_events(timeout=int(remaining * 1000)):
+                notifier.read_events()
+                notifier.process_events()
+    finally:
+        notifier.stop()
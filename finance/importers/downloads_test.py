@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.utils import unittest
+from selenium.common.exceptions import TimeoutException
+
+from finance.importers import downloads
+
+
+class WaitTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def download(self):
+        """Do what Firefox does, write to a .part file then rename it."""
+        part = os.path.join(self.directory, "statement.csv.part")
+        f = open(part, "w")
+        f.write("a,b,c\n")
+        f.close()
+        threading.Timer(0.2, os.rename, [
+            part, os.path.join(self.directory, "statement.csv")]).start()
+
+    def test_finished(self):
+        self.assertEqual(downloads.finished(self.directory), [])
+        open(os.path.join(self.directory, "a.csv.part"), "w").close()
+        self.assertEqual(downloads.finished(self.directory), [])
+        os.rename(os.path.join(self.directory, "a.csv.part"),
+                  os.path.join(self.directory, "a.csv"))
+        # Still empty, so not finished.
+        self.assertEqual(downloads.finished(self.directory), [])
+        f = open(os.path.join(self.directory, "a.csv"), "w")
+        f.write("a,b,c\n")
+        f.close()
+        self.assertEqual(downloads.finished(self.directory), ["a.csv"])
+        self.assertEqual(downloads.sizes(self.directory), {"a.csv": 6})
+
+    def grow(self, poll):
+        """The renamed file is still being written, wait mustn't return."""
+        f = open(os.path.join(self.directory, "statement.csv"), "w")
+        f.write("a,b,c\n")
+        f.flush()
+
+        waited = []
+        thread = threading.Thread(target=lambda: waited.append(
+            downloads.wait(self.directory, timeout=5, poll=poll)))
+        thread.start()
+        try:
+            for i in range(4):
+                time.sleep(downloads.POLL_INTERVAL / 2)
+                f.write("d,e,f\n")
+                f.flush()
+            self.assertTrue(thread.is_alive())
+        finally:
+            f.close()
+            thread.join()
+        self.assertEqual(waited, [["statement.csv"]])
+
+    def test_growing_polling(self):
+        self.grow(poll=True)
+
+    def test_growing(self):
+        self.grow(poll=None)
+
+    def test_polling(self):
+        self.download()
+        self.assertEqual(downloads.wait(self.directory, timeout=5, poll=True),
+                         ["statement.csv"])
+
+    def test_default(self):
+        # Uses inotify when pyinotify is installed.
+        self.download()
+        self.assertEqual(downloads.wait(self.directory, timeout=5),
+                         ["statement.csv"])
+
+    def test_timeout(self):
+        self.assertRaises(TimeoutException, downloads.wait, self.directory, 0.1)
+        self.assertRaises(
+            TimeoutException, downloads.wait, self.directory, 0.1, True)
@@ -15,9 +15,9 @@ import time
 import datetime
 
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, NoSuchFrameException
-from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions
 
-from finance.importers.base import Importer
+from finance.importers.base import AccountNotFound, Importer
 from finance import models
 
 
@@ -26,7 +26,7 @@ class PeoplesChoiceCreditUnion(Importer):
     def login(self, username, password):
         # go to the google home page
         self.driver.get("https://online.peopleschoicecu.com.au/daib/logon/cu5050/logon.asp")
-        WebDriverWait(self.driver, 10).until(lambda driver: driver.title.lower().startswith("people's"))
+        self.wait('logon page', lambda driver: driver.title.lower().startswith("people's"))
 
         usernamebox = self.driver.find_element_by_name("mn")
         usernamebox.send_keys(username)
@@ -37,13 +37,13 @@ class PeoplesChoiceCreditUnion(Importer):
         form = self.driver.find_element_by_name("loginform")
         form.submit()
 
-        WebDriverWait(self.driver, 10).until(lambda driver: driver.title.lower().startswith("welcome"))
+        self.wait('logon', lambda driver: driver.title.lower().startswith("welcome"))
         self.driver.switch_to_frame("main1")
 
         continue_btn = self.driver.find_element_by_name("home")
         continue_btn.click()
 
-        WebDriverWait(self.driver, 10).until(lambda driver: driver.title.lower().startswith("internet banking"))
+        self.wait('home', lambda driver: driver.title.lower().startswith("internet banking"))
         return True
 
     @classmethod
@@ -71,13 +71,8 @@ class PeoplesChoiceCreditUnion(Importer):
         self.driver.find_element_by_name("Account Information").click()
 
         self.driver.switch_to_default_content()
-        while True:
-            try:
-                self.driver.switch_to_frame("main1")
-                break
-            except (NoSuchFrameException), e:
-                continue
-        WebDriverWait(self.driver, 10).until(self._account_table_found)
+        self.wait('account frame', expected_conditions.frame_to_be_available_and_switch_to_it("main1"))
+        self.wait('account table', self._account_table_found)
 
     def accounts(self, site, dummy=[]):
         if dummy:
@@ -118,15 +113,15 @@ class PeoplesChoiceCreditUnion(Importer):
         except (NoSuchElementException, NoSuchFrameException), e:
             return False
 
-    def transactions(self, account, start_date, end_date):
+    def download(self, account, start_date, end_date):
         for account_row in self._account_table_rows(self.driver):
             if account_row.find_elements_by_xpath('td')[0].text.strip() == account.account_id:
                 account_row.find_element_by_tag_name('a').click()
                 break
         else:
-            raise AccountNotFound('Could not find account of id %s' % account_id)
+            raise AccountNotFound('Could not find account of id %s' % account.account_id)
 
-        WebDriverWait(self.driver, 10).until(self._ready_download)
+        self.wait('account page', self._ready_download)
 
         select_date_range = self.driver.find_element_by_name('DateRange').find_element_by_xpath('option[@value=6]')
         select_date_range.click()
@@ -145,7 +140,7 @@ class PeoplesChoiceCreditUnion(Importer):
         submit.click()
 
         for handle in self._get_files():
-            return self.parse_file(account, handle)
+            return handle.read(), {}
 
     def parse_file(self, account, handle):
         transactions = []
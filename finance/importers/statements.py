@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+On disk cache of the statements downloaded from banks.
+
+Logging into a bank is the slowest and most fragile part of an import, so
+the raw statements are kept for a while. Running an import again (IE after
+fixing a parsing bug, or under --debug) parses them from disk instead.
+
+Each statement is a file in the cache directory. Statements older than the
+TTL are ignored, and the least recently used are removed once the directory
+grows past the maximum size.
+"""
+
+import cPickle as pickle
+import errno
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+
+SUFFIX = '.statement'
+
+
+class StatementCache(object):
+
+    def __init__(self, directory=None, ttl=None, max_size=None):
+        """
+        Args:
+            directory: Where to keep the statements, defaults to
+                       settings.STATEMENT_CACHE_DIR.
+            ttl: Seconds a statement can be used for, defaults to
+                 settings.STATEMENT_CACHE_TTL.
+            max_size: Bytes the cache can use, defaults to
+                      settings.STATEMENT_CACHE_SIZE.
+        """
+        if directory is None:
+            directory = settings.STATEMENT_CACHE_DIR
+        if ttl is None:
+            ttl = settings.STATEMENT_CACHE_TTL
+        if max_size is None:
+            max_size = settings.STATEMENT_CACHE_SIZE
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def path(self, cache_id):
+        return os.path.join(
+            self.directory, hashlib.sha1(cache_id).hexdigest() + SUFFIX)
+
+    def get(self, cache_id):
+        """The statement stored under cache_id, or None."""
+        path = self.path(cache_id)
+        try:
+            if os.path.getmtime(path) < time.time() - self.ttl:
+                return None
+            f = open(path, 'rb')
+        except (IOError, OSError):
+            return None
+
+        try:
+            stored_id, statement = pickle.load(f)
+        except Exception:
+            # Partly written or from an older version.
+            return None
+        finally:
+            f.close()
+        if stored_id != cache_id:
+            return None
+
+        # Recently used statements are the last to be evicted.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return statement
+
+    def put(self, cache_id, statement):
+        """Store a statement under cache_id, then evict old statements."""
+        try:
+            # Statements are private, so only we can read them.
+            os.makedirs(self.directory, 0700)
+        except OSError, e:
+            # Already there, IE made by another thread under --parallel.
+            if e.errno != errno.EEXIST or not os.path.isdir(self.directory):
+                raise
+
+        # Written to a temporary file and renamed, so readers never see half
+        # a statement.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        f = os.fdopen(fd, 'wb')
+        try:
+            pickle.dump((cache_id, statement), f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(tmp, self.path(cache_id))
+
+        self.evict()
+
+    def entries(self):
+        """(modified time, size, path) of every statement, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Remove expired statements, and the oldest ones while over size."""
+        entries = self.entries()
+        total = sum(size for mtime, size, path in entries)
+        expired = time.time() - self.ttl
+
+        for mtime, size, path in entries:
+            if mtime >= expired and total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass  # Another importer got to it first.
+            total -= size
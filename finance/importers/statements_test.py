@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.utils import unittest
+
+from finance import models
+from finance.importers import base
+from finance.importers import statements
+
+
+class StatementCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = statements.StatementCache(
+            os.path.join(self.directory, "cache"), ttl=60, max_size=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def age(self, cache_id, seconds):
+        """Make a cached statement older."""
+        when = time.time() - seconds
+        os.utime(self.cache.path(cache_id), (when, when))
+
+    def test_get_put(self):
+        self.assertEqual(self.cache.get("a"), None)
+        self.cache.put("a", ("1,2,3\n", {'starting_balance': 10}))
+        self.assertEqual(self.cache.get("a"), ("1,2,3\n", {'starting_balance': 10}))
+        self.assertEqual(self.cache.get("b"), None)
+        self.assertEqual(
+            os.stat(self.cache.directory).st_mode & 0777, 0700)
+
+    def test_put_parallel(self):
+        # The threads race to make the directory, a put which loses raises.
+        def put(i):
+            statements.StatementCache(
+                self.cache.directory, ttl=60, max_size=1000).put(str(i), "x")
+        threads = [threading.Thread(target=put, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.cache.entries()), 10)
+
+    def test_ttl(self):
+        self.cache.put("a", ("old", {}))
+        self.age("a", 61)
+        self.assertEqual(self.cache.get("a"), None)
+
+        # Expired statements are removed by the next put.
+        self.cache.put("b", ("new", {}))
+        self.assertFalse(os.path.exists(self.cache.path("a")))
+
+    def test_size(self):
+        for i, cache_id in enumerate("abc"):
+            self.cache.put(cache_id, ("x" * 400, {}))
+            self.age(cache_id, 30 - i)
+        # "a" was the least recently used, so it went to make room for "c".
+        self.assertEqual(self.cache.get("a"), None)
+        self.assertNotEqual(self.cache.get("b"), None)
+        self.assertNotEqual(self.cache.get("c"), None)
+
+    def test_corrupt(self):
+        self.cache.put("a", ("1,2,3\n", {}))
+        f = open(self.cache.path("a"), "wb")
+        f.write("junk")
+        f.close()
+        self.assertEqual(self.cache.get("a"), None)
+
+
+class CountingImporter(base.Importer):
+    downloads = 0
+
+    def download(self, account, start_date, end_date):
+        self.downloads += 1
+        return "statement %i" % self.downloads, {}
+
+
+class ImporterCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.importer = CountingImporter()
+        self.importer._statements = statements.StatementCache(
+            self.directory, ttl=60, max_size=1000)
+        self.account = models.Account(site_id="site", account_id="account")
+        self.start = datetime.datetime(2012, 1, 1, 10, 0)
+        self.end = datetime.datetime(2012, 1, 31, 11, 0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fetch(self):
+        fetch = lambda **kw: self.importer.fetch(
+            self.account, self.start, self.end, **kw)
+        self.assertEqual(fetch(), ("statement 1", {}))
+        self.assertEqual(fetch(), ("statement 1", {}))
+        self.assertEqual(fetch(refresh=True), ("statement 2", {}))
+        self.assertEqual(fetch(), ("statement 2", {}))
+        self.assertEqual(self.importer.downloads, 2)
+
+    def test_fetch_parse_only(self):
+        importer = base.Importer()
+        importer._statements = self.importer._statements
+        self.assertRaises(NotImplementedError, importer.fetch,
+                          self.account, self.start, self.end)
+        self.assertListEqual(importer.statements.entries(), [])
+
+    def test_cache_id(self):
+        # Only the dates matter, not when on the day the import ran.
+        self.assertEqual(
+            self.importer.cache_id(self.account, self.start, self.end),
+            "site-account-2012-01-01-2012-01-31")
+        self.assertEqual(self.importer.cached_statement(
+            self.account, self.start, self.end), None)
+        self.assertEqual(self.importer.cache_transactions(
+            self.account, self.start, self.end), None)
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Listing transactions a page at a time without slowing down as history grows.
+
+Pages are found by keyset (continuing from the (imported_entered_date, id) of
+the last transaction on the previous page) rather than by OFFSET, which has to
+step over every earlier row. Counting every matching transaction is avoided
+too, counts are exact up to COUNT_LIMIT. Past that the whole table is
+estimated, a filtered list is only known to have more than COUNT_LIMIT.
+"""
+
+import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Sum
+
+from finance import models
+
+
+PAGE_SIZE = 100
+
+# Counts up to this are exact.
+COUNT_LIMIT = 10000
+
+# Transactions are listed newest first.
+ORDERING = ('-imported_entered_date', '-id')
+
+CURSOR_FORMAT = '%Y%m%dT%H%M%S.%f'
+
+
+def cursor(trans):
+    """The cursor for the page after a transaction.
+
+    >>> class Trans:
+    ...   imported_entered_date = datetime.datetime(2012, 3, 4, 5, 6, 7)
+    ...   id = 42
+    >>> cursor(Trans)
+    '20120304T050607.000000_42'
+    >>> parse_cursor(cursor(Trans))
+    (datetime.datetime(2012, 3, 4, 5, 6, 7), 42)
+    """
+    return "%s_%i" % (
+        trans.imported_entered_date.strftime(CURSOR_FORMAT), trans.id)
+
+
+def parse_cursor(value):
+    """Turn a cursor back into (imported_entered_date, id).
+
+    Raises:
+        ValueError if the cursor isn't valid.
+    """
+    date, trans_id = value.split('_')
+    return datetime.datetime.strptime(date, CURSOR_FORMAT), int(trans_id)
+
+
+def after(q, position):
+    """The transactions (newest first) which come after a cursor position."""
+    q = q.order_by(*ORDERING)
+    if position is None:
+        return q
+
+    # Written as a range on the date, so the database can walk the index.
+    date, trans_id = position
+    return q.filter(imported_entered_date__lte=date).exclude(
+        imported_entered_date=date, id__gte=trans_id)
+
+
+def page(q, position=None, size=PAGE_SIZE):
+    """A page of transactions.
+
+    Args:
+        q: Transactions to list.
+        position: (imported_entered_date, id) to start after, from
+                  parse_cursor(). None for the first page.
+        size: Number of transactions on the page.
+
+    Returns:
+        (query for the transactions on the page, cursor for the next page or
+         None if this is the last page)
+    """
+    q = after(q, position)
+
+    # Only the keys of the page (and one more to see if there is another
+    # page) are fetched, the page itself is left as a query for the caller.
+    keys = list(q.values_list('imported_entered_date', 'id')[:size+1])
+    next_cursor = None
+    if len(keys) > size:
+        last = models.Transaction(imported_entered_date=keys[size-1][0],
+                                  id=keys[size-1][1])
+        next_cursor = cursor(last)
+    return q[:size], next_cursor
+
+
+def table_estimate(using):
+    """Rough number of transactions, without counting them."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        cursor = connection.cursor()
+        cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s",
+                       [models.Transaction._meta.db_table])
+        row = cursor.fetchone()
+        if row and row[0] > 0:
+            return int(row[0])
+
+    # The summary counts every transaction which hasn't been removed.
+    return models.MonthlySummary.objects.using(using).aggregate(
+        count=Sum('count'))['count'] or 0
+
+
+def filtered(q):
+    """Does a transaction query leave any transactions out?"""
+    return bool(q.query.where.children)
+
+
+def estimated_count(q, limit=COUNT_LIMIT):
+    """Count transactions exactly up to a limit, estimate past it.
+
+    Only every transaction can be estimated, for a filtered query the count
+    stops at limit + 1, IE "more than limit".
+    """
+    count = len(q.order_by().values_list('id', flat=True)[:limit+1])
+    if count <= limit or filtered(q):
+        return count
+    return max(count, table_estimate(q.db))
+
+
+class EstimatedCountPaginator(Paginator):
+    """A Paginator which doesn't count every object."""
+
+    def _get_count(self):
+        if self._count is None:
+            self._count = estimated_count(self.object_list)
+        return self._count
+    count = property(_get_count)
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+import json
+
+from django.contrib.auth.models import User
+
+from finance import listing
+from finance import models
+from finance import testing
+
+
+class ListingTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+
+        # Two transactions on each day, so pages split days.
+        for i in range(10):
+            self.create_transaction(
+                "t%i" % i, datetime.datetime(2012, 1+i//6, 1+i//2), 100)
+        self.newest_first = list(models.Transaction.objects.order_by(
+            '-imported_entered_date', '-id').values_list('id', flat=True))
+
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+
+    def test_pages(self):
+        ids = []
+        position = None
+        while True:
+            page, next_cursor = listing.page(
+                models.Transaction.objects.all(), position, size=3)
+            ids.extend(trans.id for trans in page)
+            if next_cursor is None:
+                break
+            position = listing.parse_cursor(next_cursor)
+        self.assertEqual(ids, self.newest_first)
+
+    def test_bad_cursor(self):
+        self.assertRaises(ValueError, listing.parse_cursor, "20120101_x")
+        self.assertRaises(ValueError, listing.parse_cursor, "junk")
+
+    def test_estimated_count(self):
+        q = models.Transaction.objects.all()
+        self.assertEqual(listing.estimated_count(q), 10)
+        # Past the limit the summary is used, which is never less than the
+        # number actually seen.
+        self.assertTrue(listing.estimated_count(q, limit=4) >= 5)
+
+        # The estimate is for every transaction, so isn't used for some.
+        q = q.filter(imported_entered_date__lt=datetime.datetime(2012, 2, 1))
+        self.assertEqual(listing.estimated_count(q), 6)
+        self.assertEqual(listing.estimated_count(q, limit=4), 5)
+
+    def test_admin(self):
+        response = self.client.get("/admin/finance/transaction/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [trans.id for trans in response.context['cl'].result_list],
+            self.newest_first)
+
+        response = self.client.get(
+            "/admin/finance/transaction/?after=%s" % listing.cursor(
+                models.Transaction.objects.get(id=self.newest_first[3])))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [trans.id for trans in response.context['cl'].result_list],
+            self.newest_first[4:])
+
+        response = self.client.get("/admin/finance/transaction/?month=2012-02")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [trans.id for trans in response.context['cl'].result_list],
+            self.newest_first[:4])
+
+        # Sorting by a column uses normal pages.
+        response = self.client.get("/admin/finance/transaction/?o=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 10)
+
+    def test_api(self):
+        ids = []
+        url = "/finance/api/transactions?page_size=4&account=account_1"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.content)
+            ids.extend(result['id'] for result in data['results'])
+            url = None
+            if data['next']:
+                url = "/finance/api/transactions?page_size=4&after=" + data['next']
+        self.assertEqual(ids, self.newest_first)
+
+        response = self.client.get("/finance/api/transactions?after=junk")
+        self.assertEqual(response.status_code, 400)
+
+        # Accounts can be given by short id, like the other views.
+        response = self.client.get("/finance/api/transactions?account=acc1")
+        self.assertEqual(
+            [r['id'] for r in json.loads(response.content)['results']],
+            self.newest_first)
+        response = self.client.get("/finance/api/transactions?account=missing")
+        self.assertEqual(response.status_code, 404)
@@ -1,3 +1,88 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 # vim: set ts=4 sw=4 et sts=4 ai:
+
+from django.core.management.color import no_style
+from django.db import connections
+from django.db.models import signals
+
+from finance import balances
+from finance import categories
+from finance import models
+from finance import search
+from finance import summary
+
+
+def _create_search_index(sender, db=None, **kw):
+    # The full-text index isn't a model, so syncdb doesn't know about it.
+    search.install(db)
+
+signals.post_syncdb.connect(_create_search_index, sender=models)
+
+
+def _recreate(connection, model):
+    """Drop a model's table and create it again from the model."""
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE %s" % connection.ops.quote_name(model._meta.db_table))
+    style = no_style()
+    sql, references = connection.creation.sql_create_model(model, style)
+    sql.extend(connection.creation.sql_indexes_for_model(model, style))
+    for statement in sql:
+        cursor.execute(statement)
+
+
+def _columns(connection, model):
+    return [column[0] for column in connection.introspection.get_table_description(
+        connection.cursor(), model._meta.db_table)]
+
+
+def _add_modified(sender, db=None, created_models=(), **kw):
+    # syncdb doesn't add columns to existing tables. The column is null for
+    # the transactions already there.
+    connection = connections[db]
+    if 'modified' in _columns(connection, models.Transaction):
+        return
+
+    field = models.Transaction._meta.get_field('modified')
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    cursor.execute("ALTER TABLE %s ADD COLUMN %s %s NULL" % (
+        qn(models.Transaction._meta.db_table), qn(field.column),
+        field.db_type(connection)))
+    for sql in connection.creation.sql_indexes_for_field(
+            models.Transaction, field, no_style()):
+        cursor.execute(sql)
+
+signals.post_syncdb.connect(_add_modified, sender=models)
+
+
+def _fill_summary(sender, db=None, created_models=(), **kw):
+    # syncdb doesn't change existing tables, so a summary from before
+    # transfers were kept apart is thrown away and made again.
+    connection = connections[db]
+    if 'transfer_account_id' not in _columns(connection, models.MonthlySummary):
+        _recreate(connection, models.MonthlySummary)
+    elif models.MonthlySummary not in created_models:
+        return
+
+    # A new summary table starts out empty, reports need it filled in.
+    summary.rebuild()
+
+signals.post_syncdb.connect(_fill_summary, sender=models)
+
+
+def _fill_closure(sender, created_models=(), **kw):
+    # A new closure table starts out empty, fill it from the categories.
+    if models.CategoryClosure in created_models:
+        categories.rebuild()
+
+signals.post_syncdb.connect(_fill_closure, sender=models)
+
+
+def _fill_balances(sender, created_models=(), **kw):
+    # A new daily balance table starts out empty, the balances API needs the
+    # history before the next import.
+    if models.DailyBalance in created_models:
+        balances.rebuild()
+
+signals.post_syncdb.connect(_fill_balances, sender=models)
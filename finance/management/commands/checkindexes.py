@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Checks the queries the importers and helpers run most often can use an index.
+
+syncdb only creates indexes for new tables, so a database created before an
+index was added to the models needs --create to add it.
+"""
+
+import datetime
+import re
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from finance import listing
+from finance import models
+
+
+def hot_queries():
+    """The (name, query) of the queries which need to be fast."""
+    date = datetime.datetime(2000, 1, 1)
+    q = models.Transaction.objects.order_by().values('id')
+    return [
+        ("importer lookup", q.filter(
+            account=1, trans_id="", removed_by=None)),
+        ("date count", q.filter(
+            account=1, imported_entered_date=date, removed_by=None,
+            parent_id=None)),
+        ("fee matcher", q.filter(
+            account=1, imported_entered_date__gte=date,
+            imported_entered_date__lt=date+datetime.timedelta(days=2),
+            imported_amount=1)),
+        ("transfer matcher", q.filter(
+            imported_entered_date__gt=date-datetime.timedelta(days=7),
+            imported_entered_date__lt=date+datetime.timedelta(days=7),
+            imported_amount=1)),
+        ("keyset listing", listing.after(q, (date, 1))[:listing.PAGE_SIZE]),
+        ]
+
+
+def index_name(sql):
+    """The name of the index a CREATE INDEX statement creates.
+
+    >>> index_name('CREATE INDEX "finance_transaction_1" ON "finance_transaction" ("id");')
+    'finance_transaction_1'
+    """
+    match = re.match(r'CREATE (?:UNIQUE )?INDEX [`"]?([^`" ]+)[`"]? ON', sql)
+    return match.group(1)
+
+
+def index_names(table):
+    """The names of the indexes which exist on a table."""
+    cursor = connection.cursor()
+    if connection.vendor == 'sqlite':
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s",
+            [table])
+    elif connection.vendor == 'postgresql':
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+    elif connection.vendor == 'mysql':
+        cursor.execute(
+            "SELECT index_name FROM information_schema.statistics"
+            " WHERE table_schema = DATABASE() AND table_name = %s", [table])
+    else:
+        raise CommandError(
+            "Don't know how to list the indexes on %s." % connection.vendor)
+    return set(row[0] for row in cursor.fetchall())
+
+
+def explain(q):
+    """The query plan for a query, as a list of lines."""
+    sql, params = q.query.sql_with_params()
+    cursor = connection.cursor()
+    if connection.vendor == 'sqlite':
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+    if connection.vendor == 'postgresql':
+        # Small tables are quicker to scan, so make the planner show whether
+        # an index could be used at all.
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    cursor.execute("EXPLAIN " + sql, params)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def full_scan(plan, table):
+    """Does a query plan read the whole of a table?"""
+    for line in plan:
+        if line.startswith("SCAN") and table in line:       # SQLite
+            return True
+        if "Seq Scan on %s" % table in line:               # PostgreSQL
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    args = ''
+    help = ('Runs EXPLAIN on the hot transaction queries and fails if any of'
+            ' them scan the whole table.')
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--create", action="store_true", dest="create", default=False,
+            help="Create any indexes from the models which are missing first."),
+    )
+
+    def handle(self, *args, **options):
+        if options['create']:
+            created = 0
+            existing = index_names(models.Transaction._meta.db_table)
+            for sql in connection.creation.sql_indexes_for_model(
+                    models.Transaction, no_style()):
+                if index_name(sql) in existing:
+                    continue
+                with transaction.atomic():
+                    connection.cursor().execute(sql)
+                print sql
+                created += 1
+            print "Created %i indexes." % created
+
+        table = models.Transaction._meta.db_table
+
+        failed = []
+        with transaction.atomic():
+            for name, q in hot_queries():
+                plan = explain(q)
+                if full_scan(plan, table):
+                    failed.append(name)
+                    print "%-20s FULL SCAN" % name
+                else:
+                    print "%-20s ok" % name
+                for line in plan:
+                    print " "*5, line
+
+        if failed:
+            raise CommandError(
+                "Full table scan in: %s (try --create)" % ", ".join(failed))
@@ -0,0 +1,54 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import cStringIO as SIO
+import sys
+
+from django import test as djangotest
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection
+
+from finance import models
+from finance.management.commands import checkindexes
+
+
+class CheckIndexesTest(djangotest.TestCase):
+    def test_hot_queries(self):
+        table = models.Transaction._meta.db_table
+        for name, q in checkindexes.hot_queries():
+            plan = checkindexes.explain(q)
+            self.assertFalse(
+                checkindexes.full_scan(plan, table), "%s: %s" % (name, plan))
+
+    def test_full_scan(self):
+        self.assertTrue(checkindexes.full_scan(
+            ["SCAN TABLE finance_transaction"], "finance_transaction"))
+        self.assertTrue(checkindexes.full_scan(
+            ["Seq Scan on finance_transaction  (cost=0.00..1.01 rows=1)"],
+            "finance_transaction"))
+        self.assertFalse(checkindexes.full_scan(
+            ["SEARCH finance_transaction USING INDEX x (account_id=?)"],
+            "finance_transaction"))
+
+    def test_create(self):
+        table = models.Transaction._meta.db_table
+        sql = connection.creation.sql_indexes_for_model(
+            models.Transaction, no_style())
+        names = [checkindexes.index_name(s) for s in sql]
+        self.assertTrue(set(names) <= checkindexes.index_names(table))
+
+        connection.cursor().execute(
+            "DROP INDEX %s" % connection.ops.quote_name(names[-1]))
+        self.assertNotIn(names[-1], checkindexes.index_names(table))
+
+        # Only the missing index is created, the others are left alone.
+        stdout, sys.stdout = sys.stdout, SIO.StringIO()
+        try:
+            call_command('checkindexes', create=True)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertIn("Created 1 indexes.", output)
+        self.assertTrue(set(names) <= checkindexes.index_names(table))
@@ -14,7 +14,9 @@ from optparse import make_option
 
 from django.core.management.base import BaseCommand, CommandError
 
+from finance import database
 from finance import models
+from finance import helpers
 from finance.importers import csv_importer
 
 
@@ -160,6 +162,10 @@ Running total *excluding* the line being processed transaction.
             help=("Account to load CSV file into. Can either be the 'Account"
                   " ID' (normally a number like 12321354) or the 'Account"
                   " Short Name' what you set when creating the account.")),
+        make_option(
+            "--skip-helpers",
+            action="store_true", dest="skip_helpers", default=False,
+            help="Don't run the helpers over the newly imported transactions."),
         )
 
     def handle(self, *args, **options):
@@ -190,8 +196,13 @@ Running total *excluding* the line being processed transaction.
         importer = TemporaryImporter()
         try:
             print "Importing"
-            r = importer.parse_file(account, file(options['filename']))
+            with database.bulk_load():
+                r = importer.parse_file(account, file(options['filename']))
             print r
+
+            if not options['skip_helpers']:
+                print "Running helpers"
+                helpers.pipeline.run_transactions(account, r)
             return "Successful import."
         except Exception, e:
             import traceback
@@ -12,6 +12,8 @@ from optparse import make_option
 from django.core.management.base import BaseCommand, CommandError
 
 from finance import models
+from finance import reports
+from finance import versions
 from finance.utils import dollar_fmt
 
 
@@ -35,8 +37,6 @@ class Command(BaseCommand):
     )
 
     def handle(self, *args, **options):
-        totals = {}
-
         if options['start_date'] is None:
             start_date = datetime.now().replace(day=1)
         else:
@@ -62,30 +62,11 @@ class Command(BaseCommand):
 
         print start_date, end_date
 
-        transactions = models.Transaction.objects.all().filter(
-            imported_entered_date__gte=start_date,
-            imported_entered_date__lte=end_date,
-            )
-        for trans in transactions:
-            if trans.account_filter(exclude=options['accounts']):
-                print "Skipping as in excluded account:", trans
-                continue
-
-            if trans.primary_category and trans.primary_category.category_id == "transfer":
-                continue
-
-            if len(trans.categories):
-                assert len(trans.categories[0].category_id) > 0
-                bits = trans.categories[0].category_id.split('/')
-            else:
-                bits = ['unknown']
-
-            i = 0
-            while i < len(bits):
-                category = "/".join(bits[0:i+1])
-                totals[category] = totals.get(category, 0) + trans.imported_amount
-
-                i += 1
+        # Unchanged since the last run if nothing has been imported or edited.
+        totals = versions.cached(
+            reports.cache_key('details', start_date, end_date, options['accounts']),
+            lambda: reports.rollup(reports.category_totals(
+                start_date, end_date, exclude=options['accounts'])))
 
         i = 0
         while i < 5:
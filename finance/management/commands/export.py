@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Export the transactions for analysis outside of Django.
+"""
+
+import sys
+from datetime import datetime
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance import columnar
+from finance import export
+
+
+class Command(BaseCommand):
+    args = '<directory or file>'
+    help = ('Exports transactions as CSV or JSON lines, or appends transactions'
+            ' added since the last export to a directory of NumPy .npy'
+            ' columns.')
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--format", type="choice", dest="format", default="npy",
+            choices=["npy"] + sorted(export.WRITERS),
+            help="Format to export in (npy, csv or jsonl)."),
+        make_option(
+            "--full", action="store_true", dest="full", default=False,
+            help="Throw away the existing npy export and start again."),
+        make_option(
+            "--start", action="store", dest="start_date",
+            help="Start date.", default=None),
+        make_option(
+            "--end", action="store", dest="end_date",
+            help="End date.", default=None),
+        make_option(
+            "--only-accounts", action="append", dest="only_accounts",
+            help="Only export the following accounts (unlike the --accounts"
+                 " of details and months, which skips them)."),
+        make_option(
+            "--category", action="store", dest="category",
+            help="Only export transactions in (or under) this category."),
+    )
+
+    def handle(self, *args, **options):
+        if options['format'] == 'npy':
+            if len(args) != 1:
+                raise CommandError('Expected a directory to export to.')
+            if (options['start_date'] or options['end_date'] or
+                    options['only_accounts'] or options['category']):
+                raise CommandError('The npy export always has every transaction.')
+
+            exporter = columnar.Exporter(args[0], full=options['full'])
+            rows = exporter.export()
+            if exporter.restarted:
+                print "Transactions already exported had changed, started again."
+            print "Exported %i transactions (%i total)." % (
+                rows, exporter.meta['rows'])
+            return
+
+        if len(args) > 1:
+            raise CommandError('Expected a file to export to.')
+
+        start_date = None
+        if options['start_date'] is not None:
+            start_date = datetime.strptime(options['start_date'], "%Y-%m-%d")
+
+        end_date = None
+        if options['end_date'] is not None:
+            end_date = datetime.strptime(options['end_date'], "%Y-%m-%d")
+            end_date = end_date.replace(
+                hour=23, minute=59, second=59, microsecond=999999)
+
+        q = export.transactions(
+            options['only_accounts'], start_date, end_date, options['category'])
+
+        if not args or args[0] == '-':
+            output = sys.stdout
+        else:
+            output = open(args[0], 'wb')
+
+        rows = export.WRITERS[options['format']](output, export.rows(q))
+        if output is not sys.stdout:
+            output.close()
+            print "Exported %i transactions." % rows
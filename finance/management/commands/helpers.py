@@ -7,8 +7,10 @@ transfers between accounts.
 """
 
 import logging
+from optparse import make_option
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
 
 from finance import models
 from finance import helpers
@@ -18,20 +20,23 @@ class Command(BaseCommand):
     args = ''
     help = 'Run helpers with transactions'
 
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--full", action="store_true", dest="full", default=False,
+            help=("Run the helpers over every transaction, not just the ones"
+                  " added since the last run.")),
+        make_option(
+            "--jobs", type="int", dest="jobs", default=1,
+            help=("Number of processes to spread the accounts over, needs"
+                  " PostgreSQL.")),
+    )
+
     def handle(self, *args, **options):
         logging.basicConfig(level=logging.INFO)
 
-        active_helpers = [
-            helpers.categorizer.Categorizer(),
-            helpers.fees.Fees(),
-            helpers.reworker.LocationFixer(),
-            helpers.transfers.Transfers(),
-            ]
-
-        for account in models.Account.objects.all():
-            logging.info("%s", account)
-            for transaction in account.transaction_set.all():
-                logging.info("%s", transaction)
-                for helper in active_helpers:
-                    logging.info("%s", helper)
-                    helper.handle(account, transaction)
+        if options['jobs'] > 1 and connection.vendor != 'postgresql':
+            raise CommandError('--jobs needs PostgreSQL, this is %s.' % connection.vendor)
+
+        helpers.pipeline.run(
+            list(models.Account.objects.all()),
+            full=options['full'], jobs=options['jobs'])
@@ -5,14 +5,23 @@
 import getpass
 import datetime
 import os
+import Queue
 import subprocess
+import sys
+import threading
 import time
+import traceback
 
 from optparse import make_option
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
 
+from finance import balances
+from finance import database
 from finance import models
+from finance import helpers
+from finance import summary
 
 
 class VNCServer(object):
@@ -68,6 +77,109 @@ class VNCServer(object):
             self.vncserver = 'TERMINATED'
 
 
+def importer_class(site):
+    """The Importer subclass named by a models.Site."""
+    module, klass = site.importer.rsplit('.', 1)
+    exec("from %s import %s as importer_class" % (module, klass))
+    return importer_class
+
+
+def date_range(account):
+    """The (start, end) dates to download for an account."""
+    end_date = datetime.datetime.now() - datetime.timedelta(days=1)
+    # Get the oldest transaction
+    oldest_transaction = account.transaction_set.all().order_by('-imported_entered_date')
+    if not oldest_transaction:
+        start_date = end_date - datetime.timedelta(days=30)
+    else:
+        # 30 days before this transaction
+        start_date = oldest_transaction[0].imported_entered_date - datetime.timedelta(days=30)
+    return start_date, end_date
+
+
+def download_site(site, password, jobs, results, refresh=False, headless=True):
+    """Log into a site and download statements for some of its accounts.
+
+    Runs in a worker thread, it only talks to the bank. Everything which goes
+    to the database is done by whoever reads the results.
+
+    Args:
+        site: models.Site to log into.
+        password: Password for the site.
+        jobs: List of (account, start_date, end_date) to download.
+        results: Queue to put (account, statement, timings, exc_info) on for
+                 each job, statement is None and exc_info set if it failed.
+        refresh: Download even if the statement is in the cache.
+        headless: Run the browser without a display.
+    """
+    importer = importer_class(site)(headless=headless)
+    try:
+        try:
+            importer.login(site.username, password)
+        except Exception:
+            for account, start_date, end_date in jobs:
+                results.put((account, None, importer.timings, sys.exc_info()))
+            return
+
+        for account, start_date, end_date in jobs:
+            try:
+                importer.home()
+                statement = importer.fetch(
+                    account, start_date, end_date, refresh=refresh)
+                results.put((account, statement, importer.timings, None))
+            except Exception:
+                results.put((account, None, importer.timings, sys.exc_info()))
+            importer.timings = []
+    finally:
+        importer.close()
+
+
+class BrowserPool(object):
+    """Downloads from sites with at most a fixed number of browsers at once.
+
+    Each worker thread logs into one site at a time with its own browser and
+    download directory, results are collected by the caller's thread.
+    """
+
+    def __init__(self, size, refresh=False, headless=True):
+        self.size = size
+        self.refresh = refresh
+        self.headless = headless
+        self.sites = Queue.Queue()
+        self.results = Queue.Queue()
+
+    def add(self, site, password, jobs):
+        self.sites.put((site, password, jobs))
+
+    def worker(self):
+        try:
+            while True:
+                try:
+                    site, password, jobs = self.sites.get_nowait()
+                except Queue.Empty:
+                    break
+                download_site(site, password, jobs, self.results,
+                              self.refresh, self.headless)
+        finally:
+            connection.close()
+            self.results.put(None)
+
+    def run(self):
+        """Start the workers and yield the results as they arrive."""
+        workers = min(self.size, self.sites.qsize())
+        for i in range(workers):
+            thread = threading.Thread(target=self.worker)
+            thread.daemon = True
+            thread.start()
+
+        while workers:
+            result = self.results.get()
+            if result is None:
+                workers -= 1
+                continue
+            yield result
+
+
 class Command(BaseCommand):
     args = ''
     help = 'Imports the transactions into an accounts.'
@@ -77,6 +189,11 @@ class Command(BaseCommand):
             "--viewer", action="store_true", dest="viewer",
             default=False,
             help="Start a VNCViewer so you can watch the Selenium test run."),
+        make_option(
+            "--visible", action="store_true", dest="visible",
+            default=False,
+            help="Run the browsers under a VNCServer rather than headless"
+                 " (implied by --viewer)."),
         make_option(
             "--debug", action="store_true", dest="debug",
             default=False,
@@ -84,6 +201,16 @@ class Command(BaseCommand):
         make_option(
             "--accounts", action="append", dest="accounts",
             help="Only import from the following accounts."),
+        make_option(
+            "--skip-helpers", action="store_true", dest="skip_helpers",
+            default=False,
+            help="Don't run the helpers over the newly imported transactions."),
+        make_option(
+            "--parallel", type="int", dest="parallel", default=1,
+            help="Number of sites to download from at once."),
+        make_option(
+            "--refresh", action="store_true", dest="refresh", default=False,
+            help="Download statements again even if they are cached."),
     )
 
     def handle(self, *args, **options):
@@ -91,61 +218,105 @@ class Command(BaseCommand):
 
         print options['accounts']
 
-        with VNCServer(viewer=options['viewer']):
-            for site in models.Site.objects.all():
-                # Only start up this site if it has an account we are going to import from.
+        # Browsers only need a display when someone is going to look at them.
+        headless = not (options['visible'] or options['viewer'])
+        pool = BrowserPool(max(options['parallel'], 1),
+                           refresh=options['refresh'], headless=headless)
+        cached = []
+        for site in models.Site.objects.all():
+            # Doesn't start a browser unless something needs downloading.
+            importer = importer_class(site)()
+
+            jobs = []
+            for account in site.account_set.all():
                 if options['accounts']:
-                    for account in site.account_set.all():
-                        if account.account_id in options['accounts']:
-                            break
-                        if account.short_id in options['accounts']:
-                            break
+                    if account.account_id in options['accounts'] or account.short_id in options['accounts']:
+                        pass
                     else:
                         continue
 
-                if not site.password:
-                    password = getpass.getpass('Password for %s:' % site.site_id)
+                start_date, end_date = date_range(account)
+                print "Importing into %-20s starting at %s to %s" % (
+                    account, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+
+                statement = None
+                if not options['refresh']:
+                    statement = importer.cached_statement(account, start_date, end_date)
+                if statement is not None:
+                    cached.append((account, statement, [], None))
                 else:
-                    password = site.password
-
-                # Login into the website
-                module, klass = site.importer.rsplit('.', 1)
-
-                exec("from %s import %s as importer_class" % (module, klass))
-                importer = importer_class()
-                importer.login(site.username, password)
-
-                # Get transactions for each account
-                for account in site.account_set.all():
-                    if options['accounts']:
-                        if account.account_id in options['accounts'] or account.short_id in options['accounts']:
-                            pass
-                        else:
-                            continue
-
-                    importer.home()
-
-                    end_date = datetime.datetime.now() - datetime.timedelta(days=1)
-                    # Get the oldest transaction
-                    oldest_transaction = account.transaction_set.all().order_by('-imported_entered_date')
-                    if not oldest_transaction:
-                        start_date = end_date - datetime.timedelta(days=30)
-                    else:
-                        # 30 days before this transaction
-                        start_date = oldest_transaction[0].imported_entered_date - datetime.timedelta(days=30)
-
-                    print "Importing into %-20s starting at %s to %s" % (
-                        account, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
-
-                    try:
-                        transactions = importer.transactions(account, start_date, end_date)
-                        for transaction in transactions:
-                            print transaction
-                            transaction.save()
-                    except Exception, e:
-                        if options['debug']:
-                            import pdb
-                            pdb.post_mortem()
-                            raise
+                    jobs.append((account, start_date, end_date))
+
+            # Only start up this site if it has an account we are going to import from.
+            if not jobs:
+                continue
+
+            # Asked for up front, the workers can't prompt.
+            if not site.password:
+                password = getpass.getpass('Password for %s:' % site.site_id)
+            else:
+                password = site.password
+            pool.add(site, password, jobs)
+
+        for result in cached:
+            print "Using cached statement for %s" % result[0]
+            self.process(result, options)
+
+        if pool.sites.empty():
+            return
+
+        if headless:
+            self.download(pool, options)
+        else:
+            with VNCServer(viewer=options['viewer']):
+                self.download(pool, options)
         return
 
+    def download(self, pool, options):
+        # The statements are parsed and written here, so only this thread
+        # writes to the database.
+        for result in pool.run():
+            print "Downloaded %s" % result[0]
+            self.process(result, options)
+
+    def process(self, result, options):
+        """Write a statement from the cache or a worker, or report its error."""
+        account, statement, timings, exc_info = result
+
+        # Where the time went waiting on the bank's website.
+        for step, seconds in timings:
+            print "    %-20s %6.2fs" % (step, seconds)
+
+        try:
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            self.write(account, statement, options)
+        except Exception, e:
+            traceback.print_exc()
+            if options['debug']:
+                import pdb
+                pdb.post_mortem(sys.exc_info()[2])
+                raise
+
+    def write(self, account, statement, options):
+        """Parse a downloaded statement and save the transactions."""
+        # Only parses, so doesn't start a browser.
+        importer = importer_class(account.site)()
+
+        with database.bulk_load():
+            transactions = importer.parse(account, statement)
+            new_transactions = []
+            with summary.deferred():
+                for transaction in transactions:
+                    print transaction
+                    is_new = transaction.id is None
+                    transaction.save()
+                    if is_new:
+                        new_transactions.append(transaction.id)
+
+            if transactions:
+                balances.refresh(account, min(
+                    t.imported_entered_date for t in transactions))
+
+        if not options['skip_helpers']:
+            helpers.pipeline.run_transactions(account, new_transactions)
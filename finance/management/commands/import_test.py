@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+import importlib
+import shutil
+import tempfile
+import threading
+import time
+
+from django.utils import unittest
+
+from finance import models
+from finance.importers import base
+from finance.importers import statements
+
+# "import" is a keyword, so the module can't be imported by name.
+import_command = importlib.import_module('finance.management.commands.import')
+
+
+class FakeImporter(base.Importer):
+    lock = threading.Lock()
+    active = 0
+    most_active = 0
+    closed = 0
+    cache_dir = None
+    headless_seen = None
+
+    def __init__(self, **kw):
+        base.Importer.__init__(self, **kw)
+        self._statements = statements.StatementCache(self.cache_dir)
+
+    def login(self, username, password):
+        if password != "password":
+            raise ValueError("Bad password")
+
+    def download(self, account, start_date, end_date):
+        cls = type(self)
+        with cls.lock:
+            cls.headless_seen = self.headless
+            cls.active += 1
+            cls.most_active = max(cls.most_active, cls.active)
+        time.sleep(0.1)
+        with cls.lock:
+            cls.active -= 1
+        return "statement for %s" % account.account_id, {}
+
+    def close(self):
+        # Also called again by __del__.
+        if not getattr(self, 'is_closed', False):
+            self.is_closed = True
+            with type(self).lock:
+                type(self).closed += 1
+
+
+class BrowserPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.importer = import_command.importer_class(
+            models.Site(importer=__name__ + ".FakeImporter"))
+        self.importer.most_active = 0
+        self.importer.closed = 0
+        self.importer.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.importer.cache_dir)
+
+    def pool(self, size, sites, password="password"):
+        pool = import_command.BrowserPool(size)
+        date = datetime.datetime(2012, 1, 1)
+        for i in range(sites):
+            site = models.Site(site_id="site_%i" % i, username="user",
+                               importer=__name__ + ".FakeImporter")
+            pool.add(site, password, [
+                (models.Account(account_id="%i.%i" % (i, j)), date, date)
+                for j in range(2)])
+        return list(pool.run())
+
+    def test_parallel(self):
+        results = self.pool(3, 3)
+        self.assertEqual(
+            sorted(statement for account, statement, timings, exc_info in results),
+            [("statement for %i.%i" % (i, j), {})
+             for i in range(3) for j in range(2)])
+        self.assertEqual(self.importer.most_active, 3)
+        self.assertEqual(self.importer.closed, 3)
+        # Workers' browsers don't need a display unless asked for.
+        self.assertEqual(self.importer.headless_seen, True)
+
+    def test_bounded(self):
+        self.assertEqual(len(self.pool(1, 3)), 6)
+        self.assertEqual(self.importer.most_active, 1)
+        self.assertEqual(self.importer.closed, 3)
+
+    def test_login_failed(self):
+        results = self.pool(2, 2, password="wrong")
+        self.assertEqual(len(results), 4)
+        for account, statement, timings, exc_info in results:
+            self.assertEqual(statement, None)
+            self.assertEqual(exc_info[0], ValueError)
+        self.assertEqual(self.importer.closed, 2)
+
+    def test_cached(self):
+        self.pool(2, 2)
+        self.assertEqual(self.importer.most_active, 2)
+
+        # The second time round the statements come from the cache.
+        self.importer.most_active = 0
+        self.assertEqual(len(self.pool(2, 2)), 4)
+        self.assertEqual(self.importer.most_active, 0)
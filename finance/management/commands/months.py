@@ -9,8 +9,11 @@ transfers between accounts.
 from optparse import make_option
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
 
 from finance import models
+from finance import reports
+from finance import versions
 from finance.utils import dollar_fmt
 
 
@@ -22,66 +25,56 @@ class Command(BaseCommand):
         make_option(
             "--accounts", action="append", dest="accounts",
             help="Skip the following accounts."),
+        make_option(
+            "--large", type="int", dest="large", default=50000,
+            help="Print transactions larger than this many cents."),
     )
 
-    def handle(self, *args, **options):
-        incoming = {}
-        outgoing = {}
-
-        for trans in models.Transaction.objects.all():
-            if trans.account_filter(exclude=options['accounts']):
-                print "Skipping as in excluded account:", trans
-                continue
-
-            related = trans.related_transactions(relationship="TRANSFER")
-            if related:
-                if (not related[0].trans_to.account_filter(exclude=options['accounts']) and
-                    not related[0].trans_from.account_filter(exclude=options['accounts'])):
-                    print "Skipping transfer:", trans
-                    continue
-
-            month = trans.imported_entered_date.month
-
-            if month not in incoming:
-                incoming[month] = []
-                outgoing[month] = []
+    def totals(self, options):
+        """The monthly totals and large transactions in each month."""
+        totals = reports.month_totals(exclude=options['accounts'])
+
+        # Only the large transactions are fetched.
+        q = reports.transactions(exclude=options['accounts'])
+        q = reports.without_transfers(q, exclude=options['accounts'])
+        large = {}
+        for entered_date, amount, description, override_description in q.filter(
+                Q(imported_amount__gt=options['large']) |
+                Q(imported_amount__lt=-options['large'])
+                ).order_by('imported_amount'
+                ).values_list('imported_entered_date', 'imported_amount',
+                              'imported_description', 'override_description'):
+            month = (entered_date.year, entered_date.month)
+            large.setdefault(month, []).append(
+                (amount, override_description or description))
+        return totals, large
 
-            if trans.imported_amount > 0:
-                incoming[month].append(trans)
-
-            if trans.imported_amount < 0:
-                outgoing[month].append(trans)
-
-
-        def sort_by_amount(a, b):
-            return cmp(a.imported_amount, b.imported_amount)
+    def handle(self, *args, **options):
+        # Unchanged since the last run if nothing has been imported or edited.
+        totals, large = versions.cached(
+            reports.cache_key('months', exclude=options['accounts'],
+                              large=options['large']),
+            lambda: self.totals(options))
 
         print
         print "--------------------------------"
 
         sum_in_amount = 0
         sum_out_amount = 0
-        for month in set(incoming.keys() + outgoing.keys()):
-            print month
+        for month, (in_amount, out_amount) in sorted(totals.items()):
+            print "%04i-%02i" % month
             print
 
-            in_amount = 0
-            for trans in sorted(incoming[month], cmp=sort_by_amount):
-                in_amount += trans.imported_amount
             print "Incoming:", dollar_fmt(in_amount)
-            for trans in sorted(incoming[month], cmp=sort_by_amount):
-                if trans.imported_amount > 50000:
-                    print " "*5, "%20s" % dollar_fmt(trans.imported_amount), trans.description
+            for amount, description in large.get(month, []):
+                if amount > 0:
+                    print " "*5, "%20s" % dollar_fmt(amount), description
             sum_in_amount += in_amount
 
-
-            out_amount = 0
-            for trans in sorted(outgoing[month], cmp=sort_by_amount):
-                out_amount += trans.imported_amount
             print "Outgoing:", dollar_fmt(out_amount)
-            for trans in sorted(outgoing[month], cmp=sort_by_amount):
-                if trans.imported_amount < -50000:
-                    print " "*5, "%20s" % dollar_fmt(trans.imported_amount), trans.description
+            for amount, description in large.get(month, []):
+                if amount < 0:
+                    print " "*5, "%20s" % dollar_fmt(amount), description
             sum_out_amount += out_amount
 
             print
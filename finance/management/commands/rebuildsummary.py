@@ -0,0 +1,34 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Rebuilds the category closure, monthly summary, daily balance and search
+tables.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from finance import balances
+from finance import categories
+from finance import database
+from finance import search
+from finance import summary
+
+
+class Command(BaseCommand):
+    args = ''
+    help = ('Throws away and recomputes the category closure, the monthly'
+            ' category summary, the daily account balances and the search'
+            ' index.')
+
+    def handle(self, *args, **options):
+        with database.bulk_load():
+            self.rebuild()
+
+    @transaction.atomic
+    def rebuild(self):
+        print "Rebuilt %i category closure rows." % categories.rebuild()
+        print "Rebuilt %i summary rows." % summary.rebuild()
+        print "Rebuilt %i daily balance rows." % balances.rebuild()
+        print "Rebuilt search index of %i transactions." % search.rebuild()
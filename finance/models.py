@@ -2,13 +2,18 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 sw=4 et sts=4 ai:
 
+import datetime
 import locale
 import re
 
 from django.db import models
+from django.db.backends.signals import connection_created
 from django.db.models import Q
+from django.db.models import signals
+from django.dispatch import receiver
 from django.contrib import admin
 
+from finance import database
 from finance.utils import dollar_fmt, dollar_display
 
 ###############################################################################
@@ -323,6 +328,11 @@ class Transaction(models.Model):
     override_description = models.CharField(max_length=200, null=True, blank=True)
     override_location = models.CharField(max_length=200, null=True, blank=True)
 
+    # When the transaction (or its suggested categories) last changed. Bulk
+    # updates need to set it themselves. Null for transactions which haven't
+    # changed since the column was added.
+    modified = models.DateTimeField(auto_now=True, null=True, blank=True, db_index=True)
+
     def account_filter(self, include=[], exclude=[]):
         if include:
             if self.account.account_id in include or self.account.short_id in include:
@@ -422,7 +432,17 @@ class Transaction(models.Model):
             )
 
     class Meta:
+        # Also the index for the importer looking up a transaction.
         unique_together = (("account", "trans_id", "removed_by"))
+        index_together = [
+            # Counting transactions on a day (CSVImporter.date_count_query),
+            # the fee matcher and balances.
+            ["account", "imported_entered_date", "removed_by", "parent_id"],
+            # The transfer matcher, an exact amount within a few days.
+            ["imported_amount", "imported_entered_date"],
+            # Listing newest first a page at a time (finance.listing).
+            ["imported_entered_date", "id"],
+            ]
         get_latest_by = "imported_entered_date"
         ordering = ["-imported_entered_date", "-imported_effective_date"]
 
@@ -480,3 +500,246 @@ class Categorizer(models.Model):
 
     # Category that should be assigned
     category = models.ForeignKey('Category')
+
+
+###############################################################################
+
+class HelperProgress(models.Model):
+    """Tracks how far a helper has got through the transactions of an account.
+
+    Helpers only need to look at transactions newer than last_transaction,
+    unless the helper's rules have changed since then (in which case the
+    rules_version will differ and everything is processed again).
+    """
+    # Python name of the helper, IE "finance.helpers.fees.Fees"
+    helper = models.CharField(max_length=200)
+    # Account the helper was run over.
+    account = models.ForeignKey('Account')
+    # Id of the newest transaction the helper has processed.
+    last_transaction = models.IntegerField(default=0)
+    # Hash of the rules the helper used when processing.
+    rules_version = models.CharField(max_length=40)
+
+    def __unicode__(self):
+        return "%s %s @ %s" % (self.helper, self.account, self.last_transaction)
+
+    class Meta:
+        unique_together = (("helper", "account"))
+
+
+###############################################################################
+
+class MonthlySummary(models.Model):
+    """Totals of the transactions in an account for a month and category.
+
+    This is a cache of the transactions table, kept up to date as
+    transactions are imported, removed and recategorized so that reports
+    don't have to look at every transaction. See finance.summary for how it
+    is maintained.
+    """
+    account = models.ForeignKey('Account')
+    # First day of the month.
+    month = models.DateField()
+    # The primary category or first suggested category, null for
+    # transactions which haven't been categorized.
+    category = models.ForeignKey('Category', null=True, blank=True)
+    # For transfers between accounts, the account at the other end. Reports
+    # leave these out unless that account is excluded from the report.
+    transfer_account = models.ForeignKey(
+        'Account', null=True, blank=True, related_name='+')
+
+    incoming = models.IntegerField(default=0)
+    outgoing = models.IntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return "%s %s %s %s %s" % (
+            self.account, self.month.strftime("%Y-%m"), self.category,
+            dollar_fmt(self.incoming), dollar_fmt(self.outgoing))
+
+    class Meta:
+        verbose_name_plural = "monthly summaries"
+        unique_together = (("account", "month", "category", "transfer_account"))
+        ordering = ["month", "account", "category"]
+
+
+
+###############################################################################
+
+class DailyBalance(models.Model):
+    """The balance of an account at the end of a day.
+
+    There is only a row for days on which the balance could have changed, the
+    balance on any other day is the one from the closest earlier row. See
+    finance.balances for how it is maintained and queried.
+    """
+    account = models.ForeignKey('Account')
+    date = models.DateField()
+    balance = models.IntegerField()
+
+    def __unicode__(self):
+        return "%s %s %s" % (self.account, self.date, dollar_fmt(
+            self.balance, currency=self.account.currency.symbol))
+
+    class Meta:
+        unique_together = (("account", "date"))
+        ordering = ["account", "date"]
+
+
+###############################################################################
+
+class CategoryClosure(models.Model):
+    """Every (ancestor, descendant) pair in the Category tree.
+
+    Each category is also its own ancestor at depth 0. This makes questions
+    like "all transactions under medical" a single join rather than walking
+    the tree. See finance.categories for how it is maintained.
+    """
+    ancestor = models.ForeignKey('Category', related_name='descendant_links')
+    descendant = models.ForeignKey('Category', related_name='ancestor_links')
+    # Number of levels between the ancestor and descendant.
+    depth = models.IntegerField()
+
+    def __unicode__(self):
+        return "%s > %s" % (self.ancestor, self.descendant)
+
+    class Meta:
+        unique_together = (("ancestor", "descendant"))
+
+
+###############################################################################
+
+class DataVersion(models.Model):
+    """Changes whenever the data in an account does.
+
+    Cached results (IE the JSON API) are keyed by the versions of the accounts
+    they were computed from. See finance.versions.
+    """
+    account = models.OneToOneField('Account', related_name='data_version')
+    # Random rather than a counter, so it is never repeated by another
+    # database (IE the test database) sharing the same cache.
+    version = models.CharField(max_length=32)
+
+    def __unicode__(self):
+        return "%s %s" % (self.account, self.version)
+
+
+@receiver(connection_created)
+def _connection_created(sender, connection, **kw):
+    database.configure(connection)
+
+
+def _search_text(trans):
+    from finance import search
+    return tuple(getattr(trans, field) for field in search.FIELDS)
+
+
+@receiver(signals.post_init, sender=Transaction)
+def _transaction_init(sender, instance, **kw):
+    from finance import summary
+    instance._summary_state = summary.state(instance)
+    instance._search_text = _search_text(instance)
+
+
+@receiver(signals.post_save, sender=Transaction)
+def _transaction_saved(sender, instance, created=False, raw=False, **kw):
+    if raw:
+        return
+
+    from finance import summary
+    summary.saved(instance, created)
+
+    from finance import search
+    text = _search_text(instance)
+    if created or text != getattr(instance, '_search_text', None):
+        search.changed_transactions([instance.id])
+    instance._search_text = text
+
+
+@receiver(signals.post_delete, sender=Transaction)
+def _transaction_deleted(sender, instance, **kw):
+    # The suggested categories and transfers are already gone, so the cell
+    # it was in has to be recomputed.
+    from finance import summary
+    old = getattr(instance, '_summary_state', None)
+    if old is not None:
+        summary.changed([old[:2]])
+
+    from finance import search
+    search.removed_transactions([instance.id])
+
+
+@receiver(signals.m2m_changed, sender=Transaction.suggested_categories.through)
+def _transaction_categories_changed(sender, instance, action, reverse, pk_set, **kw):
+    from finance import summary
+
+    if reverse:
+        # The categories for a set of transactions changed.
+        if action == "pre_clear":
+            instance._summary_cleared = list(
+                instance.transaction_suggested_set.values_list('id', flat=True))
+        elif action == "post_clear":
+            summary.changed_transactions(instance._summary_cleared)
+        elif action in ("post_add", "post_remove"):
+            summary.changed_transactions(pk_set)
+    else:
+        if action in ("post_add", "post_remove", "post_clear"):
+            summary.changed([summary.key(instance)])
+
+    # The category exported for a transaction can come from its suggestions.
+    if action in ("post_add", "post_remove"):
+        ids = pk_set if reverse else [instance.id]
+    elif action == "post_clear":
+        ids = instance._summary_cleared if reverse else [instance.id]
+    else:
+        return
+    Transaction.objects.filter(id__in=list(ids)).update(
+        modified=datetime.datetime.now())
+
+
+@receiver(signals.post_save, sender=Category)
+@receiver(signals.post_delete, sender=Category)
+def _category_changed(sender, instance, raw=False, **kw):
+    # Fixtures load every category, categories.ensure() rebuilds the closure
+    # once they are all there.
+    if raw:
+        return
+
+    from finance import categories
+    categories.rebuild()
+
+    # Reports roll up totals through the tree, so every account is affected.
+    from finance import versions
+    versions.bump(Account.objects.values_list('id', flat=True))
+
+
+@receiver(signals.post_save, sender=RelatedTransaction)
+@receiver(signals.post_delete, sender=RelatedTransaction)
+def _related_changed(sender, instance, raw=False, **kw):
+    if raw:
+        return
+
+    # Transfers are summarized separately.
+    from finance import summary
+    summary.changed_transactions([instance.trans_from_id, instance.trans_to_id])
+
+    from finance import versions
+    versions.changed_transactions([instance.trans_from_id, instance.trans_to_id])
+
+
+@receiver(signals.post_save, sender=Account)
+def _account_saved(sender, instance, raw=False, **kw):
+    if raw:
+        return
+
+    from finance import versions
+    versions.bump([instance.id])
+
+
+@receiver(signals.post_save, sender=Imported)
+def _imported_saved(sender, instance, created=False, raw=False, **kw):
+    if raw or not created:
+        return
+
+    from finance import versions
+    versions.bump([instance.account_id])
@@ -0,0 +1,197 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Reports summarize transactions, IE the amount spent in each category.
+
+The heavy lifting is done by the database so a report costs a fixed number of
+queries no matter how many transactions are in the range. Results can be
+cached under cache_key(), which changes whenever the data does.
+"""
+
+import datetime
+
+from django.db import connection
+from django.db.models import Q, Sum
+
+from finance import categories
+from finance import models
+from finance import summary
+from finance import versions
+
+
+def excluded_accounts(accounts):
+    """Find the models.Account ids for a list of account ids or short ids."""
+    if not accounts:
+        return []
+
+    return list(models.Account.objects.filter(
+        Q(account_id__in=accounts) | Q(short_id__in=accounts)
+        ).values_list('id', flat=True))
+
+
+def cache_key(name, start_date=None, end_date=None, exclude=None, **params):
+    """Cache key for a report, see finance.versions.
+
+    The key changes whenever any of the accounts the report covers does.
+    """
+    exclude = excluded_accounts(exclude)
+    account_ids = models.Account.objects.exclude(id__in=exclude
+        ).values_list('id', flat=True)
+    return versions.key(
+        name, (start_date, end_date, sorted(exclude), sorted(params.items())),
+        account_ids)
+
+
+def transactions(start_date=None, end_date=None, exclude=None):
+    """Transactions which should be included in a report.
+
+    Args:
+        start_date: Only include transactions entered on or after this date.
+        end_date: Only include transactions entered on or before this date.
+        exclude: List of account ids or short ids to skip.
+    """
+    q = models.Transaction.objects.filter(removed_by=None)
+    if start_date is not None:
+        q = q.filter(imported_entered_date__gte=start_date)
+    if end_date is not None:
+        q = q.filter(imported_entered_date__lte=end_date)
+
+    exclude = excluded_accounts(exclude)
+    if exclude:
+        q = q.exclude(account__in=exclude)
+
+    return q
+
+
+def without_transfers(q, exclude=None):
+    """Remove transfers between accounts from a transaction query.
+
+    Transfers to or from an excluded account are kept, as the money really
+    did come in or go out of the accounts being looked at.
+    """
+    transfers = models.RelatedTransaction.objects.filter(relationship="TRANSFER")
+
+    exclude = excluded_accounts(exclude)
+    if exclude:
+        transfers = transfers.exclude(trans_from__account__in=exclude
+            ).exclude(trans_to__account__in=exclude)
+
+    return q.exclude(id__in=transfers.values('trans_from')
+        ).exclude(id__in=transfers.values('trans_to'))
+
+
+def monthly_totals(q):
+    """Total a transaction query by the year and month they were entered.
+
+    Returns:
+        Dictionary of (year, month) to (incoming, outgoing) in cents.
+    """
+    entered_date = "%s.%s" % (
+        connection.ops.quote_name(models.Transaction._meta.db_table),
+        connection.ops.quote_name('imported_entered_date'))
+    q = q.extra(select={
+        'year': connection.ops.date_extract_sql('year', entered_date),
+        'month': connection.ops.date_extract_sql('month', entered_date),
+        })
+
+    totals = {}
+    for i, amounts in enumerate((q.filter(imported_amount__gt=0),
+                                 q.filter(imported_amount__lt=0))):
+        for row in amounts.values('year', 'month').annotate(
+                amount=Sum('imported_amount')).order_by():
+            month = (int(row['year']), int(row['month']))
+            totals.setdefault(month, [0, 0])[i] = row['amount']
+    return dict((month, tuple(amounts)) for month, amounts in totals.items())
+
+
+def whole_months(start_date=None, end_date=None):
+    """Does a date range cover whole months, IE can it use the summary?"""
+    if start_date is not None:
+        if start_date != datetime.datetime.combine(summary.month(start_date), datetime.time()):
+            return False
+    if end_date is not None:
+        end_date += datetime.timedelta(microseconds=1)
+        if end_date != datetime.datetime.combine(summary.month(end_date), datetime.time()):
+            return False
+    return True
+
+
+def summaries(start_date=None, end_date=None, exclude=None):
+    """models.MonthlySummary rows for the months in a date range.
+
+    Like without_transfers(), transfers between accounts are left out.
+    """
+    q = models.MonthlySummary.objects.all()
+    if start_date is not None:
+        q = q.filter(month__gte=summary.month(start_date))
+    if end_date is not None:
+        q = q.filter(month__lte=summary.month(end_date))
+
+    exclude = excluded_accounts(exclude)
+    if exclude:
+        q = q.exclude(account__in=exclude)
+    return q.filter(Q(transfer_account=None) | Q(transfer_account__in=exclude))
+
+
+def category_totals(start_date=None, end_date=None, exclude=None):
+    """Total amount of the transactions directly in each category.
+
+    Transfers between accounts are not included, see without_transfers().
+    When the range covers whole months the totals come from the summary
+    table.
+
+    Returns:
+        Dictionary of category id to amount in cents.
+    """
+    if whole_months(start_date, end_date):
+        q = summaries(start_date, end_date, exclude)
+        q = q.values('category').annotate(
+            incoming=Sum('incoming'), outgoing=Sum('outgoing')).order_by()
+        totals = dict((row['category'] or 'unknown', row['incoming']+row['outgoing'])
+                      for row in q)
+    else:
+        q = transactions(start_date, end_date, exclude)
+        q = without_transfers(q, exclude)
+        q = q.extra(select={'category': summary.category_sql()})
+        q = q.values('category').annotate(amount=Sum('imported_amount')).order_by()
+        totals = dict((row['category'] or 'unknown', row['amount']) for row in q)
+    return totals
+
+
+def month_totals(start_date=None, end_date=None, exclude=None):
+    """Incoming and outgoing amounts each month.
+
+    Transfers between accounts are not included, see without_transfers().
+    When the range covers whole months the totals come from the summary
+    table.
+
+    Returns:
+        Dictionary of (year, month) to (incoming, outgoing) in cents.
+    """
+    if not whole_months(start_date, end_date):
+        q = transactions(start_date, end_date, exclude)
+        return monthly_totals(without_transfers(q, exclude))
+
+    q = summaries(start_date, end_date, exclude)
+    q = q.values('month').annotate(
+        incoming=Sum('incoming'), outgoing=Sum('outgoing')).order_by()
+    # Months with nothing coming in or going out aren't included, like
+    # monthly_totals().
+    return dict(((row['month'].year, row['month'].month),
+                 (row['incoming'], row['outgoing']))
+                for row in q if row['incoming'] or row['outgoing'])
+
+
+def rollup(totals):
+    """Add the totals of each category to all the parent categories.
+
+    Categories which aren't in the tree (IE 'unknown') are left as is.
+    """
+    tree = categories.ancestors()
+
+    rolled = {}
+    for category, amount in totals.items():
+        for parent in tree.get(category, [category]):
+            rolled[parent] = rolled.get(parent, 0) + amount
+    return rolled
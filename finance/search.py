@@ -0,0 +1,240 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Full-text index over the descriptions and locations of transactions.
+
+On SQLite this is an FTS5 virtual table keyed by the transaction id, on
+PostgreSQL a table of tsvectors with a GIN index. Other databases (or SQLite
+builds without FTS5) fall back to LIKE queries.
+
+The index is updated when a transaction is saved or deleted. Bulk writes which
+don't send signals need to call changed_transactions() themselves.
+"""
+
+import re
+
+from django.db import connections, DEFAULT_DB_ALIAS, DatabaseError
+from django.db.models import Q
+
+from finance import models
+
+
+TABLE = 'finance_transaction_fts'
+
+CREATE = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %(fts)s"
+        " USING fts5(description, location)",
+        ],
+    'postgresql': [
+        "CREATE TABLE IF NOT EXISTS %(fts)s ("
+        " transaction_id integer PRIMARY KEY,"
+        " document tsvector NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS %(fts)s_document"
+        " ON %(fts)s USING GIN (document)",
+        ],
+    }
+
+# Copies the text of the transactions matching a WHERE clause into the index.
+INSERT = {
+    'sqlite': """\
+INSERT INTO %(fts)s (rowid, description, location)
+SELECT id,
+       imported_description || ' ' || COALESCE(override_description, ''),
+       imported_location || ' ' || COALESCE(override_location, '')
+FROM %(transaction)s WHERE %(where)s""",
+    'postgresql': """\
+INSERT INTO %(fts)s (transaction_id, document)
+SELECT id,
+       setweight(to_tsvector('simple',
+           imported_description || ' ' || COALESCE(override_description, '')), 'A') ||
+       setweight(to_tsvector('simple',
+           imported_location || ' ' || COALESCE(override_location, '')), 'B')
+FROM %(transaction)s WHERE %(where)s""",
+    }
+
+DELETE = {
+    'sqlite': "DELETE FROM %(fts)s WHERE %(where)s",
+    'postgresql': "DELETE FROM %(fts)s WHERE %(where)s",
+    }
+
+KEY = {
+    'sqlite': 'rowid',
+    'postgresql': 'transaction_id',
+    }
+
+# Matching transaction ids for a query, best first.
+MATCH = {
+    'sqlite': """\
+SELECT rowid FROM %(fts)s WHERE %(fts)s MATCH %%s""",
+    'postgresql': """\
+SELECT transaction_id FROM %(fts)s WHERE document @@ to_tsquery('simple', %%s)""",
+    }
+
+RANK = {
+    # Description matches count for more than location matches.
+    'sqlite': " ORDER BY bm25(%(fts)s, 2.0, 1.0), rowid DESC",
+    'postgresql': (" ORDER BY ts_rank(document, to_tsquery('simple', %%s)) DESC,"
+                   " transaction_id DESC"),
+    }
+
+# Fields searched when there is no index.
+FIELDS = [
+    'imported_description', 'override_description',
+    'imported_location', 'override_location',
+    ]
+
+CHUNK_SIZE = 500
+
+# Whether each database has the index, see installed().
+_installed = {}
+
+
+def words(text):
+    """Split a search into words.
+
+    >>> words(u'Woolworths, Sydney "NSW"')
+    [u'Woolworths', u'Sydney', u'NSW']
+    """
+    return re.findall(r'\w+', text, re.UNICODE)
+
+
+def query(vendor, text):
+    """Make a full text query which matches words starting with every word.
+
+    >>> query('sqlite', 'wool syd')
+    '"wool"* "syd"*'
+    >>> query('postgresql', 'wool syd')
+    'wool:* & syd:*'
+    """
+    if vendor == 'postgresql':
+        return " & ".join("%s:*" % w for w in words(text))
+    return " ".join('"%s"*' % w for w in words(text))
+
+
+def installed(using=DEFAULT_DB_ALIAS):
+    """Does the database have the index?
+
+    Only looked up the first time for each database, install() looks again.
+    """
+    if using not in _installed:
+        connection = connections[using]
+        _installed[using] = (connection.vendor in CREATE and
+                             TABLE in connection.introspection.table_names())
+    return _installed[using]
+
+
+def install(using=DEFAULT_DB_ALIAS):
+    """Create the index (if the database supports it) and fill it."""
+    _installed.pop(using, None)
+    connection = connections[using]
+    if connection.vendor not in CREATE or installed(using):
+        return False
+
+    cursor = connection.cursor()
+    try:
+        for sql in CREATE[connection.vendor]:
+            cursor.execute(sql % {'fts': TABLE})
+    except DatabaseError:
+        # IE SQLite without FTS5, searches will use LIKE instead.
+        return False
+    finally:
+        _installed.pop(using, None)
+
+    rebuild(using)
+    return True
+
+
+def _sql(statements, connection, where):
+    return statements[connection.vendor] % {
+        'fts': TABLE,
+        'transaction': models.Transaction._meta.db_table,
+        'where': where,
+        }
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """Recompute the whole index."""
+    if not installed(using):
+        return 0
+
+    connection = connections[using]
+    cursor = connection.cursor()
+    cursor.execute(_sql(DELETE, connection, "1 = 1"))
+    cursor.execute(_sql(INSERT, connection, "1 = 1"))
+    return models.Transaction.objects.using(using).count()
+
+
+def changed_transactions(transaction_ids, using=DEFAULT_DB_ALIAS):
+    """Update the index for some transactions which were added or changed."""
+    transaction_ids = list(transaction_ids)
+    if not transaction_ids or not installed(using):
+        return
+
+    connection = connections[using]
+    cursor = connection.cursor()
+    for i in range(0, len(transaction_ids), CHUNK_SIZE):
+        chunk = transaction_ids[i:i+CHUNK_SIZE]
+        in_chunk = "IN (%s)" % ", ".join(["%s"] * len(chunk))
+
+        cursor.execute(_sql(DELETE, connection, "%s %s" % (
+            KEY[connection.vendor], in_chunk)), chunk)
+        cursor.execute(_sql(INSERT, connection, "id " + in_chunk), chunk)
+
+
+def removed_transactions(transaction_ids, using=DEFAULT_DB_ALIAS):
+    """Remove deleted transactions from the index."""
+    transaction_ids = list(transaction_ids)
+    if not transaction_ids or not installed(using):
+        return
+
+    connection = connections[using]
+    cursor = connection.cursor()
+    for i in range(0, len(transaction_ids), CHUNK_SIZE):
+        chunk = transaction_ids[i:i+CHUNK_SIZE]
+        cursor.execute(_sql(DELETE, connection, "%s IN (%s)" % (
+            KEY[connection.vendor], ", ".join(["%s"] * len(chunk)))), chunk)
+
+
+def matching(q, text):
+    """Filter a transaction query to ones matching a search."""
+    using = q.db
+    if not words(text):
+        return q
+
+    if not installed(using):
+        for word in words(text):
+            match = Q()
+            for field in FIELDS:
+                match |= Q(**{field + '__icontains': word})
+            q = q.filter(match)
+        return q
+
+    connection = connections[using]
+    return q.extra(
+        where=["%s.id IN (%s)" % (
+            connection.ops.quote_name(models.Transaction._meta.db_table),
+            _sql(MATCH, connection, None))],
+        params=[query(connection.vendor, text)])
+
+
+def search(text, limit=50, offset=0, using=DEFAULT_DB_ALIAS):
+    """Ids of the transactions matching a search, best match first."""
+    if not words(text):
+        return []
+
+    if not installed(using):
+        q = matching(models.Transaction.objects.using(using), text)
+        return list(q.order_by('-imported_entered_date', '-id'
+            ).values_list('id', flat=True)[offset:offset+limit])
+
+    connection = connections[using]
+    sql = _sql(MATCH, connection, None) + _sql(RANK, connection, None)
+    params = [query(connection.vendor, text)]
+    if connection.vendor == 'postgresql':
+        params.append(params[0])
+
+    cursor = connection.cursor()
+    cursor.execute(sql + " LIMIT %s OFFSET %s", params + [limit, offset])
+    return [row[0] for row in cursor.fetchall()]
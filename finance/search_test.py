@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import cStringIO as SIO
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from finance import models
+from finance import search
+from finance import testing
+from finance.importers import csv_importer
+
+
+class SearchTest(testing.AccountTestCase):
+    class SimpleImporter(csv_importer.CSVImporter):
+        FIELDS = [
+            csv_importer.FieldList.DATE,
+            csv_importer.FieldList.AMOUNT,
+            csv_importer.FieldList.DESCRIPTION,
+            ]
+        DATEFMT = "%d/%m/%Y"
+        ORDER = reversed
+
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        models.Reconciliation.objects.create(
+            account=self.account, previous_id=None,
+            at=datetime.datetime.fromtimestamp(0), amount=0)
+
+        self.ids = self.SimpleImporter().parse_file(self.account, SIO.StringIO("""\
+12/01/2012,"-3.00","WOOLWORTHS SYDNEY"
+11/01/2012,"-5.00","COLES SYDNEY"
+10/01/2012,"-1.00","WOOLWORTHS MELBOURNE"
+"""))
+
+    def descriptions(self, ids):
+        trans = models.Transaction.objects.in_bulk(ids)
+        return [trans[i].override_description or trans[i].imported_description
+                for i in ids]
+
+    def test_import(self):
+        self.assertItemsEqual(
+            self.descriptions(search.search("wool")),
+            ["WOOLWORTHS SYDNEY", "WOOLWORTHS MELBOURNE"])
+        self.assertListEqual(
+            self.descriptions(search.search("syd wool")), ["WOOLWORTHS SYDNEY"])
+        self.assertListEqual(search.search("aldi"), [])
+        self.assertListEqual(search.search(" ,. "), [])
+
+        self.assertEqual(search.matching(
+            models.Transaction.objects.all(), "sydney").count(), 2)
+
+    def test_pages(self):
+        first = search.search("sydney", limit=1)
+        second = search.search("sydney", limit=1, offset=1)
+        self.assertEqual(len(first + second), 2)
+        self.assertItemsEqual(first + second, search.search("sydney"))
+
+    def test_save_and_delete(self):
+        trans = models.Transaction.objects.get(id=self.ids[0])
+        trans.override_description = "Lunch"
+        trans.save()
+        self.assertListEqual(search.search("lunch"), [trans.id])
+
+        trans.delete()
+        self.assertListEqual(search.search("lunch"), [])
+
+    def test_view(self):
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+
+        response = self.client.get("/finance/api/search", {
+            "q": "woolworths", "page_size": 1})
+        data = json.loads(response.content)
+        self.assertEqual(len(data['results']), 1)
+        self.assertTrue(data['has_next'])
+
+        response = self.client.get("/finance/api/search", {
+            "q": "woolworths", "page_size": 1, "page": 2})
+        data = json.loads(response.content)
+        self.assertEqual(len(data['results']), 1)
+        self.assertFalse(data['has_next'])
+        self.assertEqual(data['results'][0]['amount_display'][0], "$")
+
+    def test_view_missing(self):
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+
+        # Deleted without the index being told.
+        connection.cursor().execute(
+            "DELETE FROM %s WHERE id = %%s" % models.Transaction._meta.db_table,
+            [self.ids[0]])
+
+        response = self.client.get("/finance/api/search", {"q": "woolworths"})
+        data = json.loads(response.content)
+        self.assertEqual(len(data['results']), 1)
+
+    def test_installed(self):
+        installed = search.installed()
+        with self.assertNumQueries(0):
+            self.assertEqual(search.installed(), installed)
+
+        search._installed['default'] = not installed
+        search.install()
+        self.assertEqual(search.installed(), installed)
+
+    def test_admin(self):
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+
+        response = self.client.get(
+            "/admin/finance/transaction/", {"q": "melbourne"})
+        self.assertEqual(response.context['cl'].result_count, 1)
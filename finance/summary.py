@@ -0,0 +1,269 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Maintains the models.MonthlySummary table.
+
+The summary holds the incoming, outgoing and count of transactions for each
+account, month and category, with transfers between accounts kept apart.
+When a transaction is saved its amount is moved between the cells it was
+and is now in. When many transactions change at once (IE they are
+recategorized or linked as transfers) the (account, month) cells they are in
+are recomputed from the transactions table.
+
+Bulk operations (such as imports) should wrap themselves in deferred() so that
+each cell is only recomputed once at the end, rather than after every save.
+"""
+
+import datetime
+import functools
+import threading
+
+from django.db.models import F
+
+from finance import models
+from finance import versions
+
+
+# The category a transaction is reported under is the primary category, or
+# failing that the first suggested category.
+SUGGESTED_SQL = """\
+(SELECT MIN(suggested.category_id)
+ FROM %(suggested)s AS suggested
+ WHERE suggested.transaction_id = %(transaction)s.id)"""
+
+CATEGORY_SQL = "COALESCE(%(transaction)s.primary_category_id, " + SUGGESTED_SQL + ")"
+
+# The account at the other end of a transfer, NULL for transactions which
+# aren't transfers.
+TRANSFER_SQL = """\
+(SELECT MIN(other.account_id)
+ FROM %(related)s AS related, %(transaction)s AS other
+ WHERE related.relationship = 'TRANSFER'
+   AND ((related.trans_from_id = %(transaction)s.id AND other.id = related.trans_to_id)
+     OR (related.trans_to_id = %(transaction)s.id AND other.id = related.trans_from_id)))"""
+
+
+def _tables():
+    return {
+        'transaction': models.Transaction._meta.db_table,
+        'suggested': models.Transaction.suggested_categories.through._meta.db_table,
+        'related': models.RelatedTransaction._meta.db_table,
+        }
+
+
+def category_sql():
+    return CATEGORY_SQL % _tables()
+
+
+def suggested_sql():
+    return SUGGESTED_SQL % _tables()
+
+
+def transfer_sql():
+    return TRANSFER_SQL % _tables()
+
+
+def summary_rows(q):
+    """(account id, date, category id, transfer account id, amount) rows."""
+    return q.extra(select={'category': category_sql(), 'transfer': transfer_sql()}
+        ).values_list('account_id', 'imported_entered_date', 'category',
+                      'transfer', 'imported_amount'
+        ).order_by()
+
+
+def month(date):
+    """First day of the month a date is in."""
+    return datetime.date(date.year, date.month, 1)
+
+
+def next_month(date):
+    """First day of the month after the one a date is in."""
+    if date.month == 12:
+        return datetime.date(date.year+1, 1, 1)
+    return datetime.date(date.year, date.month+1, 1)
+
+
+def key(trans):
+    """The (account id, month) summary cell a transaction belongs in."""
+    if trans.account_id is None or trans.imported_entered_date is None:
+        return None
+    return (trans.account_id, month(trans.imported_entered_date))
+
+
+def state(trans):
+    """The fields of a transaction the summary depends on.
+
+    Returns:
+        (account id, month, primary category id, amount, removed), or None
+        for transactions which aren't in any summary cell.
+    """
+    k = key(trans)
+    if k is None:
+        return None
+    return k + (trans.primary_category_id, trans.imported_amount,
+                trans.removed_by_id is not None)
+
+
+_state = threading.local()
+
+
+class deferred(object):
+    """Hold off updating the summary until the end of a bulk operation.
+
+    Can be used as a context manager or a decorator;
+
+    with summary.deferred():
+        ...
+
+    @summary.deferred()
+    def parse_file(...):
+        ...
+    """
+
+    def __enter__(self):
+        if getattr(_state, 'pending', None) is None:
+            _state.pending = set()
+            self.outer = True
+        else:
+            self.outer = False
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.outer:
+            return
+
+        pending = _state.pending
+        _state.pending = None
+        if exc_type is None:
+            refresh(pending)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            with deferred():
+                return func(*args, **kw)
+        return wrapper
+
+
+def changed(keys):
+    """Note that the transactions in some summary cells have changed."""
+    keys = set(k for k in keys if k is not None)
+
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.update(keys)
+    else:
+        refresh(keys)
+
+
+def changed_transactions(transaction_ids):
+    """Note that some transactions have changed."""
+    transaction_ids = list(transaction_ids)
+
+    keys = set()
+    # Stay under the database's limit on query parameters.
+    for i in range(0, len(transaction_ids), 500):
+        q = models.Transaction.objects.filter(
+            id__in=transaction_ids[i:i+500]
+            ).values_list('account_id', 'imported_entered_date')
+        for account_id, entered_date in q:
+            keys.add((account_id, month(entered_date)))
+    changed(keys)
+
+
+def saved(trans, created=False):
+    """Update the summary after a transaction was saved.
+
+    Rather than recomputing the cells the transaction was and is now in, its
+    old amount is taken out of the old cell and the new amount added to the
+    new one. Saves which don't change anything the summary depends on (IE
+    the description) don't touch the summary.
+    """
+    old = None if created else getattr(trans, '_summary_state', None)
+    new = state(trans)
+    trans._summary_state = new
+    both = [fields for fields in (old, new) if fields is not None]
+
+    if getattr(_state, 'pending', None) is not None:
+        changed(fields[:2] for fields in both)
+        return
+
+    if old != new:
+        # Saving the transaction doesn't change its suggested categories or
+        # transfers, so they are the same before and after.
+        suggested, transfer_id = models.Transaction.objects.filter(id=trans.id
+            ).extra(select={'suggested': suggested_sql(), 'transfer': transfer_sql()}
+            ).values_list('suggested', 'transfer')[0]
+
+        for fields, sign in ((old, -1), (new, 1)):
+            if fields is None:
+                continue
+            account_id, start, category_id, amount, removed = fields
+            if not removed:
+                adjust(account_id, start, category_id or suggested,
+                       transfer_id, amount, sign)
+
+    # Results cached from the account show more than the summary does (IE
+    # the description), so they change either way.
+    versions.bump(fields[0] for fields in both)
+
+
+def adjust(account_id, start, category_id, transfer_id, amount, sign):
+    """Add (sign 1) or take away (sign -1) a transaction from a summary cell."""
+    cell, _ = models.MonthlySummary.objects.get_or_create(
+        account_id=account_id, month=start, category_id=category_id,
+        transfer_account_id=transfer_id)
+
+    column = 'incoming' if amount > 0 else 'outgoing'
+    cells = models.MonthlySummary.objects.filter(id=cell.id)
+    cells.update(**{column: F(column) + sign*amount, 'count': F('count') + sign})
+    if sign < 0:
+        cells.filter(count__lte=0).delete()
+
+
+def refresh(keys):
+    """Recompute the given (account id, month) summary cells."""
+    # Anything which changes the summary also changes results cached from it.
+    versions.bump(account_id for account_id, start in keys)
+
+    for account_id, start in sorted(keys):
+        models.MonthlySummary.objects.filter(
+            account=account_id, month=start).delete()
+
+        q = models.Transaction.objects.filter(
+            account=account_id,
+            imported_entered_date__gte=start,
+            imported_entered_date__lt=next_month(start),
+            removed_by=None)
+
+        summaries = {}
+        add(summaries, summary_rows(q))
+        models.MonthlySummary.objects.bulk_create(summaries.values())
+
+
+def add(summaries, rows):
+    """Add rows from summary_rows() to summaries."""
+    for account_id, entered_date, category_id, transfer_id, amount in rows:
+        k = (account_id, month(entered_date), category_id, transfer_id)
+        if k not in summaries:
+            summaries[k] = models.MonthlySummary(
+                account_id=account_id, month=k[1], category_id=category_id,
+                transfer_account_id=transfer_id)
+
+        s = summaries[k]
+        if amount > 0:
+            s.incoming += amount
+        else:
+            s.outgoing += amount
+        s.count += 1
+
+
+def rebuild():
+    """Throw away the summary and recompute it from every transaction."""
+    models.MonthlySummary.objects.all().delete()
+
+    summaries = {}
+    add(summaries, summary_rows(
+        models.Transaction.objects.filter(removed_by=None)).iterator())
+    models.MonthlySummary.objects.bulk_create(summaries.values(), batch_size=500)
+    return len(summaries)
@@ -0,0 +1,202 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+
+from django.db import connection
+
+from finance import management
+from finance import models
+from finance import reports
+from finance import summary
+from finance import testing
+
+
+class MonthlySummaryTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        self.food = models.Category.objects.create(
+            category_id="food", description="Food")
+        self.rent = models.Category.objects.create(
+            category_id="rent", description="Rent")
+
+    def assertSummary(self, expected):
+        actual = sorted(models.MonthlySummary.objects.values_list(
+            'month', 'category', 'incoming', 'outgoing', 'count'))
+        self.assertListEqual(actual, expected)
+
+        # The incrementally maintained summary should match a rebuild.
+        summary.rebuild()
+        self.assertListEqual(sorted(models.MonthlySummary.objects.values_list(
+            'month', 'category', 'incoming', 'outgoing', 'count')), actual)
+
+    def test_insert(self):
+        self.create_transaction("1", datetime.datetime(2012, 1, 5), 100)
+        self.create_transaction("2", datetime.datetime(2012, 1, 6), -50)
+        self.create_transaction("3", datetime.datetime(2012, 2, 1), -20)
+
+        self.assertSummary([
+            (datetime.date(2012, 1, 1), None, 100, -50, 2),
+            (datetime.date(2012, 2, 1), None, 0, -20, 1),
+            ])
+
+    def test_removed(self):
+        trans = self.create_transaction("1", datetime.datetime(2012, 1, 5), 100)
+        self.create_transaction("2", datetime.datetime(2012, 1, 6), -50)
+
+        trans.removed_by = self.imported()
+        trans.save()
+
+        self.assertSummary([
+            (datetime.date(2012, 1, 1), None, 0, -50, 1),
+            ])
+
+    def test_moved_month(self):
+        trans = self.create_transaction("1", datetime.datetime(2012, 1, 5), 100)
+
+        trans.imported_entered_date = datetime.datetime(2012, 3, 5)
+        trans.save()
+
+        self.assertSummary([
+            (datetime.date(2012, 3, 1), None, 100, 0, 1),
+            ])
+
+    def test_recategorized(self):
+        trans1 = self.create_transaction("1", datetime.datetime(2012, 1, 5), -100)
+        trans2 = self.create_transaction("2", datetime.datetime(2012, 1, 6), -50)
+
+        trans1.suggested_categories.add(self.food)
+        trans2.suggested_categories.add(self.food)
+        trans2.primary_category = self.rent
+        trans2.save()
+
+        self.assertSummary([
+            (datetime.date(2012, 1, 1), u"food", 0, -100, 1),
+            (datetime.date(2012, 1, 1), u"rent", 0, -50, 1),
+            ])
+
+        self.food.transaction_suggested_set.clear()
+        self.assertSummary([
+            (datetime.date(2012, 1, 1), None, 0, -100, 1),
+            (datetime.date(2012, 1, 1), u"rent", 0, -50, 1),
+            ])
+
+    def test_deferred(self):
+        with summary.deferred():
+            self.create_transaction("1", datetime.datetime(2012, 1, 5), 100)
+            self.create_transaction("2", datetime.datetime(2012, 1, 6), -50)
+            self.assertEqual(models.MonthlySummary.objects.count(), 0)
+
+        self.assertSummary([
+            (datetime.date(2012, 1, 1), None, 100, -50, 2),
+            ])
+
+    def test_transfers(self):
+        other = self.create_account("account_2", "acc2")
+        transfer = models.Category.objects.create(
+            category_id="transfer", description="Transfer")
+
+        out = self.create_transaction("1", datetime.datetime(2012, 1, 5), -500)
+        into = self.create_transaction(
+            "1", datetime.datetime(2012, 1, 6), 500, account=other)
+        models.RelatedTransaction.objects.create(
+            trans_from=out, trans_to=into, relationship="TRANSFER", type="A")
+        # Only suggested as a transfer, so still counted.
+        self.create_transaction(
+            "2", datetime.datetime(2012, 1, 7), -20
+            ).suggested_categories.add(transfer)
+        self.create_transaction(
+            "3", datetime.datetime(2012, 1, 8), -50, primary_category=self.food)
+
+        self.assertSummary([
+            (datetime.date(2012, 1, 1), None, 0, -500, 1),
+            (datetime.date(2012, 1, 1), None, 500, 0, 1),
+            (datetime.date(2012, 1, 1), u"food", 0, -50, 1),
+            (datetime.date(2012, 1, 1), u"transfer", 0, -20, 1),
+            ])
+
+        # Whole months come from the summary, anything else from the
+        # transactions, but they should agree.
+        whole = (datetime.datetime(2012, 1, 1), datetime.datetime(2012, 1, 31, 23, 59, 59, 999999))
+        part = (datetime.datetime(2012, 1, 1), datetime.datetime(2012, 1, 31))
+        self.assertTrue(reports.whole_months(*whole))
+        self.assertFalse(reports.whole_months(*part))
+
+        for exclude, expected in (
+                ([], {u"food": -50, u"transfer": -20}),
+                (["acc2"], {u"food": -50, u"transfer": -20, u"unknown": -500})):
+            self.assertDictEqual(
+                reports.category_totals(*whole, exclude=exclude), expected)
+            self.assertDictEqual(
+                reports.category_totals(*part, exclude=exclude), expected)
+
+    def test_month_totals(self):
+        other = self.create_account("account_2", "acc2")
+        out = self.create_transaction("1", datetime.datetime(2012, 1, 5), -500)
+        into = self.create_transaction(
+            "1", datetime.datetime(2012, 2, 6), 500, account=other)
+        models.RelatedTransaction.objects.create(
+            trans_from=out, trans_to=into, relationship="TRANSFER", type="A")
+        self.create_transaction("2", datetime.datetime(2012, 1, 7), -20)
+        self.create_transaction("3", datetime.datetime(2012, 2, 8), 70)
+        self.create_transaction("4", datetime.datetime(2012, 3, 9), 0)
+
+        whole = (datetime.datetime(2012, 1, 1), datetime.datetime(2012, 3, 31, 23, 59, 59, 999999))
+        part = (datetime.datetime(2012, 1, 1), datetime.datetime(2012, 3, 31))
+        for exclude, expected in (
+                ([], {(2012, 1): (0, -20), (2012, 2): (70, 0)}),
+                (["acc2"], {(2012, 1): (0, -520), (2012, 2): (70, 0)})):
+            self.assertDictEqual(reports.month_totals(exclude=exclude), expected)
+            self.assertDictEqual(
+                reports.month_totals(*whole, exclude=exclude), expected)
+            self.assertDictEqual(
+                reports.month_totals(*part, exclude=exclude), expected)
+
+    def test_save_moves_amount(self):
+        trans = self.create_transaction("1", datetime.datetime(2012, 1, 5), -100)
+        self.create_transaction("2", datetime.datetime(2012, 1, 6), -50)
+
+        # Saving a transaction only moves its own amount, the rest of the
+        # month isn't counted again.
+        models.MonthlySummary.objects.update(count=10)
+        trans.primary_category = self.food
+        trans.save()
+        cells = [
+            (datetime.date(2012, 1, 1), None, 0, -50, 9),
+            (datetime.date(2012, 1, 1), u"food", 0, -100, 1),
+            ]
+        self.assertListEqual(sorted(models.MonthlySummary.objects.values_list(
+            'month', 'category', 'incoming', 'outgoing', 'count')), cells)
+
+        # Nothing the summary depends on changed.
+        trans.override_description = "Lunch"
+        trans.save()
+        self.assertListEqual(sorted(models.MonthlySummary.objects.values_list(
+            'month', 'category', 'incoming', 'outgoing', 'count')), cells)
+
+    def test_syncdb(self):
+        self.create_transaction("1", datetime.datetime(2012, 1, 5), 100)
+        cells = [(datetime.date(2012, 1, 1), None, 100, 0, 1)]
+
+        # A table syncdb just made is filled in.
+        models.MonthlySummary.objects.all().delete()
+        management._fill_summary(
+            models, db='default', created_models=[models.MonthlySummary])
+        self.assertSummary(cells)
+
+        # As is one made to replace a table from before transfers were kept
+        # apart.
+        cursor = connection.cursor()
+        cursor.execute("DROP TABLE finance_monthlysummary")
+        cursor.execute("""\
+CREATE TABLE finance_monthlysummary (
+    id integer NOT NULL PRIMARY KEY,
+    account_id integer NOT NULL,
+    month date NOT NULL,
+    category_id varchar(100),
+    incoming integer NOT NULL,
+    outgoing integer NOT NULL,
+    count integer NOT NULL)""")
+        management._fill_summary(models, db='default', created_models=[])
+        self.assertSummary(cells)
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Fixtures shared by the tests.
+"""
+
+import datetime
+
+from django import test as djangotest
+from django.test.utils import override_settings
+
+from finance import models
+from finance import versions
+
+
+# Cached results are kept in memory rather than in settings.CACHES, so the
+# tests don't write to the project directory or see each other's results.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+
+class AccountFixture(object):
+    """Mixin for test cases giving them an account to put transactions in.
+
+    self.account is "account_1" (short id "acc1") of the site "site_1",
+    everything else is created by the tests which need it.
+    """
+
+    def setUp(self):
+        self.currency = models.Currency.objects.create(
+            currency_id="money", description="Monies!", symbol="$")
+        self.site = models.Site.objects.create(
+            site_id="site_1", username="username", password="password",
+            importer="importer", image="img.png")
+        self.account = self.create_account("account_1", "acc1")
+        self._imported = {}
+
+    def create_account(self, account_id, short_id):
+        return models.Account.objects.create(
+            site=self.site, account_id=account_id, short_id=short_id,
+            description="", currency=self.currency,
+            last_import=datetime.datetime.now())
+
+    def imported(self, account=None):
+        """The models.Imported which create_transaction uses for an account."""
+        account = account or self.account
+        if account.id not in self._imported:
+            self._imported[account.id] = models.Imported.objects.create(
+                account=account, content="")
+        return self._imported[account.id]
+
+    def create_transaction(self, trans_id, date, amount, account=None, **kw):
+        """Create a transaction as if it was imported into an account.
+
+        Args:
+            trans_id: Id of the transaction in the account.
+            date: When it was entered.
+            amount: Amount in cents.
+            account: Defaults to self.account.
+            kw: Any other fields of the models.Transaction.
+        """
+        account = account or self.account
+        fields = dict(imported_description="", imported_location="")
+        fields.update(kw)
+        return models.Transaction.objects.create(
+            account=account, trans_id=trans_id,
+            imported_first_by=self.imported(account),
+            imported_entered_date=date, imported_amount=amount, **fields)
+
+
+@override_settings(CACHES=CACHES)
+class AccountTestCase(AccountFixture, djangotest.TestCase):
+    def setUp(self):
+        AccountFixture.setUp(self)
+        versions.cache().clear()
@@ -0,0 +1,14 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+from django.conf.urls import patterns, url
+
+urlpatterns = patterns('finance.views',
+    url(r'^api/accounts$', 'accounts', name='finance-accounts'),
+    url(r'^api/balances$', 'balances', name='finance-balances'),
+    url(r'^api/categories$', 'categories', name='finance-categories'),
+    url(r'^api/months$', 'months', name='finance-months'),
+    url(r'^api/search$', 'search', name='finance-search'),
+    url(r'^api/transactions$', 'transactions', name='finance-transactions'),
+)
@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 # vim: set ts=4 sw=4 et sts=4 ai:
 
+import operator
+
+
 def dollar_fmt(number, currency=None):
     u"""Formats a number (in cents) as dollars.
 
@@ -42,29 +45,14 @@ def dollar_fmt(number, currency=None):
     if currency is None:
         currency = "$"
 
-    number = str(number)
-    if number[0] == "-":
+    if number < 0:
         sign = "-"
-        number = number[1:]
+        number = -number
     else:
         sign = "+"
 
-    cents = number[-2:]
-    while len(cents) < 2:
-        cents = "0" + cents
-
-    dollars = list(number[:-2])
-
-    bits = [""]
-    while len(dollars) > 0:
-        if len(bits[0]) == 3:
-            bits.insert(0, "")
-        bits[0] = dollars.pop(-1)+bits[0]
-
-    if bits[0] == "":
-        bits[0] = "0"
-
-    return currency+sign+",".join(bits)+'.'+cents
+    dollars, cents = divmod(number, 100)
+    return "%s%s%s.%02i" % (currency, sign, "{:,}".format(dollars), cents)
 
 
 def dollar_display(description, field_amount, field_currency):
@@ -84,14 +72,17 @@ def dollar_display(description, field_amount, field_currency):
     >>>
 
     """
+    get_currency = operator.attrgetter(field_currency)
+    get_amount = operator.attrgetter(field_amount)
+
     def f(obj):
         try:
-            currency = eval("obj.%s" % field_currency)
+            currency = get_currency(obj)
         except AttributeError:
             return "(None)"
 
         try:
-            value = eval("obj.%s" % field_amount)
+            value = get_amount(obj)
         except AttributeError:
             return "(Invalid Value)"
 
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+"""
+Versions of the data in each account, for caching results computed from it.
+
+Every time the data in an account changes (IE something is imported into it,
+a transaction is edited or recategorized or linked to another) it is given a
+new models.DataVersion. A cache key made from the versions of the accounts a
+result was computed from changes when any of them do, so cached results never
+need to be thrown away, they just stop being asked for.
+"""
+
+import hashlib
+import uuid
+
+from django.core.cache import get_cache, DEFAULT_CACHE_ALIAS
+
+from finance import models
+
+
+# Change to stop using results cached by older code.
+CACHE_PREFIX = 'finance.1'
+
+_missing = object()
+
+
+def bump(account_ids):
+    """Give some accounts a new version."""
+    for account_id in set(account_ids):
+        if account_id is None:
+            continue
+        version = uuid.uuid4().hex
+        if not models.DataVersion.objects.filter(account=account_id).update(
+                version=version):
+            models.DataVersion.objects.create(
+                account_id=account_id, version=version)
+
+
+def changed_transactions(transaction_ids):
+    """Give the accounts of some transactions a new version."""
+    transaction_ids = list(set(transaction_ids))
+    account_ids = set()
+    for i in range(0, len(transaction_ids), 500):
+        account_ids.update(models.Transaction.objects.filter(
+            id__in=transaction_ids[i:i+500]
+            ).values_list('account_id', flat=True).distinct())
+    bump(account_ids)
+
+
+def current(account_ids=None):
+    """The current version of some accounts (default all of them).
+
+    Returns:
+        Dictionary of account id to version, accounts which have never
+        changed have the version ''.
+    """
+    accounts = models.Account.objects.all()
+    if account_ids is not None:
+        accounts = accounts.filter(id__in=list(account_ids))
+
+    return dict((account_id, version or '') for account_id, version in
+                accounts.values_list('id', 'data_version__version'))
+
+
+def key(name, params, account_ids=None):
+    """Cache key for a result.
+
+    Args:
+        name: What the result is, IE the name of the view or report.
+        params: Anything else the result depends on, must have a stable repr.
+        account_ids: Accounts the result was computed from, default all.
+    """
+    return "%s:%s" % (CACHE_PREFIX, hashlib.sha1(repr((
+        name, params, sorted(current(account_ids).items())))).hexdigest())
+
+
+def cache():
+    """The cache results are kept in.
+
+    Looked up each time rather than using django.core.cache.cache, so that
+    changes to settings.CACHES (IE by the tests) are seen.
+    """
+    return get_cache(DEFAULT_CACHE_ALIAS)
+
+
+def cached(cache_key, func):
+    """Get a result from the cache, or compute it with func() and cache it."""
+    results = cache()
+    value = results.get(cache_key, _missing)
+    if value is _missing:
+        value = func()
+        results.set(cache_key, value)
+    return value
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+
+
+from finance import models
+from finance import reports
+from finance import versions
+from finance import testing
+from finance.helpers import base
+
+
+class VersionsTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        self.accounts = [self.account, self.create_account("account_2", "acc2")]
+        self.transactions = [
+            self.create_transaction(
+                "t%i" % i, datetime.datetime(2012, 1, 10), 100, account=account)
+            for i, account in enumerate(self.accounts)]
+        self.category = models.Category.objects.create(
+            category_id="food", description="Food")
+
+    def assertChanged(self, func, *changed):
+        """Check func() changes the version of exactly the given accounts."""
+        ids = [account.id for account in self.accounts]
+        before = versions.current(ids)
+        func()
+        after = versions.current(ids)
+        self.assertEqual(
+            [account for account in self.accounts
+             if before[account.id] != after[account.id]],
+            list(changed))
+
+    def test_transaction_edited(self):
+        trans = self.transactions[0]
+        trans.override_description = "Lunch"
+        self.assertChanged(trans.save, self.accounts[0])
+        self.assertChanged(trans.delete, self.accounts[0])
+
+    def test_categorized(self):
+        trans = self.transactions[1]
+        self.assertChanged(
+            lambda: trans.suggested_categories.add(self.category),
+            self.accounts[1])
+        self.assertChanged(
+            lambda: self.category.transaction_suggested_set.clear(),
+            self.accounts[1])
+
+    def test_related(self):
+        self.assertChanged(
+            lambda: models.RelatedTransaction.objects.create(
+                trans_from=self.transactions[0], trans_to=self.transactions[1],
+                relationship="TRANSFER", type="A"),
+            *self.accounts)
+
+    def test_category_tree(self):
+        self.assertChanged(
+            lambda: models.Category.objects.create(
+                category_id="food/fruit", description="Fruit",
+                parent=self.category),
+            *self.accounts)
+
+    def test_unit_of_work(self):
+        work = base.UnitOfWork()
+        work.set(self.transactions[1], 'override_description', "Lunch")
+        self.assertChanged(work.flush, self.accounts[1])
+
+        work.associate(models.RelatedTransaction(
+            trans_from=self.transactions[0], trans_to=self.transactions[1],
+            relationship="TRANSFER", type="A"))
+        self.assertChanged(work.flush, *self.accounts)
+
+    def test_report_key(self):
+        key = reports.cache_key('details', exclude=['acc2'], level=2)
+        self.assertEqual(
+            reports.cache_key('details', exclude=['acc2'], level=2), key)
+        self.assertNotEqual(
+            reports.cache_key('details', exclude=['acc2'], level=3), key)
+
+        # Changes to an excluded account don't matter.
+        models.Imported.objects.create(account=self.accounts[1], content="")
+        self.assertEqual(
+            reports.cache_key('details', exclude=['acc2'], level=2), key)
+        models.Imported.objects.create(account=self.accounts[0], content="")
+        self.assertNotEqual(
+            reports.cache_key('details', exclude=['acc2'], level=2), key)
@@ -1 +1,291 @@
-# Create your views here.
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+import functools
+import json
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Q
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, Http404)
+
+from finance import balances as finance_balances
+from finance import listing
+from finance import models
+from finance import reports
+from finance import search as finance_search
+from finance import versions
+from finance.utils import dollar_fmt
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+DATE_FORMAT = '%Y-%m-%d'
+
+# Longest range of daily balances returned at once.
+MAX_BALANCE_DAYS = 3660
+
+
+def today():
+    """Today's date, which views default their dates from."""
+    return datetime.date.today()
+
+
+def json_response(data):
+    return HttpResponse(json.dumps(data), content_type='application/json')
+
+
+def cached_json(view):
+    """Cache a JSON view until the data in any account changes.
+
+    The ETag is the cache key, so clients which send If-None-Match get an
+    empty 304 Not Modified response when nothing has changed. Views default
+    dates (IE the end of a range) to today, so the key changes every day too.
+    """
+    @functools.wraps(view)
+    def wrapper(request):
+        cache_key = versions.key(
+            view.__name__, (sorted(request.GET.lists()), today()))
+        etag = '"%s"' % cache_key
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        def render():
+            response = view(request)
+            return response.status_code, response.content
+        status, content = versions.cached(cache_key, render)
+
+        response = HttpResponse(
+            content, content_type='application/json', status=status)
+        if status == 200:
+            response['ETag'] = etag
+        return response
+    return wrapper
+
+
+def date_param(request, name, default=None):
+    """A YYYY-MM-DD date from the GET parameters.
+
+    Raises:
+        ValueError if the date isn't valid.
+    """
+    if not request.GET.get(name):
+        return default
+    return datetime.datetime.strptime(request.GET[name], DATE_FORMAT)
+
+
+def account_param(request):
+    """The models.Account named by the account GET parameter."""
+    try:
+        return models.Account.objects.select_related('currency').get(
+            Q(account_id=request.GET.get('account')) |
+            Q(short_id=request.GET.get('account')))
+    except (models.Account.DoesNotExist,
+            models.Account.MultipleObjectsReturned):
+        raise Http404('No account %r.' % request.GET.get('account'))
+
+
+def report_range(request):
+    """The (start, end, exclude) of a report from the GET parameters.
+
+    The end date is inclusive, so runs to the end of that day.
+    """
+    start_date = date_param(request, 'start')
+    end_date = date_param(request, 'end')
+    if end_date is not None:
+        end_date += datetime.timedelta(days=1, microseconds=-1)
+    return start_date, end_date, request.GET.getlist('exclude')
+
+
+def transaction_json(trans):
+    return {
+        'id': trans.id,
+        'account': trans.account.account_id,
+        'entered_date': trans.imported_entered_date.isoformat(),
+        'description': trans.override_description or trans.imported_description,
+        'location': trans.override_location or trans.imported_location,
+        'amount': trans.imported_amount,
+        'amount_display': dollar_fmt(
+            trans.imported_amount, trans.account.currency.symbol),
+        'removed': trans.removed_by_id is not None,
+        }
+
+
+@staff_member_required
+def search(request):
+    """Transactions matching a search, best match first.
+
+    GET parameters:
+        q: The words to search for.
+        page: Page of results to return, starting at 1.
+        page_size: Number of results on each page.
+    """
+    text = request.GET.get('q', '')
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = min(int(request.GET.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return HttpResponseBadRequest('page and page_size must be numbers.')
+    if page < 1 or page_size < 1:
+        return HttpResponseBadRequest('page and page_size must be positive.')
+
+    # Ask for one extra to know if there is another page.
+    ids = finance_search.search(
+        text, limit=page_size+1, offset=(page-1)*page_size)
+    has_next = len(ids) > page_size
+    ids = ids[:page_size]
+
+    transactions = models.Transaction.objects.filter(id__in=ids
+        ).select_related('account__currency')
+    transactions = dict((trans.id, trans) for trans in transactions)
+    # Transactions deleted since the search ran are left out.
+    transactions = [transactions.get(i) for i in ids]
+
+    return json_response({
+        'q': text,
+        'page': page,
+        'page_size': page_size,
+        'has_next': has_next,
+        'results': [transaction_json(trans) for trans in transactions
+                    if trans is not None],
+        })
+
+
+@staff_member_required
+@cached_json
+def transactions(request):
+    """Transactions newest first, a page at a time.
+
+    GET parameters:
+        after: Cursor from the previous page's "next", absent for the first page.
+        account: Only list the account with this account_id or short_id.
+        page_size: Number of results on each page.
+    """
+    try:
+        page_size = min(int(request.GET.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return HttpResponseBadRequest('page_size must be a number.')
+    if page_size < 1:
+        return HttpResponseBadRequest('page_size must be positive.')
+
+    position = None
+    if request.GET.get('after'):
+        try:
+            position = listing.parse_cursor(request.GET['after'])
+        except ValueError:
+            return HttpResponseBadRequest('after is not a valid cursor.')
+
+    q = models.Transaction.objects.select_related('account__currency')
+    if request.GET.get('account'):
+        q = q.filter(account=account_param(request))
+
+    page, next_cursor = listing.page(q, position, page_size)
+    return json_response({
+        'page_size': page_size,
+        'next': next_cursor,
+        'results': [transaction_json(trans) for trans in page],
+        })
+
+
+@staff_member_required
+@cached_json
+def accounts(request):
+    """Every account with its current balance."""
+    results = []
+    for account in models.Account.objects.select_related('currency').order_by('id'):
+        balance = finance_balances.balance_at(account, today())
+        results.append({
+            'id': account.id,
+            'site': account.site_id,
+            'account': account.account_id,
+            'short_id': account.short_id,
+            'description': account.description,
+            'currency': account.currency_id,
+            'last_import': account.last_import.isoformat(),
+            'balance': balance,
+            'balance_display': dollar_fmt(balance, account.currency.symbol),
+            })
+    return json_response({'results': results})
+
+
+@staff_member_required
+@cached_json
+def balances(request):
+    """The balance of an account at the end of each day.
+
+    GET parameters:
+        account: account_id or short_id of the account.
+        start: First day (YYYY-MM-DD), defaults to 30 days before end.
+        end: Last day (YYYY-MM-DD), defaults to today.
+    """
+    account = account_param(request)
+    try:
+        end = date_param(request, 'end')
+        end = today() if end is None else end.date()
+        start = date_param(
+            request, 'start', end - datetime.timedelta(days=30))
+    except ValueError:
+        return HttpResponseBadRequest('Dates must be YYYY-MM-DD.')
+    start = finance_balances.as_date(start)
+    if start > end or (end - start).days > MAX_BALANCE_DAYS:
+        return HttpResponseBadRequest(
+            'start must be before end and at most %i days apart.' % MAX_BALANCE_DAYS)
+
+    return json_response({
+        'account': account.account_id,
+        'results': [
+            {'date': date.strftime(DATE_FORMAT), 'balance': balance}
+            for date, balance in finance_balances.balance_range(account, start, end)],
+        })
+
+
+@staff_member_required
+@cached_json
+def categories(request):
+    """Amount in each category, including the categories under it.
+
+    Transfers between accounts aren't included.
+
+    GET parameters:
+        start: First day (YYYY-MM-DD), defaults to the first transaction.
+        end: Last day (YYYY-MM-DD), defaults to the last transaction.
+        exclude: account_id or short_id of an account to leave out, can be
+                 given more than once.
+    """
+    try:
+        start_date, end_date, exclude = report_range(request)
+    except ValueError:
+        return HttpResponseBadRequest('Dates must be YYYY-MM-DD.')
+
+    totals = reports.rollup(reports.category_totals(
+        start_date, end_date, exclude=exclude))
+    return json_response({
+        'results': [{'category': category, 'amount': amount}
+                    for category, amount in sorted(totals.items())],
+        })
+
+
+@staff_member_required
+@cached_json
+def months(request):
+    """Incoming and outgoing amounts each month.
+
+    Transfers between accounts aren't included. Takes the same GET
+    parameters as categories.
+    """
+    try:
+        start_date, end_date, exclude = report_range(request)
+    except ValueError:
+        return HttpResponseBadRequest('Dates must be YYYY-MM-DD.')
+
+    totals = reports.month_totals(start_date, end_date, exclude=exclude)
+    return json_response({
+        'results': [{'month': '%04i-%02i' % month,
+                     'incoming': incoming, 'outgoing': outgoing}
+                    for month, (incoming, outgoing) in sorted(totals.items())],
+        })
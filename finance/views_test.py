@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import datetime
+import json
+
+from django.contrib.auth.models import User
+
+from finance import balances
+from finance import models
+from finance import versions
+from finance import testing
+from finance import views
+
+
+class ApiTest(testing.AccountTestCase):
+    def setUp(self):
+        testing.AccountTestCase.setUp(self)
+        self.other = self.create_account("account_2", "acc2")
+        models.Category.objects.create(category_id="food", description="Food")
+        models.Category.objects.create(
+            category_id="food/fruit", description="Fruit",
+            parent_id="food")
+
+        for i, (amount, category) in enumerate(
+                [(-100, "food"), (-250, "food/fruit"), (1000, None)]):
+            self.create_transaction(
+                "t%i" % i, datetime.datetime(2012, 1+i, 10), amount,
+                primary_category_id=category)
+        balances.refresh(self.account)
+
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+
+    def get(self, url, status=200, **kw):
+        response = self.client.get(url, **kw)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_versions(self):
+        before = versions.current()
+        self.assertTrue(self.account.id in before)
+        self.assertTrue(self.other.id in before)
+
+        models.Imported.objects.create(account=self.other, content="")
+        after = versions.current()
+        self.assertEqual(after[self.account.id], before[self.account.id])
+        self.assertNotEqual(after[self.other.id], before[self.other.id])
+
+        self.assertEqual(versions.key("a", 1, [self.account.id]),
+                         versions.key("a", 1, [self.account.id]))
+        self.assertNotEqual(versions.key("a", 1), versions.key("a", 2))
+
+    def test_accounts(self):
+        data = json.loads(self.get("/finance/api/accounts").content)
+        self.assertEqual(
+            [(r['account'], r['balance']) for r in data['results']
+             if r['site'] == "site_1"],
+            [("account_1", 650), ("account_2", 0)])
+
+    def test_balances(self):
+        data = json.loads(self.get(
+            "/finance/api/balances?account=acc1&start=2012-01-09&end=2012-01-11"
+            ).content)
+        self.assertEqual(
+            [(r['date'], r['balance']) for r in data['results']],
+            [("2012-01-09", 0), ("2012-01-10", -100), ("2012-01-11", -100)])
+
+        self.get("/finance/api/balances?account=acc1&start=junk", status=400)
+        self.get("/finance/api/balances?account=missing", status=404)
+
+    def test_reports(self):
+        data = json.loads(self.get(
+            "/finance/api/categories?start=2012-01-01&end=2012-02-29").content)
+        self.assertEqual(
+            dict((r['category'], r['amount']) for r in data['results']),
+            {"food": -350, "food/fruit": -250})
+
+        data = json.loads(self.get("/finance/api/months").content)
+        self.assertEqual(
+            [(r['month'], r['incoming'], r['outgoing']) for r in data['results']],
+            [("2012-01", 0, -100), ("2012-02", 0, -250), ("2012-03", 1000, 0)])
+
+    def test_cache(self):
+        url = "/finance/api/categories?start=2012-01-01&end=2012-01-31"
+        response = self.get(url)
+        etag = response['ETag']
+
+        # Nothing has changed, so the client's copy is still good.
+        self.get(url, status=304, HTTP_IF_NONE_MATCH=etag)
+
+        # Changes which don't go through an import aren't seen...
+        models.MonthlySummary.objects.filter(account=self.account).update(
+            outgoing=-1)
+        self.assertEqual(self.get(url).content, response.content)
+
+        # ...until the next one.
+        models.Imported.objects.create(account=self.account, content="")
+        changed = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertNotEqual(changed.content, response.content)
+
+    def test_cache_today(self):
+        self.addCleanup(setattr, views, 'today', views.today)
+        views.today = lambda: datetime.date(2012, 1, 10)
+
+        url = "/finance/api/balances?account=acc1"
+        response = self.get(url)
+        data = json.loads(response.content)
+        self.assertEqual(data['results'][-1], {'date': "2012-01-10", 'balance': -100})
+
+        # The next day the default range ends somewhere else, even though no
+        # data has changed.
+        views.today = lambda: datetime.date(2012, 1, 11)
+        changed = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        data = json.loads(changed.content)
+        self.assertEqual(data['results'][-1], {'date': "2012-01-11", 'balance': -100})
@@ -1,5 +1,6 @@
 # Django settings for timsfinance project.
 import locale
+import os
 locale.setlocale(locale.LC_ALL, '')
 
 DEBUG = True
@@ -19,9 +20,28 @@ DATABASES = {
         'PASSWORD': '',                  # Not used with sqlite3.
         'HOST': '',                      # Set to empty string for localhost. Not used with sqlite3.
         'PORT': '',                      # Set to empty string for default. Not used with sqlite3.
+        # Seconds to wait for another process (IE an import) to finish writing.
+        'OPTIONS': {'timeout': 30},
     }
 }
 
+# Results computed from the transactions (see finance.versions) are cached on
+# disk so the web server and the management commands share them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'),
+        'TIMEOUT': 7 * 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+}
+
+# Statements downloaded from banks are kept here for a while, so importing
+# again (IE after fixing a parser) doesn't need to log into the bank.
+STATEMENT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'statements')
+STATEMENT_CACHE_TTL = 24 * 60 * 60
+STATEMENT_CACHE_SIZE = 50 * 1024 * 1024
+
 # Local time zone for this installation. Choices can be found here:
 # http://en.wikipedia.org/wiki/List_of_tz_zones_by_name
 # although not all choices may be available on all operating systems.
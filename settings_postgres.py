@@ -0,0 +1,14 @@
+# Settings for running against a local PostgreSQL instance (needs psycopg2),
+# IE "python manage.py test --settings=settings_postgres".
+from settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'NAME': 'finance',
+        'USER': '',
+        'PASSWORD': '',
+        'HOST': '',
+        'PORT': '',
+    }
+}